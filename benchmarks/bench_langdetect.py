@@ -0,0 +1,60 @@
+"""
+语言检测基准测试
+对比原先三次 re.findall 的实现与单次扫描检测器的耗时和结果
+
+用法: python benchmarks/bench_langdetect.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translator_core.langdetect import detect  # noqa: E402
+
+
+def legacy_detect_language(text):
+    """原 SimplifiedTeamsTranslator.detect_language 的自动检测逻辑"""
+    hiragana_katakana = re.findall(r'[぀-ゟ゠-ヿ]', text)
+    chinese_chars = re.findall(r'[一-龯]', text)
+
+    if hiragana_katakana:
+        return "ja"
+    elif chinese_chars and not hiragana_katakana:
+        return "zh"
+    elif re.findall(r'[a-zA-Z]', text):
+        return "en"
+    else:
+        return "unknown"
+
+
+SAMPLES = {
+    "短日文": "明日の会議は10時からです。",
+    "全汉字日文": "東京駅到着予定、資料確認済",
+    "短中文": "我们明天上午十点开会。",
+    "英文夹人名": "Meeting with 田中 tomorrow at 10am",
+    "日文5KB": "本日の打ち合わせでは、新しいプラットフォームのコンテンツについて確認しました。" * 130,
+    "中文5KB": "今天的会议上，我们讨论了新平台的内容审核流程和上线时间。" * 170,
+    "英文5KB": "We reviewed the creative check process for the new platform launch. " * 75,
+    "中日英混合5KB": ("Project update: " + "我们确认了时间表。" * 3 + "詳細は後ほど共有します。") * 100,
+}
+
+
+def bench(func, text, number):
+    return min(timeit.repeat(lambda: func(text), number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"{'样本':<14}{'长度':>7}  {'原实现(µs)':>12}  {'新实现(µs)':>12}  {'加速':>7}  原结果 → 新结果(置信度)")
+    for name, text in SAMPLES.items():
+        number = 200 if len(text) > 1000 else 5000
+        legacy_us = bench(legacy_detect_language, text, number)
+        new_us = bench(detect, text, number)
+        result = detect(text)
+        print(f"{name:<14}{len(text):>7}  {legacy_us:>12.2f}  {new_us:>12.2f}  {legacy_us / new_us:>6.1f}x  "
+              f"{legacy_detect_language(text)} → {result.language}({result.confidence})")
+
+
+if __name__ == "__main__":
+    main()
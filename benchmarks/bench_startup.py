@@ -0,0 +1,120 @@
+"""
+启动耗时基准测试
+在新进程中多次启动翻译助手，测量：解释器启动、导入模块、创建主窗口（构建控件）、
+首次绘制（主窗口显示且空闲任务执行完）的耗时，并检查首次绘制前是否导入了 openai/pyperclip。
+数据目录使用临时目录；需要图形界面环境
+
+用法: python benchmarks/bench_startup.py --runs 5
+      python benchmarks/bench_startup.py --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程中执行：各阶段时间点为 time.perf_counter()，进程启动时间由父进程补上
+CHILD_SCRIPT = r'''
+import json, sys, time
+started = time.perf_counter()
+import teams_simplified_translator as app_module
+imported = time.perf_counter()
+app = app_module.SimplifiedTeamsTranslator()
+constructed = time.perf_counter()
+# 不启动剪贴板监听，避免读取本机剪贴板
+app.clipboard_monitor_var.set(False)
+marks = {}
+
+def on_map(event):
+    if event.widget is app.root and "mapped" not in marks:
+        marks["mapped"] = time.perf_counter()
+        app.root.after_idle(on_painted)
+
+def on_painted():
+    marks["painted"] = time.perf_counter()
+    lazy = {name: name in sys.modules for name in ("openai", "httpx", "pyperclip", "requests")}
+    print(json.dumps({"started": started, "imported": imported, "constructed": constructed,
+                      "mapped": marks["mapped"], "painted": marks["painted"], "modules": lazy}), flush=True)
+    app.root.after(0, app.root.destroy)
+
+app.root.bind("<Map>", on_map, add="+")
+app.root.mainloop()
+app.engine.close()
+'''
+
+
+def run_once(env):
+    """启动一次，返回各阶段耗时（秒）"""
+    launched = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD_SCRIPT], env=env, cwd=ROOT,
+                          capture_output=True, text=True, timeout=120)
+    line = next((line for line in proc.stdout.splitlines() if line.startswith("{")), None)
+    if proc.returncode != 0 or line is None:
+        raise RuntimeError(f"启动失败: {proc.stderr.strip()[-500:]}")
+    marks = json.loads(line)
+    # perf_counter在同一台机器的进程间可比（单调时钟）
+    return {
+        "interpreter": marks["started"] - launched,
+        "import": marks["imported"] - marks["started"],
+        "construct": marks["constructed"] - marks["imported"],
+        "map": marks["mapped"] - marks["constructed"],
+        "first_paint": marks["painted"] - launched,
+        "modules": marks["modules"],
+    }
+
+
+def slowest_imports(env, count):
+    """用 -X importtime 列出导入最慢的模块（累计耗时）"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import teams_simplified_translator"],
+                          env=env, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return rows[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻译助手启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="启动次数，取中位数")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="另外列出导入最慢的N个模块")
+    parser.add_argument("--json", help="结果写入JSON文件")
+    args = parser.parse_args()
+
+    env = dict(os.environ, TEAMS_TRANSLATOR_HOME=tempfile.mkdtemp(prefix="teams_translator_startup_"))
+    # 首次运行会创建数据文件，先预热一次，不计入结果
+    run_once(env)
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    phases = ("interpreter", "import", "construct", "map", "first_paint")
+    summary = {phase: statistics.median(run[phase] for run in runs) for phase in phases}
+    labels = {"interpreter": "解释器启动", "import": "导入模块", "construct": "创建主窗口",
+              "map": "窗口显示", "first_paint": "首次绘制(从进程启动)"}
+    print(f"\n启动耗时（{args.runs}次中位数，毫秒）")
+    for phase in phases:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"  {labels[phase]:<14}{summary[phase] * 1000:>8.1f}   最小 {min(values):.1f} / 最大 {max(values):.1f}")
+
+    modules = runs[-1]["modules"]
+    loaded = [name for name, imported in modules.items() if imported]
+    print(f"\n首次绘制前已导入: {', '.join(loaded) if loaded else '无（openai/httpx/pyperclip/requests均延迟导入）'}")
+
+    if args.importtime:
+        print(f"\n导入最慢的{args.importtime}个模块（累计微秒）")
+        for micros, name in slowest_imports(env, args.importtime):
+            print(f"  {micros:>9}  {name.strip()}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "runs": runs}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
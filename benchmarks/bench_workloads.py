@@ -0,0 +1,381 @@
+"""
+离线基准测试：翻译链路的吞吐量、延迟分位数、内存和CPU
+启动本地模拟LLM服务（mock_llm_server.py），把翻译助手的API地址指向它，运行脚本化工作负载：
+  clipboard  逐条剪贴板事件（监听回调 → 语言检测 → 去抖合并 → 翻译 → 界面显示）
+  batch      1000行批量翻译（打包请求、并发、限流，与"批量翻译"按钮相同的路径）
+  glossary   大术语词典（构建匹配自动机，之后带词典翻译）
+  session    长会话（大量连续翻译，包含重复内容，观察内存增长和结果区裁剪）
+数据目录使用临时目录，不影响本机的缓存、账本和术语词典。
+需要安装 openai/httpx 以及图形界面环境（主窗口会隐藏）
+
+用法: python benchmarks/bench_workloads.py [--workload clipboard batch] [--latency 0.05]
+      python benchmarks/bench_workloads.py --json result.json --baseline last.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKLOADS = ("clipboard", "batch", "glossary", "session")
+
+SENTENCES = [
+    "明日の会議は10時からです。",
+    "資料を事前に共有していただけますか。",
+    "クリエイティブチェックの結果を確認しました。",
+    "アバターのデザインについてフィードバックをお願いします。",
+    "ネイティブチェックが完了次第、ご連絡します。",
+    "スケジュールの調整が必要かもしれません。",
+    "ホリプロさんとの打ち合わせは来週になります。",
+    "新しいタレントの起用について検討中です。",
+]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def rss_mb():
+    """当前进程常驻内存（MB），无法获取时返回None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def make_text(index, sentences=2):
+    """生成互不相同的日文消息"""
+    parts = [SENTENCES[(index + i) % len(SENTENCES)] for i in range(sentences)]
+    return f"{''.join(parts)}（{index}）"
+
+
+class Bench:
+    """驱动隐藏主窗口的翻译助手：后台线程执行工作负载，主线程处理界面更新"""
+
+    def __init__(self, app, server):
+        self.app = app
+        self.server = server
+
+    def pump(self, done, timeout=600):
+        """处理界面事件直到 done() 为真"""
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                raise TimeoutError("工作负载超时")
+            self.app.root.update()
+            time.sleep(0.001)
+
+    def run_in_background(self, func, *args):
+        """在后台线程执行func，期间主线程处理界面更新"""
+        outcome = {}
+
+        def run():
+            try:
+                outcome["result"] = func(*args)
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.pump(lambda: not thread.is_alive())
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("result")
+
+    def measure(self, name, workload, *args):
+        """运行一个工作负载，返回结果字典"""
+        self.app.metrics.reset()
+        self.app.engine.metrics.reset()
+        self.server.reset_stats()
+        self.app.clear_results()
+        rss_before = rss_mb()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+
+        items, latencies, extra = workload(*args)
+
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        rss_after = rss_mb()
+        from translator_core.metrics import merge_rows
+
+        rows = merge_rows(self.app.metrics.snapshot() + self.app.engine.metrics.snapshot())
+        stages = {stage: {"count": count, "p50": p50, "p95": p95, "p99": p99}
+                  for stage, count, _, p50, p95, p99 in rows}
+        return {
+            "workload": name,
+            "items": items,
+            "wall_seconds": wall,
+            "throughput": items / wall if wall else None,
+            "latency": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+                        "p99": percentile(latencies, 0.99)},
+            "cpu_seconds": cpu,
+            "cpu_percent": cpu / wall * 100 if wall else None,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "peak_rss_mb": peak_rss_mb(),
+            "server": dict(self.server.stats),
+            "stages": stages,
+            **extra,
+        }
+
+    def clipboard(self, events, debounce_ms):
+        """逐条剪贴板事件，间隔大于去抖窗口，测量复制到译文显示的延迟"""
+        app = self.app
+        app.clipboard_debounce_var.set(debounce_ms)
+        latencies = []
+        for i in range(events):
+            done = app.metrics.count("end_to_end") + 1
+            started = time.perf_counter()
+            # 监听线程中的回调
+            self.run_in_background(app.on_clipboard_changed, make_text(i))
+            self.pump(lambda: app.metrics.count("end_to_end") >= done, timeout=60)
+            latencies.append(time.perf_counter() - started)
+        return events, latencies, {"debounce_ms": debounce_ms}
+
+    def batch(self, lines):
+        """与"批量翻译"按钮相同的打包并发路径（跳过确认对话框），延迟为各请求结果显示时距开始的时间"""
+        app = self.app
+        texts = [make_text(i, sentences=1) for i in range(lines)]
+        latencies = []
+        requests = [0]
+        show_batch_result = app.show_batch_result
+        started = time.perf_counter()
+
+        def timed_show(*args):
+            latencies.append(time.perf_counter() - started)
+            requests[0] += 1
+            show_batch_result(*args)
+
+        app.show_batch_result = timed_show
+        try:
+            app.batch_cancel_event = threading.Event()
+            app.submit_job(app.run_batch_translation, texts, dict(app.settings), app.batch_concurrency_var.get(),
+                           True, app.batch_cancel_event)
+            self.pump(lambda: app.batch_cancel_event is None)
+        finally:
+            app.show_batch_result = show_batch_result
+        return lines, latencies, {"requests": requests[0]}
+
+    def glossary(self, terms, translations):
+        """大术语词典：构建匹配自动机的耗时，以及带词典时的翻译延迟"""
+        from translator_core.prompts import build_glossary_hint
+        from translator_core.terms import TermMatcher
+
+        app = self.app
+        engine = app.engine
+        glossary = {f"テスト用語{i:05d}": f"术语{i}" for i in range(terms)}
+        glossary.update(app.glossary.all_terms())
+        started = time.perf_counter()
+        matcher = TermMatcher(glossary)
+        build_seconds = time.perf_counter() - started
+
+        saved = engine.term_matcher, engine.glossary_hint
+        engine.term_matcher = matcher
+        engine.glossary_hint = build_glossary_hint(glossary.values())
+        try:
+            def run():
+                latencies = []
+                for i in range(translations):
+                    text = f"{make_text(i)}テスト用語{i % terms:05d}とアバモについて"
+                    started = time.perf_counter()
+                    engine.translate(text, "ja", settings=app.settings, incremental=False)
+                    latencies.append(time.perf_counter() - started)
+                return latencies
+
+            latencies = self.run_in_background(run)
+        finally:
+            engine.term_matcher, engine.glossary_hint = saved
+        return translations, latencies, {"terms": len(glossary), "matcher_build_seconds": build_seconds}
+
+    def session(self, translations, repeat_every):
+        """长会话：连续翻译，每repeat_every条重复一次之前的内容（命中缓存/增量复用）"""
+        app = self.app
+        samples = []
+
+        def run():
+            latencies = []
+            for i in range(translations):
+                index = i - repeat_every if repeat_every and i % repeat_every == 0 and i else i
+                started = time.perf_counter()
+                app.translate_clipboard_content(make_text(index, sentences=3), "ja")
+                latencies.append(time.perf_counter() - started)
+                if i % max(1, translations // 10) == 0:
+                    samples.append((i, rss_mb()))
+            return latencies
+
+        latencies = self.run_in_background(run)
+        # 等待排队中的界面更新完成
+        self.pump(lambda: app.dispatcher.queue.empty())
+        return translations, latencies, {"rss_samples": samples, "result_lines": app.result_log.line_count}
+
+
+def create_app(args):
+    """创建隐藏主窗口的翻译助手并配置为基准测试状态"""
+    from teams_simplified_translator import SimplifiedTeamsTranslator
+
+    app = SimplifiedTeamsTranslator()
+    app.root.withdraw()
+    # 临时数据目录中没有运行中的翻译服务，引擎在本进程中
+    if not app.local_engine:
+        raise RuntimeError("基准测试需要本进程内的翻译引擎")
+    # 不读写本机剪贴板
+    app.clipboard_monitor_var.set(False)
+    app.auto_copy_result_var.set(False)
+    app.deepseek_key_var.set("sk-bench")
+    app.openai_key_var.set("sk-bench")
+    app.selected_model_var.set(args.model)
+    app.adaptive_model_var.set(False)
+    app.use_cache_var.set(args.cache)
+    app.stream_output_var.set(args.stream)
+    app.batch_concurrency_var.set(args.concurrency)
+    app.warm_up_client()
+    return app
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_report(results):
+    print(f"\n{'工作负载':<10}{'条数':>7}{'耗时(s)':>9}{'吞吐(条/s)':>12}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'CPU(s)':>8}{'CPU%':>7}{'内存(MB)':>16}")
+    for result in results:
+        latency = result["latency"]
+        rss = "-"
+        if result["rss_before_mb"] is not None:
+            rss = f"{result['rss_before_mb']:.0f}→{result['rss_after_mb']:.0f}"
+        print(f"{result['workload']:<12}{result['items']:>7}{result['wall_seconds']:>9.2f}"
+              f"{result['throughput']:>12.1f}{format_ms(latency['p50']):>10}{format_ms(latency['p95']):>10}"
+              f"{format_ms(latency['p99']):>10}{result['cpu_seconds']:>8.2f}{result['cpu_percent']:>7.0f}{rss:>16}")
+
+    for result in results:
+        server = result["server"]
+        print(f"\n[{result['workload']}] 模拟服务: 请求{server['requests']} 限流{server['rate_limited']} "
+              f"错误{server['errors']} 断开{server['disconnected']}")
+        for stage, values in result["stages"].items():
+            print(f"  {stage:<18} n={values['count']:<6} p50={format_ms(values['p50']):>8}ms "
+                  f"p95={format_ms(values['p95']):>8}ms p99={format_ms(values['p99']):>8}ms")
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线比较吞吐量和p95延迟，超出容差时返回False"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result["workload"]: result for result in json.load(f)["results"]}
+    ok = True
+    print(f"\n与基线比较（容差 {tolerance:.0%}）：")
+    for result in results:
+        base = baseline.get(result["workload"])
+        if base is None:
+            continue
+        checks = [
+            ("吞吐", base["throughput"], result["throughput"], lambda old, new: new < old * (1 - tolerance)),
+            ("p95", base["latency"]["p95"], result["latency"]["p95"], lambda old, new: new > old * (1 + tolerance)),
+        ]
+        for label, old, new, regressed in checks:
+            if not old or new is None:
+                continue
+            bad = regressed(old, new)
+            ok = ok and not bad
+            print(f"  {'❌' if bad else '✅'} {result['workload']:<10}{label}: {old:.4g} → {new:.4g} "
+                  f"({(new - old) / old:+.1%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻译链路离线基准测试")
+    parser.add_argument("--workload", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--model", default="deepseek-v3-0324")
+    parser.add_argument("--events", type=int, default=30, help="剪贴板事件数")
+    parser.add_argument("--debounce", type=int, default=300, help="剪贴板去抖窗口（毫秒）")
+    parser.add_argument("--lines", type=int, default=1000, help="批量翻译行数")
+    parser.add_argument("--concurrency", type=int, default=4, help="批量翻译并发数")
+    parser.add_argument("--terms", type=int, default=20000, help="大术语词典的术语数")
+    parser.add_argument("--glossary-translations", type=int, default=100)
+    parser.add_argument("--session", type=int, default=2000, help="长会话翻译次数")
+    parser.add_argument("--repeat-every", type=int, default=5, help="长会话中每N条重复一次之前的内容")
+    parser.add_argument("--stream", action="store_true", help="启用流式输出")
+    parser.add_argument("--cache", action="store_true", help="启用翻译缓存")
+    # 模拟服务参数
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟首字延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="模拟服务每秒最多请求数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务返回500的概率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="结果写入JSON文件")
+    parser.add_argument("--baseline", help="与之前的JSON结果比较，出现退化时退出码为1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    # 数据目录必须在导入翻译助手之前设置
+    os.environ["TEAMS_TRANSLATOR_HOME"] = tempfile.mkdtemp(prefix="teams_translator_bench_")
+
+    from mock_llm_server import MockLLMServer
+
+    server = MockLLMServer(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                           rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed)
+    os.environ["TEAMS_TRANSLATOR_BASE_URL"] = server.start()
+    print(f"模拟LLM服务: {server.base_url}  数据目录: {os.environ['TEAMS_TRANSLATOR_HOME']}")
+
+    app = create_app(args)
+    bench = Bench(app, server)
+    runs = {
+        "clipboard": (bench.clipboard, args.events, args.debounce),
+        "batch": (bench.batch, args.lines),
+        "glossary": (bench.glossary, args.terms, args.glossary_translations),
+        "session": (bench.session, args.session, args.repeat_every),
+    }
+
+    results = []
+    try:
+        for name in args.workload:
+            workload, *workload_args = runs[name]
+            print(f"运行 {name} ...")
+            results.append(bench.measure(name, workload, *workload_args))
+    finally:
+        app.engine.close()
+        app.root.destroy()
+        server.stop()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
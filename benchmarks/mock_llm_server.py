@@ -0,0 +1,282 @@
+"""
+本地模拟LLM服务
+兼容OpenAI的 /chat/completions 接口，可模拟首字延迟、输出速度、流式输出(SSE)、
+限流(429)和服务端错误(500)，并按提示前缀模拟提示缓存命中。
+译文为"[译]"加原文，打包请求按编号返回JSON，供离线基准测试使用，不调用真实API
+
+用法: python benchmarks/mock_llm_server.py --port 8765 --latency 0.3 --tokens-per-second 80
+      再以 TEAMS_TRANSLATOR_BASE_URL=http://127.0.0.1:8765/v1 启动翻译助手
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translator_core.text import estimate_tokens  # noqa: E402
+
+REPLY_PREFIX = "[译]"
+
+
+def make_reply(messages):
+    """按翻译提示的格式生成回复：单条返回译文，打包请求返回编号JSON"""
+    content = messages[-1].get("content", "") if messages else ""
+    _, marker, body = content.rpartition("\n原文")
+    if not marker:
+        return REPLY_PREFIX + content.strip()[-200:]
+    header, _, payload = body.partition("\n")
+    if header.startswith("（JSON"):
+        items = json.loads(payload)
+        return json.dumps({key: REPLY_PREFIX + text for key, text in items.items()}, ensure_ascii=False)
+    return REPLY_PREFIX + payload.strip()
+
+
+def prompt_prefix_of(messages):
+    """提示中原文之前的部分（系统提示 + 用户消息前缀），用于模拟提示缓存"""
+    parts = [message.get("content", "") for message in messages]
+    if parts:
+        parts[-1] = parts[-1].rpartition("\n原文")[0]
+    return "\n".join(parts)
+
+
+class MockLLMServer:
+    """模拟服务，start() 在后台线程中运行并返回API地址"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.05, tokens_per_second=100.0,
+                 rate_limit=0.0, error_rate=0.0, seed=None):
+        self.latency = latency                      # 首字延迟（秒）
+        self.jitter = jitter                        # 首字延迟的标准差
+        self.tokens_per_second = tokens_per_second  # 输出速度，0表示不限
+        self.rate_limit = rate_limit                # 每秒最多请求数，超出返回429，0表示不限
+        self.error_rate = error_rate                # 返回500的概率
+        self.random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._prefixes = set()
+        self.stats = {}
+        self.reset_stats()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """在当前线程中运行，直到 stop() 或 KeyboardInterrupt"""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "errors": 0,
+                          "disconnected": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _admit(self):
+        """按每秒请求数限流，返回是否放行"""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return False
+            self._recent.append(now)
+            return True
+
+    def _first_token_delay(self):
+        with self._lock:
+            return max(0.0, self.random.gauss(self.latency, self.jitter))
+
+    def _should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def _usage(self, messages, reply):
+        """用量统计，同样前缀再次出现时计为提示缓存命中（DeepSeek与OpenAI两种字段）"""
+        prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in messages)
+        prefix = prompt_prefix_of(messages)
+        digest = hashlib.blake2b(prefix.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            hit = digest in self._prefixes
+            self._prefixes.add(digest)
+        cached = min(prompt_tokens, estimate_tokens(prefix)) if hit else 0
+        completion_tokens = estimate_tokens(reply)
+        self._count("prompt_tokens", prompt_tokens)
+        self._count("completion_tokens", completion_tokens)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cached,
+            "prompt_cache_miss_tokens": prompt_tokens - cached,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def _output_delay(self, text):
+        if not self.tokens_per_second:
+            return 0.0
+        return estimate_tokens(text) / self.tokens_per_second
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 保持长连接，与真实服务一致
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                self.send_json(200, {"object": "list", "data": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error_json(404, "not_found", f"未知接口: {self.path}")
+                    return
+
+                server._count("requests")
+                if not server._admit():
+                    server._count("rate_limited")
+                    self.send_error_json(429, "rate_limit_exceeded", "Rate limit reached", {"Retry-After": "1"})
+                    return
+                if server._should_fail():
+                    server._count("errors")
+                    self.send_error_json(500, "server_error", "Simulated server error")
+                    return
+
+                messages = body.get("messages") or []
+                reply = make_reply(messages)
+                usage = server._usage(messages, reply)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+                time.sleep(server._first_token_delay())
+
+                try:
+                    if body.get("stream"):
+                        server._count("streamed")
+                        include_usage = (body.get("stream_options") or {}).get("include_usage")
+                        self.send_stream(completion_id, body.get("model", ""), reply, usage if include_usage else None)
+                    else:
+                        time.sleep(server._output_delay(reply))
+                        self.send_json(200, {
+                            "id": completion_id,
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": body.get("model", ""),
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": reply}}],
+                            "usage": usage,
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端取消请求（关闭了连接）
+                    server._count("disconnected")
+                    self.close_connection = True
+
+            def send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_error_json(self, status, code, message, headers=None):
+                self.send_json(status, {"error": {"message": message, "type": code, "code": code}}, headers)
+
+            def send_stream(self, completion_id, model, reply, usage):
+                """SSE流式输出，按输出速度逐段发送"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(delta=None, finish_reason=None, chunk_usage=None):
+                    payload = {"id": completion_id, "object": "chat.completion.chunk",
+                               "created": int(time.time()), "model": model,
+                               "choices": [] if chunk_usage else
+                               [{"index": 0, "delta": delta or {}, "finish_reason": finish_reason}]}
+                    if chunk_usage:
+                        payload["usage"] = chunk_usage
+                    self.write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+
+                event({"role": "assistant", "content": ""})
+                for start in range(0, len(reply), 4):
+                    piece = reply[start:start + 4]
+                    time.sleep(server._output_delay(piece))
+                    event({"content": piece})
+                event(finish_reason="stop")
+                if usage:
+                    event(chunk_usage=usage)
+                self.write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def write_chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务（OpenAI兼容）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="首字延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="首字延迟标准差（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="输出速度，0表示不限")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒最多请求数，超出返回429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率（0~1）")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.jitter, args.tokens_per_second,
+                           args.rate_limit, args.error_rate, args.seed)
+    print(f"模拟LLM服务已启动: {server.base_url}")
+    print(f"设置 TEAMS_TRANSLATOR_BASE_URL={server.base_url} 后启动翻译助手即可离线测试")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"请求统计: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,78 @@ Teams简化版实时翻译系统
 支持剪贴板监听自动翻译
 """
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import requests
-import json
+from tkinter import ttk, messagebox, scrolledtext, simpledialog, filedialog
+import os
 import time
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import re
-import pyperclip
-try:
-    from openai import OpenAI
-    OPENAI_V1 = True
-except ImportError:
-    import openai
-    OPENAI_V1 = False
+import csv
+
+from translator_core.clipboard import ClipboardWatcher, copy_text, paste_text
+from translator_core.glossary import GlossaryStore, DEFAULT_GLOSSARY
+from translator_core.langdetect import detect
+from translator_core.result_log import ResultLog
+from translator_core.metrics import StageMetrics, STAGES, merge_rows
+from translator_core.paths import DATA_DIR
+from translator_core.models import format_price
+from translator_core.engine import (TranslationEngine, load_model_catalog, BACKUP_MODEL_AUTO,
+                                    BACKUP_MODEL_NONE, LANG_NAMES, DEFAULT_TERMS)
+from translator_core.daemon import connect_engine, serve_engine
+from translator_core.coalescer import ClipboardCoalescer
+from translator_core.errors import TranslationCancelled
+
+# 剪贴板监听方式显示名称
+CLIPBOARD_BACKEND_NAMES = {
+    'xfixes': 'XFixes事件通知',
+    'win32-sequence': 'Windows剪贴板序列号',
+    'nspasteboard': 'macOS剪贴板计数',
+    'polling': '自适应轮询'
+}
+
+# 只随界面自己的请求传递、不作为翻译服务默认设置的设置项
+PRIVATE_SETTINGS = ('openai_key', 'deepseek_key')
+
+# 界面更新队列
+class UiDispatcher:
+    """后台线程投递界面更新，界面线程通过after定时批量执行"""
+    
+    def __init__(self, root, interval_ms=16, budget_ms=8):
+        self.root = root
+        self.interval_ms = interval_ms  # 约60fps
+        self.budget_ms = budget_ms      # 每帧最多占用的处理时间
+        self.queue = queue.SimpleQueue()
+        self.running = False
+    
+    def post(self, func, *args):
+        """投递一个界面更新（任意线程可调用）"""
+        self.queue.put((func, args))
+    
+    def start(self):
+        """开始定时处理队列"""
+        self.running = True
+        self.root.after(self.interval_ms, self.drain)
+    
+    def stop(self):
+        """停止处理队列"""
+        self.running = False
+    
+    def drain(self):
+        """批量执行队列中的更新，超出本帧时间预算的留到下一帧"""
+        if not self.running:
+            return
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        while time.perf_counter() < deadline:
+            try:
+                func, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"界面更新失败: {e}")
+        self.root.after(self.interval_ms, self.drain)
 
 class SimplifiedTeamsTranslator:
     """简化版Teams翻译器 - 无需高级权限"""
@@ -32,66 +90,8 @@ class SimplifiedTeamsTranslator:
         self.default_api_key = ""  # 在这里设置您的默认OpenAI API Key
         self.default_dsapi_key = ""  # 在这里设置您的默认DeepSeek API Key
         
-        # AI模型配置
-        self.ai_models = {
-            # OpenAI模型
-            "gpt-4o": {
-                "name": "GPT-4o (最新)",
-                "input_price": "$5.00/1M tokens",
-                "output_price": "$15.00/1M tokens",
-                "description": "OpenAI最新最强模型，翻译质量最佳",
-                "provider": "openai",
-                "recommended": True
-            },
-            "gpt-4o-mini": {
-                "name": "GPT-4o Mini",
-                "input_price": "$0.15/1M tokens", 
-                "output_price": "$0.60/1M tokens",
-                "description": "OpenAI性价比最高，适合大量翻译",
-                "provider": "openai",
-                "recommended": True
-            },
-            "gpt-4-turbo": {
-                "name": "GPT-4 Turbo",
-                "input_price": "$10.00/1M tokens",
-                "output_price": "$30.00/1M tokens", 
-                "description": "OpenAI高质量翻译，速度较快",
-                "provider": "openai"
-            },
-            "gpt-4": {
-                "name": "GPT-4",
-                "input_price": "$30.00/1M tokens",
-                "output_price": "$60.00/1M tokens",
-                "description": "OpenAI经典GPT-4，质量稳定但较贵",
-                "provider": "openai"
-            },
-            "gpt-3.5-turbo": {
-                "name": "GPT-3.5 Turbo",
-                "input_price": "$0.50/1M tokens",
-                "output_price": "$1.50/1M tokens", 
-                "description": "OpenAI最便宜选项，基础翻译够用",
-                "provider": "openai"
-            },
-            # DeepSeek模型 (界面显示友好名称，API使用官方名称)
-            "deepseek-v3-0324": {
-                "name": "DeepSeek V3-0324 🔥",
-                "input_price": "$0.27/1M tokens",
-                "output_price": "$1.10/1M tokens",
-                "description": "DeepSeek V3-0324最新版本，翻译质量卓越",
-                "provider": "deepseek",
-                "api_model": "deepseek-chat",  # 实际API调用时使用的模型名
-                "recommended": True
-            },
-            "deepseek-r1-0528": {
-                "name": "DeepSeek R1-0528 🚀",
-                "input_price": "$0.55/1M tokens",
-                "output_price": "$2.19/1M tokens",
-                "description": "DeepSeek R1-0528推理模型，逻辑思维能力强",
-                "provider": "deepseek",
-                "api_model": "deepseek-reasoner",  # 实际API调用时使用的模型名
-                "recommended": True
-            }
-        }
+        # AI模型目录（价格可在数据目录的models.json中覆盖）
+        self.ai_models = load_model_catalog()
         
         # 配置变量
         self.openai_key_var = tk.StringVar(value=self.default_api_key)
@@ -108,34 +108,80 @@ class SimplifiedTeamsTranslator:
         self.clipboard_monitor_var = tk.BooleanVar(value=True)  # 默认开启剪贴板监听
         self.auto_copy_result_var = tk.BooleanVar(value=True)   # 默认开启自动复制结果
         self.last_clipboard_content = ""
-        self.clipboard_thread = None
+        self.clipboard_watcher = None
+        self.first_mapped = False
+        # 增量翻译：重复复制的长文本只翻译新增或修改的句子
+        self.incremental_var = tk.BooleanVar(value=True)
+        # 连续复制时的去抖窗口和片段合并
+        self.clipboard_debounce_var = tk.IntVar(value=300)  # 毫秒
+        self.merge_snippets_var = tk.BooleanVar(value=False)
         
         # 结果显示模式
         self.result_mode_var = tk.StringVar(value="append")  # append 或 clear
-        
-        # 自定义术语词典
-        self.custom_terms = {
-            # 日语原文: 正确翻译
-            "アーバンも": "Avamo",
-            "アバモ": "Avamo", 
-            "エアテレント": "AI Talent",
-            "ホリプロ": "Horipro",
-            "クリエイティブチェック": "创意审核",
-            "アバター": "avatar",
-            "タレント": "艺人",
-            "ネイティブチェック": "母语审核"
-        }
-        
-        # 成本统计
+        self.stream_output_var = tk.BooleanVar(value=True)  # 流式显示译文
+        self.stream_counter = 0
+        self.scroll_pending = False
+        # 结果区最多保留的行数，超出部分裁掉并归档到磁盘
+        self.result_max_lines_var = tk.IntVar(value=2000)
+        self.result_log = ResultLog(max_lines=self.result_max_lines_var.get())
+        
+        # 翻译引擎：已有翻译服务在运行时作为客户端连接，否则在本进程创建（窗口显示后再对外提供服务），
+        # 缓存、术语、连接池、路由和用量账本由引擎统一管理
+        self.engine = connect_engine(serve=False, models=self.ai_models)
+        self.local_engine = isinstance(self.engine, TranslationEngine)
+        
+        # 自定义术语词典（首次运行时写入默认词典），编辑后通知引擎重新加载
+        self.glossary = self.engine.glossary if self.local_engine else GlossaryStore(default_terms=DEFAULT_TERMS)
+        self.terms_rebuild_after = None
+        
+        # 翻译缓存（持久化，重启后有效）
+        self.use_cache_var = tk.BooleanVar(value=True)
+        
+        # 界面侧各阶段耗时统计（帮助 → 延迟指标），引擎侧的阶段由引擎记录
+        self.metrics = StageMetrics()
+        
+        # 请求路由：超时、重试、熔断、备用模型和对冲请求
+        self.backup_model_var = tk.StringVar(value=BACKUP_MODEL_AUTO)
+        self.hedge_requests_var = tk.BooleanVar(value=False)
+        
+        # 自适应模型选择：按文本长度、语言、质量模式和近期延迟/成本选择模型
+        self.adaptive_model_var = tk.BooleanVar(value=True)
+        self.latency_budget_var = tk.StringVar(value="")  # 秒，留空不限
+        self.cost_ceiling_var = tk.StringVar(value="")    # 美元/次，留空不限
+        
+        # 本次会话的成本统计（用量账本由引擎持久化）
         self.total_input_tokens = 0
         self.total_output_tokens = 0
         self.estimated_cost = 0.0
+        # 本月累计成本（在后台读取）
+        self.month_cost = 0.0
+        self.cost_loading = False
+        self.cost_reload = False
+        
+        # 批量翻译设置
+        self.batch_concurrency_var = tk.IntVar(value=4)
+        self.batch_pack_var = tk.BooleanVar(value=True)  # 多行打包为一次请求
+        self.batch_cancel_event = None
+        self.file_translator = None
         
         # 状态管理
         self.is_running = False
-        self.translation_thread = None
+        self.stats_lock = threading.Lock()
+        
+        # 执行模型：翻译任务在线程池中执行，界面更新统一经队列回到界面线程
+        self.job_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="translate")
+        self.dispatcher = UiDispatcher(self.root)
+        self.clipboard_coalescer = ClipboardCoalescer(self.dispatch_clipboard_request,
+                                                      debounce=self.clipboard_debounce_var.get() / 1000)
         
         self.create_widgets()
+        self.bind_settings_snapshot()
+        self.publish_engine_defaults()
+        self.result_max_lines_var.trace_add("write", self.update_result_limit)
+        self.clipboard_debounce_var.trace_add("write", self.update_coalescer_settings)
+        self.merge_snippets_var.trace_add("write", self.update_coalescer_settings)
+        self.update_cost_display()
+        self.dispatcher.start()
         
     def create_widgets(self):
         """创建界面组件"""
@@ -151,6 +197,7 @@ class SimplifiedTeamsTranslator:
         ttk.Label(config_frame, text="OpenAI API Key:").grid(row=0, column=0, sticky=tk.W, padx=5)
         openai_key_entry = ttk.Entry(config_frame, textvariable=self.openai_key_var, width=50, show="*")
         openai_key_entry.grid(row=0, column=1, padx=5, sticky=(tk.W, tk.E))
+        openai_key_entry.bind("<FocusOut>", lambda e: self.warm_up_client())
         
         # OpenAI显示/隐藏按钮
         def toggle_openai_key_visibility():
@@ -168,6 +215,7 @@ class SimplifiedTeamsTranslator:
         ttk.Label(config_frame, text="DeepSeek API Key:").grid(row=1, column=0, sticky=tk.W, padx=5)
         deepseek_key_entry = ttk.Entry(config_frame, textvariable=self.deepseek_key_var, width=50, show="*")
         deepseek_key_entry.grid(row=1, column=1, padx=5, sticky=(tk.W, tk.E))
+        deepseek_key_entry.bind("<FocusOut>", lambda e: self.warm_up_client())
         
         # DeepSeek显示/隐藏按钮
         def toggle_deepseek_key_visibility():
@@ -238,6 +286,16 @@ class SimplifiedTeamsTranslator:
                                          command=self.toggle_clipboard_monitor)
         clipboard_check.grid(row=1, column=2, sticky=tk.W, padx=5)
         
+        # 流式输出
+        stream_check = ttk.Checkbutton(settings_frame, text="流式输出",
+                                      variable=self.stream_output_var)
+        stream_check.grid(row=1, column=3, sticky=tk.W, padx=5)
+        
+        # 增量翻译
+        incremental_check = ttk.Checkbutton(settings_frame, text="增量翻译",
+                                           variable=self.incremental_var)
+        incremental_check.grid(row=1, column=4, sticky=tk.W, padx=5)
+        
         # 第三行：高级选项
         ttk.Label(settings_frame, text="高级选项:").grid(row=2, column=0, sticky=tk.W, padx=5)
         
@@ -255,6 +313,46 @@ class SimplifiedTeamsTranslator:
         # 添加提示标签
         ttk.Label(settings_frame, text="(重要翻译时启用)", foreground="gray", font=("Arial", 8)).grid(row=2, column=3, sticky=tk.W, padx=5)
         
+        # 翻译缓存选项
+        cache_check = ttk.Checkbutton(settings_frame, text="翻译缓存", 
+                                     variable=self.use_cache_var)
+        cache_check.grid(row=2, column=4, sticky=tk.W, padx=5)
+        ttk.Button(settings_frame, text="清空缓存", command=self.clear_translation_cache, width=10).grid(row=2, column=5, padx=5)
+        
+        # 第四行：连续复制的处理方式
+        ttk.Label(settings_frame, text="连续复制:").grid(row=3, column=0, sticky=tk.W, padx=5)
+        debounce_frame = ttk.Frame(settings_frame)
+        debounce_frame.grid(row=3, column=1, sticky=tk.W, padx=5)
+        ttk.Spinbox(debounce_frame, from_=0, to=3000, increment=100, width=6,
+                    textvariable=self.clipboard_debounce_var).pack(side=tk.LEFT)
+        ttk.Label(debounce_frame, text="毫秒内只译最新").pack(side=tk.LEFT, padx=(2, 0))
+        merge_check = ttk.Checkbutton(settings_frame, text="合并相邻片段",
+                                     variable=self.merge_snippets_var)
+        merge_check.grid(row=3, column=2, sticky=tk.W, padx=5)
+        
+        # 备用模型：主模型故障或熔断时切换，启用对冲时用于并行请求
+        ttk.Label(settings_frame, text="备用模型:").grid(row=3, column=3, sticky=tk.W, padx=5)
+        backup_combo = ttk.Combobox(settings_frame, textvariable=self.backup_model_var,
+                                   values=[BACKUP_MODEL_AUTO, BACKUP_MODEL_NONE] + list(self.ai_models.keys()),
+                                   state="readonly", width=15)
+        backup_combo.grid(row=3, column=4, padx=5)
+        hedge_check = ttk.Checkbutton(settings_frame, text="对冲请求",
+                                     variable=self.hedge_requests_var)
+        hedge_check.grid(row=3, column=5, sticky=tk.W, padx=5)
+        
+        # 第五行：自适应模型选择
+        ttk.Label(settings_frame, text="模型选择:").grid(row=4, column=0, sticky=tk.W, padx=5)
+        adaptive_check = ttk.Checkbutton(settings_frame, text="按请求自动选择",
+                                        variable=self.adaptive_model_var)
+        adaptive_check.grid(row=4, column=1, sticky=tk.W, padx=5)
+        budget_frame = ttk.Frame(settings_frame)
+        budget_frame.grid(row=4, column=2, columnspan=4, sticky=tk.W, padx=5)
+        ttk.Label(budget_frame, text="延迟预算(秒):").pack(side=tk.LEFT)
+        ttk.Entry(budget_frame, textvariable=self.latency_budget_var, width=6).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(budget_frame, text="单次成本上限($):").pack(side=tk.LEFT)
+        ttk.Entry(budget_frame, textvariable=self.cost_ceiling_var, width=8).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(budget_frame, text="(留空不限)", foreground="gray", font=("Arial", 8)).pack(side=tk.LEFT)
+        
         # 术语词典按钮
         ttk.Button(settings_frame, text="术语词典", command=self.open_terms_editor, width=10).grid(row=0, column=5, padx=5)
         
@@ -274,6 +372,16 @@ class SimplifiedTeamsTranslator:
         ttk.Button(button_frame, text="清空输入", command=self.clear_input).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="批量翻译", command=self.batch_translate).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="粘贴翻译", command=self.paste_and_translate).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="翻译文件", command=self.translate_file).pack(side=tk.LEFT, padx=5)
+        
+        # 批量翻译并发设置
+        self.batch_cancel_button = ttk.Button(button_frame, text="取消批量", command=self.cancel_batch_translate,
+                                              state=tk.DISABLED)
+        self.batch_cancel_button.pack(side=tk.RIGHT, padx=5)
+        ttk.Spinbox(button_frame, from_=1, to=16, textvariable=self.batch_concurrency_var,
+                    width=4, state="readonly").pack(side=tk.RIGHT)
+        ttk.Label(button_frame, text="批量并发:").pack(side=tk.RIGHT, padx=(5, 2))
+        ttk.Checkbutton(button_frame, text="打包请求", variable=self.batch_pack_var).pack(side=tk.RIGHT, padx=5)
         
         # 结果显示区域
         result_frame = ttk.LabelFrame(main_frame, text="翻译结果", padding="10")
@@ -292,6 +400,9 @@ class SimplifiedTeamsTranslator:
         
         ttk.Button(result_control_frame, text="清空结果", command=self.clear_results).pack(side=tk.RIGHT, padx=5)
         ttk.Button(result_control_frame, text="复制结果", command=self.copy_results).pack(side=tk.RIGHT, padx=5)
+        ttk.Spinbox(result_control_frame, from_=200, to=50000, increment=500, width=6,
+                    textvariable=self.result_max_lines_var).pack(side=tk.RIGHT)
+        ttk.Label(result_control_frame, text="保留行数:").pack(side=tk.RIGHT, padx=(5, 2))
         
         # 结果显示文本框 - 增大高度
         self.result_text = scrolledtext.ScrolledText(result_frame, height=15, wrap=tk.WORD, font=("Arial", 10))
@@ -316,13 +427,83 @@ class SimplifiedTeamsTranslator:
         if self.default_api_key and not self.default_api_key.startswith("sk-your-default"):
             self.status_var.set("就绪 - 已加载默认API Key")
         
-        # 自动启动剪贴板监听（如果默认开启）
+        # 窗口显示后再预热API连接（同时导入SDK）和启动剪贴板监听，不占用首次绘制前的时间
+        self.root.bind("<Map>", self.on_first_map, add="+")
+    
+    def on_first_map(self, event):
+        """主窗口首次显示后的启动任务"""
+        # 子控件的Map事件同样会传到根窗口
+        if event.widget is not self.root or self.first_mapped:
+            return
+        self.first_mapped = True
+        
+        # 后台预热API连接，本进程的引擎同时对外提供服务（服务端模块此时才导入）
+        self.warm_up_client()
+        if self.local_engine:
+            self.submit_job(serve_engine, self.engine)
+        
+        # 自动启动剪贴板监听（如果默认开启），在首帧绘制完成后执行
         if self.clipboard_monitor_var.get():
-            # 延迟启动，确保界面完全加载
-            self.root.after(1000, self.auto_start_clipboard_monitor)
+            self.root.after_idle(self.auto_start_clipboard_monitor)
+    
+    def bind_settings_snapshot(self):
+        """把界面变量同步到设置快照，后台线程只读快照，不直接访问Tk变量"""
+        settings_vars = {
+            'model_key': self.selected_model_var,
+            'source_lang': self.source_lang_var,
+            'target_lang': self.target_lang_var,
+            'translation_mode': self.translation_mode_var,
+            'quality_enhance': self.quality_enhance_var,
+            'use_cache': self.use_cache_var,
+            'stream_output': self.stream_output_var,
+            'incremental': self.incremental_var,
+            'backup_model': self.backup_model_var,
+            'hedge_requests': self.hedge_requests_var,
+            'adaptive_model': self.adaptive_model_var,
+            'latency_budget': self.latency_budget_var,
+            'cost_ceiling': self.cost_ceiling_var,
+            'auto_copy_result': self.auto_copy_result_var,
+            'openai_key': self.openai_key_var,
+            'deepseek_key': self.deepseek_key_var,
+        }
+        self.settings = {name: var.get() for name, var in settings_vars.items()}
+        
+        for name, var in settings_vars.items():
+            def on_write(*args, name=name, var=var):
+                self.settings[name] = var.get()
+                if name not in PRIVATE_SETTINGS:
+                    self.publish_engine_defaults()
+            var.trace_add("write", on_write)
+    
+    def publish_engine_defaults(self):
+        """命令行等客户端未指定的设置项沿用界面当前设置
+
+        API Key不作为引擎的默认设置（其他客户端会用它计费），只随界面自己的请求传递；
+        连接的是其他进程的翻译服务时不修改其默认设置
+        """
+        if not self.local_engine:
+            return
+        shared = {name: value for name, value in self.settings.items() if name not in PRIVATE_SETTINGS}
+        self.engine.base_settings = dict(self.engine.base_settings, **shared)
+    
+    def submit_job(self, func, *args, on_error=None):
+        """提交翻译任务到线程池，异常交给界面线程处理"""
+        def run():
+            try:
+                func(*args)
+            except Exception as e:
+                if on_error is not None:
+                    self.run_on_ui(on_error, e)
+                else:
+                    print(f"后台任务失败: {e}")
+        
+        return self.job_executor.submit(run)
     
     def auto_start_clipboard_monitor(self):
         """自动启动剪贴板监听（程序启动时调用）"""
+        # 等待期间已取消勾选
+        if not self.clipboard_monitor_var.get():
+            return
         try:
             self.start_clipboard_monitor()
         except Exception as e:
@@ -342,7 +523,7 @@ class SimplifiedTeamsTranslator:
         # 检查API Key配置
         model_key = self.selected_model_var.get()
         model_info = self.ai_models[model_key]
-        provider = model_info.get('provider', 'openai')
+        provider = model_info.provider
         
         if provider == "deepseek":
             if not self.deepseek_key_var.get().strip():
@@ -355,110 +536,147 @@ class SimplifiedTeamsTranslator:
                 self.clipboard_monitor_var.set(False)
                 return
         
+        if self.clipboard_watcher is not None:
+            self.clipboard_watcher.stop()
+        
+        # 优先使用系统剪贴板变化通知，不可用时自适应轮询
         self.is_running = True
-        self.clipboard_thread = threading.Thread(target=self.clipboard_monitor_loop, daemon=True)
-        self.clipboard_thread.start()
+        self.clipboard_watcher = ClipboardWatcher(self.on_clipboard_changed, read_clipboard=paste_text)
+        backend = self.clipboard_watcher.start()
         
         self.status_var.set("剪贴板监听已启动 - 复制文本将自动翻译")
-        self.append_result("🎯 剪贴板监听已启动", "clipboard")
+        self.append_result(f"🎯 剪贴板监听已启动（{CLIPBOARD_BACKEND_NAMES.get(backend, backend)}）", "clipboard")
         self.append_result("💡 提示：在Teams中复制文本将自动翻译", "clipboard")
     
     def stop_clipboard_monitor(self):
         """停止剪贴板监听"""
         self.is_running = False
+        if self.clipboard_watcher is not None:
+            self.clipboard_watcher.stop()
+            self.clipboard_watcher = None
+        self.clipboard_coalescer.cancel_all()
         self.status_var.set("剪贴板监听已停止")
         self.append_result("🛑 剪贴板监听已停止", "clipboard")
     
-    def clipboard_monitor_loop(self):
-        """剪贴板监听循环"""
-        while self.is_running:
+    def on_clipboard_changed(self, current_clipboard):
+        """剪贴板内容变化处理（在监听线程中回调）"""
+        # 检查剪贴板内容是否变化且不为空
+        if not (current_clipboard != self.last_clipboard_content and 
+                current_clipboard.strip() and 
+                len(current_clipboard.strip()) > 1):
+            return
+        
+        self.last_clipboard_content = current_clipboard
+        
+        # 检测语言并决定是否翻译
+        detected_lang = self.detect_language(current_clipboard)
+        
+        # 避免翻译循环：如果检测到的是目标语言，跳过翻译
+        if detected_lang == self.settings['target_lang']:
+            return
+        
+        # 避免翻译API Key等敏感信息
+        if current_clipboard.startswith(('sk-', 'API', 'api')):
+            return
+        
+        # 避免翻译过短的内容（可能是界面元素）
+        if len(current_clipboard.strip()) < 5:
+            return
+        
+        if self.should_translate(detected_lang):
+            # 经去抖合并后再翻译，连续复制时只翻译最新内容
+            self.clipboard_coalescer.submit(current_clipboard, detected_lang)
+    
+    def update_coalescer_settings(self, *args):
+        """更新去抖窗口和片段合并设置"""
+        try:
+            self.clipboard_coalescer.debounce = max(0, int(self.clipboard_debounce_var.get())) / 1000
+        except (tk.TclError, ValueError):
+            pass
+        self.clipboard_coalescer.merge = self.merge_snippets_var.get()
+    
+    def dispatch_clipboard_request(self, request):
+        """把合并后的剪贴板内容交给线程池翻译（在合并线程中回调）"""
+        def run():
+            # 从最新一次复制到开始翻译（去抖等待和排队）
+            self.metrics.observe("clipboard_detect", time.monotonic() - request.submitted_at)
             try:
-                current_clipboard = pyperclip.paste()
-                
-                # 检查剪贴板内容是否变化且不为空
-                if (current_clipboard != self.last_clipboard_content and 
-                    current_clipboard.strip() and 
-                    len(current_clipboard.strip()) > 1):
-                    
-                    # 检测语言并决定是否翻译
-                    detected_lang = self.detect_language(current_clipboard)
-                    
-                    # 避免翻译循环：如果检测到的是目标语言，跳过翻译
-                    if detected_lang == self.target_lang_var.get():
-                        self.last_clipboard_content = current_clipboard
-                        continue
-                    
-                    # 避免翻译API Key等敏感信息
-                    if current_clipboard.startswith(('sk-', 'API', 'api')):
-                        self.last_clipboard_content = current_clipboard
-                        continue
-                    
-                    # 避免翻译过短的内容（可能是界面元素）
-                    if len(current_clipboard.strip()) < 5:
-                        self.last_clipboard_content = current_clipboard
-                        continue
-                    
-                    if self.should_translate(detected_lang):
-                        self.last_clipboard_content = current_clipboard
-                        self.translate_clipboard_content(current_clipboard, detected_lang)
-                    else:
-                        self.last_clipboard_content = current_clipboard
-                
-                time.sleep(1)  # 每秒检查一次
-                
-            except Exception as e:
-                print(f"剪贴板监听错误: {e}")
-                time.sleep(2)
+                if request.dropped:
+                    self.run_on_ui(self.append_result,
+                                   f"⏭️ 已跳过{request.dropped}条被新内容取代的剪贴板内容", "clipboard")
+                self.translate_clipboard_content(request.text, request.lang, request.cancel_event)
+            finally:
+                self.clipboard_coalescer.finish(request)
+        
+        self.submit_job(run)
     
-    def translate_clipboard_content(self, text, detected_lang):
-        """翻译剪贴板内容"""
+    def translate_clipboard_content(self, text, detected_lang, cancel_event=None):
+        """翻译剪贴板内容（在任务线程中执行，界面更新交给界面线程）"""
+        ui_append = lambda message, tag=None: self.run_on_ui(self.append_result, message, tag)
+        stream_mark = None
+        started = time.perf_counter()
         try:
             # 在结果区域显示来源
             timestamp = datetime.now().strftime("%H:%M:%S")
-            self.append_result(f"[{timestamp}] 📋 检测到剪贴板内容", "clipboard")
+            ui_append(f"[{timestamp}] 📋 检测到剪贴板内容", "clipboard")
+            model_name = self.ai_models[self.settings['model_key']].name
             
-            # 执行翻译
-            translation, usage_info = self.perform_translation(text, detected_lang)
+            # 流式输出：先显示原文，译文逐步追加
+            on_delta = None
+            if self.settings['stream_output']:
+                ui_append(f"🎯 正在自动翻译 ({model_name})", "timestamp")
+                ui_append(f"原文 ({detected_lang}): {text}", "original")
+                stream_mark = self.new_stream_mark()
+                self.run_on_ui(self.begin_stream_result, stream_mark, f"译文 ({self.settings['target_lang']}): ")
+                on_delta = lambda delta: self.run_on_ui(self.append_stream_delta, stream_mark, delta)
+            
+            # 执行翻译（增量模式下只翻译新增或修改的句子）
+            translation, usage_info = self.engine.translate(
+                text, detected_lang, on_delta=on_delta, cancel_event=cancel_event,
+                settings=self.settings, on_note=self.ui_note)
             
             # 更新成本统计
             if usage_info:
-                input_tokens = usage_info.get('prompt_tokens', 0)
-                output_tokens = usage_info.get('completion_tokens', 0)
-                
-                self.total_input_tokens += input_tokens
-                self.total_output_tokens += output_tokens
-                
-                cost = self.calculate_cost(input_tokens, output_tokens, self.selected_model_var.get())
-                self.estimated_cost += cost
-                self.update_cost_display()
+                cost, cost_info = self.record_usage(usage_info)
+                self.run_on_ui(self.update_cost_display)
                 
                 # 显示本次翻译成本
-                cost_info = f"本次成本: ${cost:.4f} (输入:{input_tokens} 输出:{output_tokens} tokens)"
-                self.append_result(cost_info, "cost")
+                ui_append(cost_info, "cost")
             
             # 显示结果
-            model_name = self.ai_models[self.selected_model_var.get()]['name']
-            self.append_result(f"🎯 自动翻译完成 ({model_name})", "timestamp")
-            self.append_result(f"原文 ({detected_lang}): {text}", "original")
-            self.append_result(f"译文 ({self.target_lang_var.get()}): {translation}", "translation")
-            self.append_result("=" * 50, "timestamp")
+            render_started = time.perf_counter()
+            if stream_mark is None:
+                ui_append(f"🎯 自动翻译完成 ({model_name})", "timestamp")
+                ui_append(f"原文 ({detected_lang}): {text}", "original")
+                ui_append(f"译文 ({self.settings['target_lang']}): {translation}", "translation")
+            ui_append("=" * 50, "timestamp")
+            self.run_on_ui(self.record_render_metrics, render_started, started)
             
             # 根据设置决定是否自动复制翻译结果到剪贴板
-            if self.auto_copy_result_var.get():
+            if self.settings['auto_copy_result']:
                 # 更新剪贴板内容记录，避免循环翻译
                 self.last_clipboard_content = translation
-                pyperclip.copy(translation)
-                self.append_result("📋 翻译结果已复制到剪贴板", "clipboard")
+                copy_text(translation)
+                ui_append("📋 翻译结果已复制到剪贴板", "clipboard")
             else:
-                self.append_result("💡 提示：可勾选'自动复制结果'选项自动复制翻译结果", "clipboard")
+                ui_append("💡 提示：可勾选'自动复制结果'选项自动复制翻译结果", "clipboard")
             
+        except TranslationCancelled as e:
+            # 已被新复制的内容取代，已产生的用量照常计入（引擎已计费）
+            if e.usage_info:
+                self.record_usage(e.usage_info)
+                self.run_on_ui(self.update_cost_display)
+            ui_append("⏭️ 已有新的剪贴板内容，取消本次翻译", "clipboard")
         except Exception as e:
-            self.append_result(f"❌ 自动翻译失败: {e}", "timestamp")
+            ui_append(f"❌ 自动翻译失败: {e}", "timestamp")
+        finally:
+            if stream_mark is not None:
+                self.run_on_ui(self.end_stream_result, stream_mark)
     
     def paste_and_translate(self):
         """粘贴并翻译功能"""
         try:
-            clipboard_content = pyperclip.paste()
+            clipboard_content = paste_text()
             if clipboard_content.strip():
                 # 清空输入框并粘贴内容
                 self.input_text.delete("1.0", tk.END)
@@ -474,13 +692,14 @@ class SimplifiedTeamsTranslator:
     def clear_results(self):
         """清空翻译结果"""
         self.result_text.delete("1.0", tk.END)
+        self.result_log.clear()
     
     def copy_results(self):
         """复制翻译结果"""
         try:
-            content = self.result_text.get("1.0", tk.END).strip()
+            content = self.result_log.text().strip()
             if content:
-                pyperclip.copy(content)
+                copy_text(content)
                 messagebox.showinfo("成功", "翻译结果已复制到剪贴板")
             else:
                 messagebox.showwarning("警告", "没有可复制的内容")
@@ -502,43 +721,36 @@ class SimplifiedTeamsTranslator:
         self.target_lang_var.set(current_source)
         
         # 显示切换结果
-        lang_names = {
-            'ja': '日语',
-            'zh': '中文', 
-            'en': '英语'
-        }
-        
-        source_name = lang_names.get(current_target, current_target)
-        target_name = lang_names.get(current_source, current_source)
+        source_name = LANG_NAMES.get(current_target, current_target)
+        target_name = LANG_NAMES.get(current_source, current_source)
         
         self.append_result(f"🔄 语言已切换: {source_name} → {target_name}", "timestamp")
     
     def open_terms_editor(self):
         """打开术语词典编辑器"""
-        TermsEditorWindow(self.root, self.custom_terms, self.update_custom_terms)
+        TermsEditorWindow(self.root, self.glossary, self.update_custom_terms)
     
-    def update_custom_terms(self, new_terms):
-        """更新自定义术语词典"""
-        self.custom_terms = new_terms
-        self.append_result(f"📚 术语词典已更新，共{len(new_terms)}个术语", "timestamp")
+    def update_custom_terms(self):
+        """术语词典变更后重建匹配自动机（连续编辑时合并为一次）"""
+        if self.terms_rebuild_after is not None:
+            self.root.after_cancel(self.terms_rebuild_after)
+        self.terms_rebuild_after = self.root.after(500, self.rebuild_term_matcher)
     
-    def preprocess_text_with_terms(self, text):
-        """使用术语词典预处理文本"""
-        processed_text = text
-        replacements = []
+    def rebuild_term_matcher(self):
+        """在后台线程中重建匹配自动机，完成后替换"""
+        self.terms_rebuild_after = None
         
-        # 查找并替换术语
-        for japanese_term, correct_term in self.custom_terms.items():
-            if japanese_term in processed_text:
-                processed_text = processed_text.replace(japanese_term, correct_term)
-                replacements.append(f"{japanese_term} → {correct_term}")
+        def rebuild():
+            count = self.engine.reload_glossary()
+            self.run_on_ui(self.append_result, f"📚 术语词典已更新，共{count}个术语", "timestamp")
         
-        return processed_text, replacements
+        self.submit_job(rebuild)
     
     def on_model_changed(self, event=None):
         """模型选择改变时的处理"""
         self.update_model_info()
-        self.append_result(f"🔄 已切换到模型: {self.ai_models[self.selected_model_var.get()]['name']}", "timestamp")
+        self.warm_up_client()
+        self.append_result(f"🔄 已切换到模型: {self.ai_models[self.selected_model_var.get()].name}", "timestamp")
     
     def update_model_info(self):
         """更新模型信息显示"""
@@ -550,21 +762,23 @@ class SimplifiedTeamsTranslator:
         model_info = self.ai_models[model_key]
         
         # 模型名称和推荐标识
-        name_text = model_info['name']
-        if model_info.get('recommended'):
+        name_text = model_info.name
+        if model_info.recommended:
             name_text += " ⭐ 推荐"
         
         ttk.Label(self.model_info_frame, text=name_text, font=("Arial", 10, "bold")).grid(row=0, column=0, sticky=tk.W)
         
         # 价格信息
-        price_text = f"输入: {model_info['input_price']} | 输出: {model_info['output_price']}"
+        price_text = f"输入: {format_price(model_info.input_price)} | 输出: {format_price(model_info.output_price)}"
+        if model_info.cached_input_price < model_info.input_price:
+            price_text += f" | 缓存命中输入: {format_price(model_info.cached_input_price)}"
         ttk.Label(self.model_info_frame, text=price_text, foreground="blue").grid(row=1, column=0, sticky=tk.W)
         
         # 描述信息
-        ttk.Label(self.model_info_frame, text=model_info['description'], foreground="gray").grid(row=2, column=0, sticky=tk.W)
+        ttk.Label(self.model_info_frame, text=model_info.description, foreground="gray").grid(row=2, column=0, sticky=tk.W)
         
         # 成本估算提示
-        provider = model_info.get('provider', 'openai')
+        provider = model_info.provider
         if model_key == "gpt-4":
             cost_warning = "⚠️ 注意：此模型成本较高，建议用于重要翻译"
             ttk.Label(self.model_info_frame, text=cost_warning, foreground="red").grid(row=3, column=0, sticky=tk.W)
@@ -582,23 +796,57 @@ class SimplifiedTeamsTranslator:
                 cost_tip = "💰 DeepSeek超高性价比，成本仅为GPT-4的1/100"
                 ttk.Label(self.model_info_frame, text=cost_tip, foreground="green").grid(row=3, column=0, sticky=tk.W)
     
-    def calculate_cost(self, input_tokens, output_tokens, model_key):
-        """计算翻译成本"""
-        model_info = self.ai_models[model_key]
-        
-        # 提取价格数字（简化处理）
-        input_price_per_1m = float(model_info['input_price'].split('$')[1].split('/')[0])
-        output_price_per_1m = float(model_info['output_price'].split('$')[1].split('/')[0])
+    def warm_up_client(self):
+        """在后台预热当前模型对应的API连接"""
+        settings = {
+            'model_key': self.selected_model_var.get(),
+            'openai_key': self.openai_key_var.get(),
+            'deepseek_key': self.deepseek_key_var.get(),
+        }
+        self.submit_job(self.engine.warm_up, settings)
+    
+    def record_usage(self, usage_info):
+        """累计一次翻译的会话用量（计费和账本由引擎完成），返回(本次成本, 成本说明)"""
+        cost = usage_info.get('cost', 0.0)
         
-        # 计算成本
-        input_cost = (input_tokens / 1000000) * input_price_per_1m
-        output_cost = (output_tokens / 1000000) * output_price_per_1m
+        # 剪贴板任务和手动翻译可能同时完成
+        with self.stats_lock:
+            self.total_input_tokens += usage_info.get('prompt_tokens', 0)
+            self.total_output_tokens += usage_info.get('completion_tokens', 0)
+            self.estimated_cost += cost
         
-        return input_cost + output_cost
+        return cost, usage_info.get('cost_info', "")
     
     def update_cost_display(self):
-        """更新成本显示"""
-        self.cost_label.config(text=f"本次会话成本: ${self.estimated_cost:.4f}")
+        """更新成本显示；本月累计在后台读取（可能经HTTP访问翻译服务），读取完成后再更新一次"""
+        self.show_cost()
+        if self.cost_loading:
+            self.cost_reload = True
+            return
+        self.cost_loading = True
+        self.submit_job(self.load_month_cost)
+    
+    def load_month_cost(self):
+        """后台线程：读取本月累计成本"""
+        month_cost = None
+        try:
+            month_cost = self.engine.cost_summary()['month_cost']
+        except Exception as e:
+            print(f"读取用量账本失败: {e}")
+        self.run_on_ui(self.on_month_cost_loaded, month_cost)
+    
+    def on_month_cost_loaded(self, month_cost):
+        self.cost_loading = False
+        if month_cost is not None:
+            self.month_cost = month_cost
+        self.show_cost()
+        # 读取期间又有新的用量
+        if self.cost_reload:
+            self.cost_reload = False
+            self.update_cost_display()
+    
+    def show_cost(self):
+        self.cost_label.config(text=f"本次会话成本: ${self.estimated_cost:.4f}  本月累计: ${self.month_cost:.4f}")
     
     def reset_cost_stats(self):
         """重置成本统计"""
@@ -606,7 +854,7 @@ class SimplifiedTeamsTranslator:
         self.total_output_tokens = 0
         self.estimated_cost = 0.0
         self.update_cost_display()
-        self.append_result("📊 成本统计已重置", "timestamp")
+        self.append_result("📊 本次会话成本统计已重置（用量账本不受影响）", "timestamp")
     
     def translate_text(self):
         """翻译输入的文本"""
@@ -618,7 +866,7 @@ class SimplifiedTeamsTranslator:
         # 检查API Key配置
         model_key = self.selected_model_var.get()
         model_info = self.ai_models[model_key]
-        provider = model_info.get('provider', 'openai')
+        provider = model_info.provider
         
         if provider == "deepseek":
             if not self.deepseek_key_var.get().strip():
@@ -633,48 +881,74 @@ class SimplifiedTeamsTranslator:
         if self.result_mode_var.get() == "clear":
             self.clear_results()
         
+        self.status_var.set("翻译中...")
+        self.submit_job(self.run_text_translation, text, on_error=self.on_text_translation_error)
+    
+    def run_text_translation(self, text):
+        """后台执行手动翻译"""
+        ui_append = lambda message, tag=None: self.run_on_ui(self.append_result, message, tag)
+        started = time.perf_counter()
+        
+        # 检测语言
+        detected_lang = self.detect_language(text)
+        
+        # 根据模式决定是否翻译
+        if not self.should_translate(detected_lang):
+            ui_append(f"🌐 检测到{detected_lang}，根据当前模式不进行翻译", "timestamp")
+            ui_append(f"原文: {text}", "original")
+            self.run_on_ui(self.status_var.set, "就绪")
+            return
+        
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        model_name = self.ai_models[self.settings['model_key']].name
+        
+        # 流式输出：先显示原文，译文逐步追加
+        on_delta = None
+        if self.settings['stream_output']:
+            ui_append(f"[{timestamp}] 🎯 正在翻译 ({model_name})", "timestamp")
+            ui_append(f"原文 ({detected_lang}): {text}", "original")
+            stream_mark = self.new_stream_mark()
+            self.run_on_ui(self.begin_stream_result, stream_mark, f"译文 ({self.settings['target_lang']}): ")
+            on_delta = lambda delta: self.run_on_ui(self.append_stream_delta, stream_mark, delta)
+        
+        # 执行翻译
         try:
-            # 检测语言
-            detected_lang = self.detect_language(text)
-            
-            # 根据模式决定是否翻译
-            if not self.should_translate(detected_lang):
-                self.append_result(f"🌐 检测到{detected_lang}，根据当前模式不进行翻译", "timestamp")
-                self.append_result(f"原文: {text}", "original")
-                return
-            
-            # 执行翻译
-            translation, usage_info = self.perform_translation(text, detected_lang)
-            
-            # 更新成本统计
-            if usage_info:
-                input_tokens = usage_info.get('prompt_tokens', 0)
-                output_tokens = usage_info.get('completion_tokens', 0)
-                
-                self.total_input_tokens += input_tokens
-                self.total_output_tokens += output_tokens
-                
-                cost = self.calculate_cost(input_tokens, output_tokens, self.selected_model_var.get())
-                self.estimated_cost += cost
-                self.update_cost_display()
-                
-                # 显示本次翻译成本
-                cost_info = f"本次成本: ${cost:.4f} (输入:{input_tokens} 输出:{output_tokens} tokens)"
-                self.append_result(cost_info, "cost")
-            
-            # 显示结果
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            model_name = self.ai_models[self.selected_model_var.get()]['name']
-            self.append_result(f"[{timestamp}] 🎯 翻译完成 ({model_name})", "timestamp")
-            self.append_result(f"原文 ({detected_lang}): {text}", "original")
-            self.append_result(f"译文 ({self.target_lang_var.get()}): {translation}", "translation")
-            self.append_result("=" * 50, "timestamp")
+            translation, usage_info = self.engine.translate(text, detected_lang, on_delta=on_delta,
+                                                            settings=self.settings, on_note=self.ui_note,
+                                                            incremental=False)
+        finally:
+            if on_delta is not None:
+                self.run_on_ui(self.end_stream_result, stream_mark)
+        
+        # 更新成本统计
+        if usage_info:
+            cost, cost_info = self.record_usage(usage_info)
+            self.run_on_ui(self.update_cost_display)
             
-        except Exception as e:
-            messagebox.showerror("错误", f"翻译失败: {e}")
+            # 显示本次翻译成本
+            ui_append(cost_info, "cost")
+        
+        # 显示结果
+        render_started = time.perf_counter()
+        if on_delta is None:
+            ui_append(f"[{timestamp}] 🎯 翻译完成 ({model_name})", "timestamp")
+            ui_append(f"原文 ({detected_lang}): {text}", "original")
+            ui_append(f"译文 ({self.settings['target_lang']}): {translation}", "translation")
+        ui_append("=" * 50, "timestamp")
+        self.run_on_ui(self.record_render_metrics, render_started, started)
+        self.run_on_ui(self.status_var.set, "翻译完成")
+    
+    def on_text_translation_error(self, error):
+        """手动翻译失败处理"""
+        self.status_var.set("翻译失败")
+        messagebox.showerror("错误", f"翻译失败: {error}")
     
     def batch_translate(self):
         """批量翻译功能"""
+        if self.batch_cancel_event is not None or self.file_translator is not None:
+            messagebox.showinfo("提示", "批量翻译正在进行中，可点击'取消批量'停止")
+            return
+        
         text = self.input_text.get("1.0", tk.END).strip()
         if not text:
             messagebox.showwarning("警告", "请输入要翻译的文本")
@@ -696,60 +970,175 @@ class SimplifiedTeamsTranslator:
         if self.result_mode_var.get() == "clear":
             self.clear_results()
         
-        self.append_result(f"🚀 开始批量翻译 {len(lines)} 行文本...", "timestamp")
+        settings = dict(self.settings)
+        concurrency = self.batch_concurrency_var.get()
+        pack = self.batch_pack_var.get()
+        if pack:
+            # 打包模式：按语言和token预算分组，每组一次请求
+            self.append_result(f"🚀 开始批量翻译 {len(lines)} 行文本（打包请求，并发 {concurrency}）...", "timestamp")
+        else:
+            self.append_result(f"🚀 开始批量翻译 {len(lines)} 行文本（并发 {concurrency}）...", "timestamp")
         
-        total_cost = 0.0
-        for i, line in enumerate(lines, 1):
-            try:
-                detected_lang = self.detect_language(line)
-                if self.should_translate(detected_lang):
-                    translation, usage_info = self.perform_translation(line, detected_lang)
-                    
-                    # 计算成本
-                    if usage_info:
-                        input_tokens = usage_info.get('prompt_tokens', 0)
-                        output_tokens = usage_info.get('completion_tokens', 0)
-                        cost = self.calculate_cost(input_tokens, output_tokens, self.selected_model_var.get())
-                        total_cost += cost
-                        
-                        self.total_input_tokens += input_tokens
-                        self.total_output_tokens += output_tokens
-                        self.estimated_cost += cost
-                    
-                    self.append_result(f"[{i}/{len(lines)}] {line} → {translation}", "translation")
-                else:
-                    self.append_result(f"[{i}/{len(lines)}] {line} (跳过翻译)", "original")
-                    
-                # 避免API限制，添加小延迟
-                time.sleep(0.5)
-                
-            except Exception as e:
-                self.append_result(f"[{i}/{len(lines)}] 翻译失败: {e}", "timestamp")
+        # 由引擎在事件循环中并发请求并按提供商限流；取消时中断进行中的请求
+        self.batch_cancel_event = threading.Event()
+        self.batch_cancel_button.config(state=tk.NORMAL)
+        self.submit_job(self.run_batch_translation, lines, settings, concurrency, pack, self.batch_cancel_event)
+    
+    def run_batch_translation(self, lines, settings, concurrency, pack, cancel_event):
+        """后台执行批量翻译，结果按顺序回到界面线程显示"""
+        summary = {"total": len(lines), "cost": 0.0, "shown": 0, "cancelled": False, "error": None}
+        
+        def on_result(results, usage_info):
+            self.run_on_ui(self.show_batch_result, lines, results, usage_info, summary)
+        
+        def on_progress(done, total):
+            self.run_on_ui(self.status_var.set, f"批量翻译进度: {done}/{total} 个请求")
+        
+        try:
+            self.engine.translate_batch(lines, settings=settings, concurrency=concurrency, on_progress=on_progress,
+                                        cancel_event=cancel_event, on_result=on_result, on_note=self.ui_note,
+                                        pack=pack)
+        except TranslationCancelled:
+            summary['cancelled'] = True
+        except Exception as e:
+            summary['error'] = e
+        finally:
+            self.run_on_ui(self.finish_batch_translation, summary)
+    
+    def show_batch_result(self, lines, results, usage_info, summary):
+        """显示一个批量翻译请求（单行或打包的一组行）的结果"""
+        # 计算成本
+        if usage_info:
+            cost, _ = self.record_usage(usage_info)
+            summary['cost'] += cost
+        
+        for index, translation in results:
+            summary['shown'] += 1
+            self.show_batch_line(index, lines[index], translation, summary)
+    
+    def show_batch_line(self, index, line, translation, summary):
+        """显示单行批量翻译结果，translation为None表示跳过，为异常表示失败"""
+        progress = f"[{index + 1}/{summary['total']}]"
+        
+        if isinstance(translation, Exception):
+            self.append_result(f"{progress} 翻译失败: {translation}", "timestamp")
+        elif translation is None:
+            self.append_result(f"{progress} {line} (跳过翻译)", "original")
+        else:
+            self.append_result(f"{progress} {line} → {translation}", "translation")
+    
+    def finish_batch_translation(self, summary):
+        """批量翻译结束处理"""
+        self.batch_cancel_event = None
+        self.batch_cancel_button.config(state=tk.DISABLED)
+        self.update_cost_display()
+        
+        if summary['cancelled']:
+            self.append_result(f"⏹️ 批量翻译已取消（{summary['total'] - summary['shown']} 行未翻译），"
+                               f"本次总成本: ${summary['cost']:.4f}", "cost")
+            self.status_var.set("批量翻译已取消")
+        elif summary['error'] is not None:
+            self.append_result(f"❌ 批量翻译失败: {summary['error']}（{summary['total'] - summary['shown']} 行未翻译），"
+                               f"本次总成本: ${summary['cost']:.4f}", "cost")
+            self.status_var.set("批量翻译失败")
+        else:
+            self.append_result(f"✅ 批量翻译完成，本次总成本: ${summary['cost']:.4f}", "cost")
+            self.status_var.set("批量翻译完成")
+    
+    def cancel_batch_translate(self):
+        """取消正在进行的批量翻译或文件翻译"""
+        if self.batch_cancel_event is not None:
+            self.batch_cancel_event.set()
+            self.status_var.set("正在取消批量翻译...")
+        if self.file_translator is not None:
+            self.file_translator.stop()
+            self.status_var.set("正在停止文件翻译（当前部分完成后停止）...")
+    
+    def translate_file(self):
+        """流式翻译TXT/SRT/VTT/CSV文件，译文逐段写入输出文件，中断后可从断点继续"""
+        # 文件翻译模块在首次使用时导入
+        from translator_core.file_translation import FileTranslator, default_output_path
+        
+        if self.batch_cancel_event is not None or self.file_translator is not None:
+            messagebox.showinfo("提示", "批量翻译正在进行中，可点击'取消批量'停止")
+            return
+        
+        input_path = filedialog.askopenfilename(
+            title="选择要翻译的文件",
+            filetypes=[("文本和字幕", "*.txt *.srt *.vtt *.csv"), ("所有文件", "*.*")]
+        )
+        if not input_path:
+            return
+        
+        settings = dict(self.settings)
+        concurrency = self.batch_concurrency_var.get()
+        output_path = default_output_path(input_path, settings['target_lang'])
+        translator = FileTranslator(
+            input_path, output_path,
+            lambda lines: self.engine.translate_batch(lines, settings=settings, concurrency=concurrency),
+            settings_key=f"{settings['model_key']}|{settings['source_lang']}|{settings['target_lang']}|"
+                         f"{settings['quality_enhance']}|{settings['translation_mode']}",
+            on_progress=lambda stats: self.run_on_ui(self.show_file_progress, stats)
+        )
+        
+        resume = True
+        checkpoint = translator.pending_checkpoint()
+        if checkpoint is not None:
+            resume = messagebox.askyesnocancel(
+                "继续翻译", f"上次已翻译到第 {checkpoint['records']} 条，是否从断点继续？\n选择“否”将重新开始")
+            if resume is None:
+                return
         
+        self.file_translator = translator
+        self.batch_cancel_button.config(state=tk.NORMAL)
+        self.append_result(f"📄 开始翻译文件: {os.path.basename(input_path)} → {output_path}", "timestamp")
+        self.submit_job(self.run_file_translation, translator, resume)
+    
+    def run_file_translation(self, translator, resume):
+        """后台执行文件翻译"""
+        try:
+            translator.run(resume)
+        except Exception as e:
+            self.run_on_ui(self.finish_file_translation, translator, e)
+        else:
+            self.run_on_ui(self.finish_file_translation, translator, None)
+    
+    def show_file_progress(self, stats):
+        percent = stats['bytes_read'] / stats['total_bytes'] if stats['total_bytes'] else 1.0
+        self.status_var.set(f"文件翻译进度: {percent:.0%}（{stats['records']} 条，成本 ${stats['cost']:.4f}）")
+    
+    def finish_file_translation(self, translator, error):
+        """文件翻译结束处理"""
+        self.file_translator = None
+        self.batch_cancel_button.config(state=tk.DISABLED)
+        stats = translator.stats
+        self.record_usage({'cost': stats['cost']})
         self.update_cost_display()
-        self.append_result(f"✅ 批量翻译完成，本次总成本: ${total_cost:.4f}", "cost")
+        
+        if error is not None:
+            self.append_result(f"❌ 文件翻译失败: {error}（已完成 {stats['records']} 条，可再次翻译该文件继续）",
+                               "timestamp")
+            self.status_var.set("文件翻译失败")
+        elif stats['stopped']:
+            self.append_result(f"⏹️ 文件翻译已停止（已完成 {stats['records']} 条，再次翻译该文件可继续），"
+                               f"本次成本: ${stats['cost']:.4f}", "cost")
+            self.status_var.set("文件翻译已停止")
+        else:
+            self.append_result(f"✅ 文件翻译完成: {translator.output_path}，本次成本: ${stats['cost']:.4f}", "cost")
+            self.status_var.set("文件翻译完成")
     
     def detect_language(self, text):
         """检测文本语言"""
-        if self.source_lang_var.get() != "auto":
-            return self.source_lang_var.get()
-        
-        # 简单的语言检测
-        hiragana_katakana = re.findall(r'[\u3040-\u309F\u30A0-\u30FF]', text)
-        chinese_chars = re.findall(r'[\u4E00-\u9FAF]', text)
-        
-        if hiragana_katakana:
-            return "ja"
-        elif chinese_chars and not hiragana_katakana:
-            return "zh"
-        elif re.findall(r'[a-zA-Z]', text):
-            return "en"
-        else:
-            return "unknown"
+        if self.settings['source_lang'] != "auto":
+            return self.settings['source_lang']
+        
+        # 单次扫描检测，可区分全汉字的日文和中文
+        with self.metrics.span("language_detect"):
+            return detect(text).language
     
     def should_translate(self, detected_lang):
         """根据翻译模式判断是否应该翻译"""
-        mode = self.translation_mode_var.get()
+        mode = self.settings['translation_mode']
         
         if mode == "japanese_only":
             return detected_lang == "ja"
@@ -758,133 +1147,97 @@ class SimplifiedTeamsTranslator:
         else:  # auto mode
             return True
     
-    def perform_translation(self, text, source_lang):
-        """执行翻译"""
-        # 使用术语词典预处理文本
-        processed_text, replacements = self.preprocess_text_with_terms(text)
-        
-        # 如果有术语替换，显示预处理信息
-        if replacements:
-            self.append_result(f"📚 术语预处理: {', '.join(replacements)}", "timestamp")
-        
-        # 构建翻译提示
-        lang_names = {
-            'ja': '日语',
-            'zh': '中文',
-            'en': '英语'
-        }
-        
-        source_name = lang_names.get(source_lang, source_lang)
-        target_name = lang_names.get(self.target_lang_var.get(), self.target_lang_var.get())
-        
-        # 根据质量增强模式调整提示
-        if self.quality_enhance_var.get():
-            prompt = f"""请将以下{source_name}文本翻译成{target_name}：
-
-原文：{processed_text}
-
-要求：
-1. 保持原意准确，特别注意专有名词和公司名称
-2. 语言自然流畅，符合{target_name}表达习惯
-3. 保持原文的语气和敬语程度
-4. 对于专业术语要准确翻译
-5. 语气词要自然转换，避免直译
-6. 只返回翻译结果，不要添加任何解释
-
-注意：
-- 已预处理的专有名词请保持不变
-- 技术术语要准确理解语境
-- 商务敬语要自然转换"""
-        else:
-            prompt = f"""请将以下{source_name}文本翻译成{target_name}：
-
-原文：{processed_text}
-
-要求：
-1. 保持原意准确
-2. 语言自然流畅
-3. 已预处理的专有名词请保持不变
-4. 只返回翻译结果，不要添加任何解释"""
-
-        messages = [
-            {"role": "system", "content": "你是专业的翻译助手，提供准确、自然的翻译。"},
-            {"role": "user", "content": prompt}
-        ]
+    def clear_translation_cache(self):
+        """清空翻译缓存；缓存条数在后台读取，确认后在后台清空（翻译服务无响应时不阻塞界面）"""
+        def clear():
+            self.engine.clear_cache()
+            self.ui_note("🗑️ 翻译缓存已清空", "timestamp")
         
-        # 获取模型信息
-        model_key = self.selected_model_var.get()
-        model_info = self.ai_models[model_key]
-        provider = model_info.get('provider', 'openai')
+        def confirm(size):
+            if messagebox.askyesno("确认", f"确定要清空 {size} 条翻译缓存吗？"):
+                self.submit_job(clear, on_error=self.on_cache_error)
         
-        # 获取实际API调用时使用的模型名称
-        api_model_name = model_info.get('api_model', model_key)
+        def load_size():
+            self.run_on_ui(confirm, self.engine.cache_size())
         
-        if OPENAI_V1:
-            # 质量增强模式使用更低的温度和更多token
-            if self.quality_enhance_var.get():
-                temperature = 0.1
-                max_tokens = 800
-                system_content = "你是专业的日中翻译专家，特别擅长商务日语翻译，对日本企业文化和专业术语有深入理解。"
-            else:
-                temperature = 0.3
-                max_tokens = 500
-                system_content = "你是专业的翻译助手，提供准确、自然的翻译。"
-            
-            messages = [
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": prompt}
-            ]
-            
-            if provider == "deepseek":
-                # 使用DeepSeek API
-                api_key = self.deepseek_key_var.get()
-                if not api_key.strip():
-                    raise Exception("请先配置DeepSeek API Key")
-                
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url="https://api.deepseek.com"
-                )
-            else:
-                # 使用OpenAI API
-                api_key = self.openai_key_var.get()
-                if not api_key.strip() or api_key.startswith("sk-your-default"):
-                    raise Exception("请先配置有效的OpenAI API Key")
-                
-                # 指定代理域名，避免直接访问官方域名受限
-                client = OpenAI(api_key=api_key, base_url="https://api.openai-proxy.com/v1")
-            
-            response = client.chat.completions.create(
-                model=api_model_name,  # 使用实际的API模型名称
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            translation = response.choices[0].message.content.strip()
-            usage_info = response.usage.__dict__ if response.usage else {}
-        else:
-            # 使用旧版本OpenAI库 (v0.x)
-            openai.api_key = self.openai_key_var.get()
-            # 使用代理域名
-            openai.api_base = "https://api.openai-proxy.com/v1"
-            response = openai.ChatCompletion.create(
-                model=self.selected_model_var.get(),
-                messages=messages,
-                max_tokens=500,
-                temperature=0.3
-            )
-            translation = response.choices[0].message.content.strip()
-            usage_info = response.get('usage', {})
-        
-        return translation, usage_info
+        self.submit_job(load_size, on_error=self.on_cache_error)
+    
+    def on_cache_error(self, error):
+        """清空缓存失败处理"""
+        messagebox.showerror("错误", f"清空翻译缓存失败: {error}")
     
     def clear_input(self):
         """清空输入框"""
         self.input_text.delete("1.0", tk.END)
     
+    def run_on_ui(self, func, *args):
+        """在界面线程执行函数（后台线程不直接操作控件）"""
+        if threading.current_thread() is threading.main_thread():
+            func(*args)
+        else:
+            self.dispatcher.post(func, *args)
+    
+    def ui_note(self, message, tag=None):
+        """在结果区显示引擎的提示信息（任意线程可调用）"""
+        self.run_on_ui(self.append_result, message, tag)
+    
+    def new_stream_mark(self):
+        """生成流式输出位置标记名"""
+        self.stream_counter += 1
+        return f"stream_{self.stream_counter}"
+    
+    def begin_stream_result(self, mark, prefix):
+        """插入流式译文行，之后的增量插入到该行末尾"""
+        self.result_text.insert(tk.END, prefix + "\n", "translation")
+        # 标记放在本行换行符之前，其他结果仍追加在后面
+        self.result_text.mark_set(mark, "end-2c")
+        self.result_text.mark_gravity(mark, tk.RIGHT)
+        self.trim_results(self.result_log.begin_stream(mark, prefix, "translation"))
+        self.scroll_results_to_end()
+    
+    def append_stream_delta(self, mark, delta):
+        """追加一段流式译文"""
+        self.result_text.insert(mark, delta, "translation")
+        self.result_log.extend_stream(mark, delta)
+        self.scroll_results_to_end()
+    
+    def end_stream_result(self, mark):
+        """结束流式输出"""
+        self.result_text.mark_unset(mark)
+        self.result_log.end_stream(mark)
+    
     def append_result(self, text, tag=None):
         """添加结果文本"""
         self.result_text.insert(tk.END, text + "\n", tag)
+        self.trim_results(self.result_log.append(text, tag))
+        self.scroll_results_to_end()
+    
+    def record_render_metrics(self, render_started, started):
+        """结果已显示（界面线程按顺序执行到此处），记录界面渲染和端到端耗时"""
+        now = time.perf_counter()
+        self.metrics.observe("ui_render", now - render_started)
+        self.metrics.observe("end_to_end", now - started)
+    
+    def trim_results(self, lines):
+        """从结果区开头删除已被结果日志裁掉的行"""
+        if lines:
+            self.result_text.delete("1.0", f"{lines + 1}.0")
+    
+    def update_result_limit(self, *args):
+        """更新结果区保留行数"""
+        try:
+            self.result_log.max_lines = max(200, int(self.result_max_lines_var.get()))
+        except (tk.TclError, ValueError):
+            pass
+    
+    def scroll_results_to_end(self):
+        """滚动到结果末尾，同一帧内的多次请求合并为一次"""
+        if not self.scroll_pending:
+            self.scroll_pending = True
+            self.root.after_idle(self._scroll_results)
+    
+    def _scroll_results(self):
+        self.scroll_pending = False
         self.result_text.see(tk.END)
     
     def run(self):
@@ -892,6 +1245,19 @@ class SimplifiedTeamsTranslator:
         # 程序关闭时停止剪贴板监听
         def on_closing():
             self.is_running = False
+            if self.clipboard_watcher is not None:
+                self.clipboard_watcher.stop()
+            self.clipboard_coalescer.stop()
+            if self.batch_cancel_event is not None:
+                self.batch_cancel_event.set()
+            if self.file_translator is not None:
+                self.file_translator.stop()
+            self.dispatcher.stop()
+            self.job_executor.shutdown(wait=False, cancel_futures=True)
+            # 本进程提供的翻译服务随之停止，引擎关闭时一并关闭术语词典
+            self.engine.close()
+            if not self.local_engine:
+                self.glossary.close()
             self.root.destroy()
         
         self.root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -899,19 +1265,32 @@ class SimplifiedTeamsTranslator:
 
 # 术语词典编辑器窗口
 class TermsEditorWindow:
-    """术语词典编辑器"""
+    """术语词典编辑器（虚拟列表，只渲染可见行）"""
+    
+    ROW_HEIGHT = 20
     
-    def __init__(self, parent, current_terms, update_callback):
+    def __init__(self, parent, glossary_store, update_callback):
         self.window = tk.Toplevel(parent)
         self.window.title("术语词典编辑器")
-        self.window.geometry("700x500")
+        self.window.geometry("700x560")
         self.window.transient(parent)
         
-        self.current_terms = current_terms.copy()
+        self.store = glossary_store
         self.update_callback = update_callback
         
+        self.glossary_var = tk.StringVar(value=DEFAULT_GLOSSARY)
+        self.enabled_var = tk.BooleanVar(value=self.store.is_enabled(DEFAULT_GLOSSARY))
+        self.search_var = tk.StringVar()
+        self.count_var = tk.StringVar()
+        
+        # 虚拟列表状态：只查询和渲染 offset 开始的 visible_rows 行
+        self.offset = 0
+        self.total = 0
+        self.visible_rows = 12
+        self.search_after_id = None
+        
         self.create_widgets()
-        self.load_terms()
+        self.refresh()
     
     def create_widgets(self):
         """创建界面组件"""
@@ -924,11 +1303,31 @@ class TermsEditorWindow:
         info_text = """
 💡 使用说明：
 • 左侧输入日语原文，右侧输入正确翻译
-• 支持专有名词、公司名称、技术术语等
-• 翻译时会自动替换匹配的术语
+• 可按项目或客户建立多个词典，勾选“启用”的词典参与翻译
+• 修改即时保存，翻译时会自动替换匹配的术语
 • 有助于提高转录错误文本的翻译准确性
         """
-        ttk.Label(main_frame, text=info_text, justify=tk.LEFT, foreground="blue").pack(anchor=tk.W, pady=(0, 15))
+        ttk.Label(main_frame, text=info_text, justify=tk.LEFT, foreground="blue").pack(anchor=tk.W, pady=(0, 10))
+        
+        # 词典选择和搜索
+        glossary_frame = ttk.Frame(main_frame)
+        glossary_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(glossary_frame, text="词典:").pack(side=tk.LEFT, padx=5)
+        self.glossary_combo = ttk.Combobox(glossary_frame, textvariable=self.glossary_var,
+                                           values=self.store.list_glossaries(), state="readonly", width=15)
+        self.glossary_combo.pack(side=tk.LEFT, padx=5)
+        self.glossary_combo.bind('<<ComboboxSelected>>', self.on_glossary_changed)
+        
+        ttk.Button(glossary_frame, text="新建词典", command=self.create_glossary).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(glossary_frame, text="启用", variable=self.enabled_var,
+                        command=self.toggle_glossary_enabled).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(glossary_frame, textvariable=self.count_var, foreground="gray").pack(side=tk.RIGHT, padx=5)
+        search_entry = ttk.Entry(glossary_frame, textvariable=self.search_var, width=15)
+        search_entry.pack(side=tk.RIGHT, padx=5)
+        ttk.Label(glossary_frame, text="搜索:").pack(side=tk.RIGHT)
+        self.search_var.trace_add("write", self.on_search_changed)
         
         # 术语列表框架
         list_frame = ttk.LabelFrame(main_frame, text="术语列表", padding="10")
@@ -936,7 +1335,7 @@ class TermsEditorWindow:
         
         # 创建表格
         columns = ("日语原文", "正确翻译", "操作")
-        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=12)
+        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=self.visible_rows)
         
         # 设置列标题和宽度
         self.tree.heading("日语原文", text="日语原文")
@@ -947,15 +1346,18 @@ class TermsEditorWindow:
         self.tree.column("正确翻译", width=200)
         self.tree.column("操作", width=100)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # 滚动条由虚拟列表控制，而不是直接滚动表格
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.on_scroll)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # 双击编辑
+        # 双击编辑，滚轮翻动，窗口大小变化时重新计算可见行数
         self.tree.bind("<Double-1>", self.edit_term)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.tree.bind("<Configure>", self.on_tree_resized)
         
         # 添加新术语框架
         add_frame = ttk.LabelFrame(main_frame, text="添加新术语", padding="10")
@@ -982,18 +1384,95 @@ class TermsEditorWindow:
         
         ttk.Button(button_frame, text="删除选中", command=self.delete_term).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="导入预设", command=self.import_presets).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="保存", command=self.save_terms).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(button_frame, text="取消", command=self.window.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="导入文件", command=self.import_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=self.window.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    @property
+    def glossary(self):
+        return self.glossary_var.get()
     
-    def load_terms(self):
-        """加载术语到表格"""
-        # 清空现有项目
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def refresh(self):
+        """重新统计数量并渲染当前可见行"""
+        self.total = self.store.count(self.glossary, self.search_var.get().strip())
+        self.count_var.set(f"共 {self.total} 条")
+        self.render()
+    
+    def render(self):
+        """只查询并显示可见范围内的术语"""
+        self.offset = max(0, min(self.offset, self.total - self.visible_rows))
+        
+        # 清空现有项目（最多一屏）
+        self.tree.delete(*self.tree.get_children())
         
-        # 添加术语
-        for japanese, translation in self.current_terms.items():
+        rows = self.store.page(self.glossary, self.offset, self.visible_rows, self.search_var.get().strip())
+        for japanese, translation in rows:
             self.tree.insert("", tk.END, values=(japanese, translation, "双击编辑"))
+        
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, min(1.0, (self.offset + self.visible_rows) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def on_scroll(self, action, value, unit=None):
+        """滚动条拖动或点击"""
+        if action == "moveto":
+            self.offset = int(float(value) * self.total)
+            self.render()
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_rows(int(value) * step)
+    
+    def on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+        return "break"
+    
+    def scroll_rows(self, rows):
+        self.offset += rows
+        self.render()
+    
+    def on_tree_resized(self, event):
+        """根据表格高度调整可见行数"""
+        rows = max(1, (event.height - self.ROW_HEIGHT) // self.ROW_HEIGHT)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.tree.configure(height=rows)
+            self.render()
+    
+    def on_search_changed(self, *args):
+        """搜索输入防抖，停止输入后再查询"""
+        if self.search_after_id is not None:
+            self.window.after_cancel(self.search_after_id)
+        self.search_after_id = self.window.after(300, self.apply_search)
+    
+    def apply_search(self):
+        self.search_after_id = None
+        self.offset = 0
+        self.refresh()
+    
+    def on_glossary_changed(self, event=None):
+        """切换词典"""
+        self.enabled_var.set(self.store.is_enabled(self.glossary))
+        self.offset = 0
+        self.refresh()
+    
+    def create_glossary(self):
+        """新建词典（如按项目或客户）"""
+        name = simpledialog.askstring("新建词典", "请输入词典名称（如项目或客户名）:", parent=self.window)
+        if not name:
+            return
+        try:
+            self.store.create_glossary(name.strip())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e), parent=self.window)
+            return
+        self.glossary_combo.config(values=self.store.list_glossaries())
+        self.glossary_var.set(name.strip())
+        self.on_glossary_changed()
+    
+    def toggle_glossary_enabled(self):
+        """启用或停用当前词典"""
+        self.store.set_enabled(self.glossary, self.enabled_var.get())
+        self.update_callback()
     
     def add_term(self):
         """添加新术语"""
@@ -1004,8 +1483,9 @@ class TermsEditorWindow:
             messagebox.showwarning("警告", "请输入日语原文和正确翻译")
             return
         
-        self.current_terms[japanese] = translation
-        self.load_terms()
+        self.store.upsert(self.glossary, japanese, translation)
+        self.update_callback()
+        self.refresh()
         
         # 清空输入框
         self.japanese_entry.delete(0, tk.END)
@@ -1050,13 +1530,10 @@ class TermsEditorWindow:
                 messagebox.showwarning("警告", "请输入完整信息")
                 return
             
-            # 删除旧术语
-            if japanese in self.current_terms:
-                del self.current_terms[japanese]
-            
-            # 添加新术语
-            self.current_terms[new_japanese] = new_translation
-            self.load_terms()
+            # 只更新这一条术语
+            self.store.rename(self.glossary, japanese, new_japanese, new_translation)
+            self.update_callback()
+            self.render()
             edit_window.destroy()
         
         button_frame = ttk.Frame(frame)
@@ -1077,9 +1554,9 @@ class TermsEditorWindow:
         japanese = values[0]
         
         if messagebox.askyesno("确认", f"确定要删除术语 '{japanese}' 吗？"):
-            if japanese in self.current_terms:
-                del self.current_terms[japanese]
-            self.load_terms()
+            self.store.delete(self.glossary, japanese)
+            self.update_callback()
+            self.refresh()
     
     def import_presets(self):
         """导入预设术语"""
@@ -1103,20 +1580,44 @@ class TermsEditorWindow:
             "プラットフォーム": "平台"
         }
         
-        added_count = 0
-        for japanese, translation in presets.items():
-            if japanese not in self.current_terms:
-                self.current_terms[japanese] = translation
-                added_count += 1
-        
-        self.load_terms()
+        added_count = self.store.import_terms(self.glossary, presets, overwrite=False)
+        self.update_callback()
+        self.refresh()
         messagebox.showinfo("成功", f"已导入 {added_count} 个预设术语")
     
-    def save_terms(self):
-        """保存术语词典"""
-        self.update_callback(self.current_terms)
-        messagebox.showinfo("成功", f"术语词典已保存，共 {len(self.current_terms)} 个术语")
-        self.window.destroy()
+    def import_file(self):
+        """从CSV/TSV文件导入术语（每行：原文,译文）"""
+        path = filedialog.askopenfilename(
+            parent=self.window, title="选择术语文件",
+            filetypes=[("术语文件", "*.csv *.tsv *.txt"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        
+        added_count = 0
+        try:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                first_line = f.readline()
+                delimiter = "\t" if "\t" in first_line else ","
+                f.seek(0)
+                
+                # 分批写入，大文件也不会一次性载入内存
+                batch = {}
+                for row in csv.reader(f, delimiter=delimiter):
+                    if len(row) >= 2 and row[0].strip() and row[1].strip():
+                        batch[row[0].strip()] = row[1].strip()
+                    if len(batch) >= 5000:
+                        added_count += self.store.import_terms(self.glossary, batch)
+                        batch = {}
+                if batch:
+                    added_count += self.store.import_terms(self.glossary, batch)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            messagebox.showerror("错误", f"导入失败: {e}", parent=self.window)
+            return
+        
+        self.update_callback()
+        self.refresh()
+        messagebox.showinfo("成功", f"已导入 {added_count} 个新术语", parent=self.window)
 
 # 模型对比窗口
 class ModelComparisonWindow:
@@ -1136,13 +1637,14 @@ class ModelComparisonWindow:
         ttk.Label(main_frame, text="AI模型价格对比", font=("Arial", 14, "bold")).pack(pady=(0, 20))
         
         # 创建表格
-        columns = ("模型", "提供商", "输入价格", "输出价格", "描述", "推荐")
+        columns = ("模型", "提供商", "输入价格", "缓存命中价格", "输出价格", "描述", "推荐")
         tree = ttk.Treeview(main_frame, columns=columns, show="headings", height=15)
         
         # 设置列标题和宽度
         tree.heading("模型", text="模型")
         tree.heading("提供商", text="提供商")
         tree.heading("输入价格", text="输入价格")
+        tree.heading("缓存命中价格", text="缓存命中价格")
         tree.heading("输出价格", text="输出价格")
         tree.heading("描述", text="描述")
         tree.heading("推荐", text="推荐")
@@ -1150,20 +1652,22 @@ class ModelComparisonWindow:
         tree.column("模型", width=180)
         tree.column("提供商", width=80)
         tree.column("输入价格", width=120)
+        tree.column("缓存命中价格", width=120)
         tree.column("输出价格", width=120)
-        tree.column("描述", width=250)
+        tree.column("描述", width=200)
         tree.column("推荐", width=60)
         
         # 添加数据
         for model_key, model_info in models_data.items():
-            recommended = "⭐ 是" if model_info.get('recommended') else "否"
-            provider = model_info.get('provider', 'openai').upper()
+            recommended = "⭐ 是" if model_info.recommended else "否"
+            provider = model_info.provider.upper()
             tree.insert("", tk.END, values=(
-                model_info['name'],
+                model_info.name,
                 provider,
-                model_info['input_price'],
-                model_info['output_price'],
-                model_info['description'],
+                format_price(model_info.input_price),
+                format_price(model_info.cached_input_price),
+                format_price(model_info.output_price),
+                model_info.description,
                 recommended
             ))
         
@@ -1199,6 +1703,116 @@ class ModelComparisonWindow:
         # 关闭按钮
         ttk.Button(main_frame, text="关闭", command=self.window.destroy).pack(pady=10)
 
+# 延迟指标窗口
+class MetricsWindow:
+    """各阶段耗时的p50/p95/p99，定时刷新，可导出OpenMetrics文件"""
+    
+    def __init__(self, parent, sources, submit_job, run_on_ui, refresh_ms=1000):
+        self.sources = sources  # 界面进程和翻译引擎各自的统计
+        # 翻译服务的统计经HTTP读取，在后台线程中进行，结果回到界面线程显示
+        self.submit_job = submit_job
+        self.run_on_ui = run_on_ui
+        self.refresh_ms = refresh_ms
+        self.rows = []
+        self.loading = False
+        self.window = tk.Toplevel(parent)
+        self.window.title("延迟指标")
+        self.window.geometry("720x420")
+        self.window.transient(parent)
+        
+        main_frame = ttk.Frame(self.window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="翻译链路各阶段耗时（毫秒）", font=("Arial", 14, "bold")).pack(pady=(0, 10))
+        
+        columns = ("阶段", "次数", "平均", "p50", "p95", "p99")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings", height=10)
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=160 if column == "阶段" else 90,
+                             anchor=tk.W if column == "阶段" else tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.slowest_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=self.slowest_var, foreground="blue").pack(anchor=tk.W, pady=(10, 0))
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="导出OpenMetrics", command=self.export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="重置", command=self.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=self.window.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.refresh()
+    
+    def refresh(self):
+        """定时刷新，窗口关闭后停止；上一次读取尚未完成时跳过"""
+        if not self.window.winfo_exists():
+            return
+        self.load()
+        self.window.after(self.refresh_ms, self.refresh)
+    
+    def load(self, reset=False):
+        """在后台读取统计（reset为真时先清空）"""
+        if self.loading:
+            return
+        self.loading = True
+        self.submit_job(self.collect, reset)
+    
+    def collect(self, reset):
+        """后台线程：合并各来源的统计，同一阶段合为一行"""
+        rows = []
+        for metrics in self.sources:
+            try:
+                if reset:
+                    metrics.reset()
+                rows.extend(metrics.snapshot())
+            except Exception as e:
+                print(f"读取延迟指标失败: {e}")
+        self.run_on_ui(self.render, merge_rows(rows))
+    
+    def render(self, rows):
+        """按当前统计重绘表格"""
+        self.loading = False
+        self.rows = rows
+        if not self.window.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for stage, count, average, *quantiles in rows:
+            self.tree.insert("", tk.END, values=(
+                STAGES.get(stage, stage), count,
+                *(f"{value * 1000:.1f}" for value in (average, *quantiles))
+            ))
+        
+        # 端到端和网络总耗时包含其他阶段，不参与比较
+        stages = [row for row in rows if row[0] not in ("end_to_end", "network_total")]
+        if stages:
+            stage, _, _, _, p95, _ = max(stages, key=lambda row: row[4])
+            self.slowest_var.set(f"🐢 p95最慢阶段: {STAGES.get(stage, stage)}（{p95 * 1000:.1f} 毫秒）")
+        else:
+            self.slowest_var.set("💡 暂无数据，完成一次翻译后显示")
+    
+    def export(self):
+        """导出为OpenMetrics文本文件"""
+        path = filedialog.asksaveasfilename(
+            parent=self.window, title="导出指标", initialdir=DATA_DIR,
+            initialfile="metrics.prom", defaultextension=".prom",
+            filetypes=[("OpenMetrics", "*.prom"), ("文本文件", "*.txt"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        from translator_core.openmetrics import export_openmetrics
+        try:
+            export_openmetrics(self.rows, path)
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {e}", parent=self.window)
+            return
+        messagebox.showinfo("成功", f"已导出到 {path}", parent=self.window)
+    
+    def reset(self):
+        """清空已记录的耗时"""
+        self.loading = False
+        self.load(reset=True)
+
 # 使用说明窗口（更新版）
 class UsageGuideWindow:
     """使用说明窗口"""
@@ -1259,6 +1873,11 @@ Teams简化版实时翻译助手 v2.1 使用说明
    - 点击"批量翻译"
    - 逐行翻译显示
 
+4. 文件翻译：
+   - 点击"翻译文件"选择TXT/SRT/VTT/CSV文件
+   - 译文逐段写入"原文件名.目标语言"文件
+   - 中断后再次翻译同一文件可从断点继续
+
 💡 使用技巧：
 - 选择"追加显示"保留历史翻译
 - 选择"清空显示"只显示当前翻译
@@ -1290,6 +1909,10 @@ def main():
     def show_model_comparison():
         ModelComparisonWindow(app.root, app.ai_models)
     
+    # 显示延迟指标
+    def show_metrics():
+        MetricsWindow(app.root, [app.metrics, app.engine.metrics], app.submit_job, app.run_on_ui)
+    
     # 添加菜单
     menubar = tk.Menu(app.root)
     app.root.config(menu=menubar)
@@ -1298,6 +1921,7 @@ def main():
     menubar.add_cascade(label="帮助", menu=help_menu)
     help_menu.add_command(label="使用说明", command=show_guide)
     help_menu.add_command(label="模型对比", command=show_model_comparison)
+    help_menu.add_command(label="延迟指标", command=show_metrics)
     
     app.run()
 
@@ -0,0 +1,72 @@
+import pytest
+
+from translator_core import cache as cache_module
+from translator_core.cache import TranslationCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(tmp_path, **kwargs):
+    return TranslationCache(db_path=str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_hit_and_miss(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    key = TranslationCache.make_key("hello", "en", "zh", "deepseek", False)
+    assert cache.get(key) is None
+    cache.put(key, "你好")
+    assert cache.get(key) == "你好"
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_expired_entry_is_removed(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("k", "v")
+    clock[0] += 61
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_expired_entries_purged_on_open(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("k", "v")
+    cache.close()
+    clock[0] += 61
+    reopened = make_cache(tmp_path, ttl_seconds=60)
+    assert len(reopened) == 0
+    reopened.close()
+
+
+def test_eviction_drops_least_recently_used(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=10, memory_entries=0)
+    for i in range(10):
+        clock[0] += 1
+        cache.put(f"k{i}", str(i))
+    clock[0] += 1
+    assert cache.get("k0") == "0"
+    clock[0] += 1
+    cache.put("k10", "10")
+
+    # 超出上限后淘汰到九成，最早写入且未再访问的条目先被淘汰
+    assert len(cache) == 9
+    assert cache.get("k0") == "0"
+    assert cache.get("k1") is None
+    assert cache.get("k2") is None
+    assert cache.get("k10") == "10"
+    cache.close()
+
+
+def test_entries_survive_reopen(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put("k", "v")
+    cache.close()
+    reopened = make_cache(tmp_path)
+    assert reopened.get("k") == "v"
+    reopened.close()
@@ -0,0 +1,27 @@
+import pytest
+
+from translator_core.langdetect import detect
+
+
+@pytest.mark.parametrize("text", ["会議資料", "日本語", "東京都新宿区"])
+def test_kanji_only_japanese(text):
+    assert detect(text).language == "ja"
+
+
+def test_kana_is_japanese():
+    assert detect("明日の会議は十時からです").language == "ja"
+
+
+def test_simplified_chinese():
+    result = detect("我们明天开会讨论这个问题")
+    assert result.language == "zh"
+
+
+def test_ambiguous_han_is_unknown():
+    result = detect("中国人民")
+    assert result.language == "unknown"
+    assert result.confidence < 0.5
+
+
+def test_english():
+    assert detect("Let's sync up tomorrow morning").language == "en"
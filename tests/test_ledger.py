@@ -0,0 +1,81 @@
+import json
+import time
+
+from translator_core.ledger import UsageLedger
+
+
+def make_ledger(tmp_path):
+    return UsageLedger(path=str(tmp_path / "ledger.jsonl"),
+                       rollup_path=str(tmp_path / "rollups.json"),
+                       flush_interval=60)
+
+
+def write_entry(path, **entry):
+    record = dict({"ts": time.time(), "model": "deepseek", "input": 10, "output": 5,
+                   "cached": 0, "latency": 0.5, "cost": 0.01}, **entry)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def test_totals_survive_restart(tmp_path):
+    ledger = make_ledger(tmp_path)
+    ledger.record("deepseek", input_tokens=10, output_tokens=5, cost=0.01)
+    ledger.record("gpt-4o", input_tokens=20, output_tokens=8, cost=0.02, cache_hit=True)
+    ledger.close()
+
+    reopened = make_ledger(tmp_path)
+    totals = reopened.today()
+    assert totals["requests"] == 2
+    assert totals["cache_hits"] == 1
+    assert totals["input_tokens"] == 30
+    assert reopened.by_model()["gpt-4o"]["output_tokens"] == 8
+    reopened.close()
+
+
+def test_records_after_rollup_are_replayed(tmp_path):
+    ledger = make_ledger(tmp_path)
+    ledger.record("deepseek", input_tokens=10)
+    ledger.close()
+
+    # 模拟异常退出：账本已写入，汇总未更新，末尾还有半条记录
+    write_entry(tmp_path / "ledger.jsonl", input=7)
+    with open(tmp_path / "ledger.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"ts": 1, "mod')
+
+    reopened = make_ledger(tmp_path)
+    assert reopened.today()["requests"] == 2
+    assert reopened.today()["input_tokens"] == 17
+    reopened.record("deepseek", input_tokens=1)
+    reopened.close()
+
+    # 半条记录之后的新记录单独成行，再次启动时不重复计入
+    again = make_ledger(tmp_path)
+    assert again.today()["requests"] == 3
+    assert again.today()["input_tokens"] == 18
+    again.close()
+
+
+def test_rebuilds_from_ledger_without_rollups(tmp_path):
+    write_entry(tmp_path / "ledger.jsonl")
+    write_entry(tmp_path / "ledger.jsonl", model="gpt-4o")
+
+    ledger = make_ledger(tmp_path)
+    assert ledger.today()["requests"] == 2
+    assert set(ledger.by_model()) == {"deepseek", "gpt-4o"}
+    ledger.close()
+
+
+def test_truncated_ledger_discards_stale_rollups(tmp_path):
+    ledger = make_ledger(tmp_path)
+    for _ in range(3):
+        ledger.record("deepseek", input_tokens=10)
+    ledger.close()
+
+    # 账本被替换为更短的文件，旧汇总的偏移量超出文件长度
+    (tmp_path / "ledger.jsonl").write_text("")
+    write_entry(tmp_path / "ledger.jsonl", input=4)
+
+    reopened = make_ledger(tmp_path)
+    assert reopened.today()["requests"] == 1
+    assert reopened.today()["input_tokens"] == 4
+    reopened.close()
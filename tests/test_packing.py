@@ -0,0 +1,32 @@
+from translator_core.packing import pack_lines, split_pack
+
+
+def test_groups_keep_order_and_split_on_language_change():
+    items = [("a", "en"), ("b", "en"), ("こんにちは", "ja"), ("c", "en")]
+    chunks = pack_lines(items)
+    assert chunks == [
+        [(0, "a", "en"), (1, "b", "en")],
+        [(2, "こんにちは", "ja")],
+        [(3, "c", "en")],
+    ]
+
+
+def test_max_lines_limits_group_size():
+    chunks = pack_lines([(str(i), "en") for i in range(5)], max_lines=2)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_token_budget_limits_group_size():
+    long_line = "word " * 200
+    chunks = pack_lines([(long_line, "en"), (long_line, "en")], token_budget=250)
+    assert len(chunks) == 2
+
+
+def test_oversized_line_still_gets_its_own_group():
+    chunks = pack_lines([("word " * 500, "en")], token_budget=10)
+    assert len(chunks) == 1
+
+
+def test_split_pack_returns_single_line_groups():
+    chunk = [(0, "a", "en"), (1, "b", "en")]
+    assert split_pack(chunk) == [[(0, "a", "en")], [(1, "b", "en")]]
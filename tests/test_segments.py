@@ -0,0 +1,35 @@
+from translator_core.segments import SegmentStore, fingerprint, split_segments
+
+
+def test_split_round_trips_text():
+    text = "第一句。第二句！Third one. Fourth?\n最后一行"
+    segments = split_segments(text)
+    assert [body for body, _ in segments] == ["第一句。", "第二句！", "Third one.", "Fourth?", "最后一行"]
+    assert "".join(body + separator for body, separator in segments) == text
+
+
+def test_edited_sentence_changes_only_its_fingerprint():
+    before = [body for body, _ in split_segments("今天开会。讨论预算。")]
+    after = [body for body, _ in split_segments("今天开会。讨论明年预算。")]
+    keys_before = [fingerprint(s, "zh", "en", "deepseek", False) for s in before]
+    keys_after = [fingerprint(s, "zh", "en", "deepseek", False) for s in after]
+    assert keys_before[0] == keys_after[0]
+    assert keys_before[1] != keys_after[1]
+
+
+def test_fingerprint_ignores_whitespace_but_not_settings():
+    key = fingerprint("Hello  world.", "en", "zh", "deepseek", False)
+    assert key == fingerprint("Hello world.", "en", "zh", "deepseek", False)
+    assert key != fingerprint("Hello world.", "en", "zh", "gpt-4o", False)
+    assert key != fingerprint("Hello world.", "en", "zh", "deepseek", True)
+
+
+def test_store_reuses_and_evicts_least_recent():
+    store = SegmentStore(max_entries=2)
+    store.put("a", "甲")
+    store.put("b", "乙")
+    assert store.get("a") == "甲"
+    store.put("c", "丙")
+    assert store.get("b") is None
+    assert store.get("a") == "甲"
+    assert len(store) == 2
@@ -0,0 +1,28 @@
+from translator_core.terms import TermMatcher
+
+
+def test_longest_term_wins_at_same_start():
+    matcher = TermMatcher({"Teams": "团队", "Teams会议": "Teams会议（线上）"})
+    assert matcher.find_matches("明天开Teams会议") == [(3, "Teams会议")]
+
+
+def test_leftmost_match_blocks_overlapping_term():
+    # "ABC" 从更左的位置开始，重叠的 "BCD" 不再匹配
+    matcher = TermMatcher({"ABC": "1", "BCD": "2", "D": "3"})
+    assert matcher.find_matches("ABCD") == [(0, "ABC"), (3, "D")]
+
+
+def test_suffix_term_found_through_output_link():
+    matcher = TermMatcher({"she": "x", "he": "y", "hers": "z"})
+    assert matcher.find_matches("ushers") == [(1, "she")]
+
+
+def test_replacement_is_not_matched_again():
+    matcher = TermMatcher({"PR": "拉取请求", "请求": "request"})
+    text, replacements = matcher.replace("请提交PR")
+    assert text == "请提交拉取请求"
+    assert replacements == ["PR → 拉取请求"]
+
+
+def test_empty_dictionary_returns_text_unchanged():
+    assert TermMatcher({}).replace("原文") == ("原文", [])
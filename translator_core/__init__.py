@@ -0,0 +1,4 @@
+"""
+Teams翻译助手 - 翻译引擎核心组件
+不依赖tkinter，可被桌面程序和命令行工具共同使用
+"""
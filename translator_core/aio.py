@@ -0,0 +1,126 @@
+"""
+异步运行环境
+翻译引擎的网络请求、重试、对冲和批量并发都在同一个事件循环线程中执行，
+大量并发请求只占用这一个线程。同步调用方（界面任务线程、翻译服务的请求线程）
+通过 EventLoopThread.run() 提交协程并等待结果，threading.Event 置位时取消协程
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError, wait
+
+from .errors import TranslationCancelled
+
+
+class EventLoopThread:
+    """在后台线程中运行的事件循环"""
+
+    def __init__(self, name="translate-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            # 取消未完成的任务，回收线程池后关闭事件循环
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    @property
+    def in_loop(self):
+        """当前是否在事件循环线程中"""
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """提交协程（任意线程可调用），返回 concurrent.futures.Future，对其 cancel() 会取消协程"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, cancel_event=None, timeout=None, relay=None):
+        """提交协程并阻塞等待结果
+
+        cancel_event 置位时取消协程并抛出 TranslationCancelled；超过 timeout 秒取消并抛出 TimeoutError；
+        提供 relay 时在当前线程中执行协程转交过来的回调
+        """
+        if self.in_loop:
+            coro.close()
+            raise RuntimeError("不能在事件循环线程中同步等待协程")
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        future = self.submit(coro)
+        if relay is not None:
+            future.add_done_callback(lambda _: relay.wake())
+        try:
+            while not future.done():
+                if relay is not None:
+                    relay.drain(0.05)
+                elif cancel_event is not None:
+                    wait([future], timeout=0.05)
+                else:
+                    wait([future])
+                if cancel_event is not None and cancel_event.is_set() and not future.done():
+                    raise TranslationCancelled()
+            if relay is not None:
+                relay.drain(0)
+        except BaseException:
+            # 调用方被取消或回调出错时结束协程
+            future.cancel()
+            raise
+        try:
+            return future.result()
+        except FutureCancelledError:
+            raise TranslationCancelled()
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"请求超过{timeout}秒未完成")
+
+    def stop(self, cleanup=None, timeout=5.0):
+        """执行清理协程后停止事件循环"""
+        if self.loop.is_closed():
+            return
+        if cleanup is not None:
+            try:
+                self.submit(cleanup).result(timeout)
+            except Exception as e:
+                print(f"关闭异步资源失败: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+
+class CallbackRelay:
+    """把事件循环中的回调转交给等待结果的同步调用方，在调用方线程中执行
+
+    界面、翻译服务等同步调用方的回调（更新界面、写入连接）可能阻塞，不能直接在事件循环中执行
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def wrap(self, callback):
+        """返回转交版本的回调（callback为None时返回None）"""
+        if callback is None:
+            return None
+        return lambda *args: self._queue.put((callback, args))
+
+    def wake(self):
+        self._queue.put((None, ()))
+
+    def drain(self, timeout):
+        """执行已转交的回调，队列为空时最多等待timeout秒"""
+        try:
+            callback, args = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            if callback is not None:
+                callback(*args)
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
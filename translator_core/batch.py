@@ -0,0 +1,168 @@
+"""
+并发批量翻译引擎
+在事件循环中以协程并发 + 按提供商的令牌桶限流，结果按输入顺序流式返回
+"""
+import asyncio
+import random
+import threading
+import time
+
+from .packing import merge_usage
+
+# 各提供商默认限流: (每秒请求数, 突发容量)
+PROVIDER_RATE_LIMITS = {
+    "deepseek": (5.0, 10),
+    "openai": (3.0, 6),
+}
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """尝试取出一个令牌，成功返回0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire_async(self):
+        """获取一个令牌，必要时在事件循环中等待（不占用线程）"""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+def get_rate_limiter(provider):
+    """获取提供商共享的限流器"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(provider)
+        if limiter is None:
+            rate, capacity = PROVIDER_RATE_LIMITS.get(provider, PROVIDER_RATE_LIMITS["openai"])
+            limiter = TokenBucket(rate, capacity)
+            _rate_limiters[provider] = limiter
+        return limiter
+
+
+class BatchTranslator:
+    """并发批量翻译器
+
+    translate_func(line) 为协程函数，返回 (translation, usage_info)；返回None表示跳过该行。
+    每行结果为字典: index, line, translation, usage_info, error, skipped
+
+    提供 split_func(unit) 时，单元为打包的多行：打包请求失败后不再整组重试，而是拆成
+    split_func 返回的小单元，按同样的并发、限流和重试策略翻译，结果的 translation 为逐行列表
+    （失败的行为异常）。translate_func 对这类单元返回 (译文列表, 用量)
+    """
+
+    def __init__(self, translate_func, concurrency=4, rate_limiter=None,
+                 max_retries=2, retry_delay=1.0, split_func=None):
+        self.translate_func = translate_func
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.split_func = split_func
+
+    async def arun(self, lines, on_result, on_progress=None):
+        """在当前事件循环中执行批量翻译，最多concurrency行同时请求；取消任务即中断所有进行中的请求"""
+        finish = self._ordered(len(lines), on_result, on_progress)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_line(index, line, retry=True):
+            async with semaphore:
+                return await self._translate_line(index, line, retry)
+
+        async def run_unit(index, unit):
+            splittable = self._splittable(unit)
+            result = await run_line(index, unit, retry=not splittable)
+            if splittable and result["error"] is not None:
+                # 拆开的各行重新排队，与其他单元共用并发数和限流
+                parts = await asyncio.gather(*(run_line(index, part) for part in self.split_func(unit)))
+                result = self._combine(result, parts)
+            finish(result)
+
+        await asyncio.gather(*(run_unit(i, line) for i, line in enumerate(lines)))
+
+    @staticmethod
+    def _ordered(total, on_result, on_progress):
+        """返回 finish(result)：缓存先完成的行，按输入顺序回调on_result"""
+        buffered = {}
+        state = {"next": 0, "done": 0}
+        lock = threading.Lock()
+
+        def finish(result):
+            with lock:
+                buffered[result["index"]] = result
+                state["done"] += 1
+                done = state["done"]
+                ready = []
+                while state["next"] in buffered:
+                    ready.append(buffered.pop(state["next"]))
+                    state["next"] += 1
+                # 在锁内回调，保证输出顺序
+                for item in ready:
+                    on_result(item)
+                if on_progress:
+                    on_progress(done, total)
+
+        return finish
+
+    def _splittable(self, unit):
+        return self.split_func is not None and len(unit) > 1
+
+    @staticmethod
+    def _combine(result, parts):
+        """合并拆开后各小单元的结果，打包请求失败前产生的用量一并计入"""
+        translations = []
+        usages = [getattr(result["error"], "usage_info", None)]
+        for part in parts:
+            size = len(part["line"])
+            if part["error"] is not None:
+                translations.extend([part["error"]] * size)
+            elif part["translation"] is None:
+                translations.extend([None] * size)
+            else:
+                translations.extend(part["translation"])
+                usages.append(part["usage_info"])
+        result.update(translation=translations, usage_info=merge_usage(usages) or None, error=None)
+        return result
+
+    async def _translate_line(self, index, line, retry=True):
+        """翻译单行，失败时按指数退避重试（retry为假时不重试）"""
+        result = {"index": index, "line": line, "translation": None, "usage_info": None,
+                  "error": None, "skipped": False}
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+
+            try:
+                output = await self.translate_func(line)
+                if output is None:
+                    result["skipped"] = True
+                else:
+                    result["translation"], result["usage_info"] = output
+                return result
+            except Exception as e:
+                attempt += 1
+                if not retry or attempt > self.max_retries:
+                    result["error"] = e
+                    return result
+                await asyncio.sleep(self.retry_delay * (2 ** (attempt - 1)) * (0.5 + random.random()))
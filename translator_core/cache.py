@@ -0,0 +1,178 @@
+"""
+持久化翻译缓存
+SQLite存储 + 内存LRU热区，程序重启后依然有效
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .paths import data_path
+
+
+class TranslationCache:
+    """翻译结果缓存，支持LRU淘汰、TTL过期和容量上限"""
+
+    def __init__(self, db_path=None, max_entries=5000, ttl_seconds=7 * 24 * 3600,
+                 memory_entries=512):
+        self.db_path = db_path or data_path("translation_cache.db")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # 内存热区: key -> (translation, created)
+        self._memory = OrderedDict()
+        # 命中后待写回的访问时间，避免每次命中都写磁盘
+        self._pending_touches = {}
+
+        try:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        except sqlite3.Error as e:
+            print(f"打开翻译缓存失败，改用内存缓存: {e}")
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS translations (
+                   key TEXT PRIMARY KEY,
+                   translation TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_accessed ON translations(accessed)"
+        )
+        self._purge_expired()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text, source_lang, target_lang, model_key, quality_enhance, prompt_version=""):
+        """根据预处理文本、语言对、模型、质量模式和提示版本生成缓存键"""
+        raw = json.dumps(
+            [text, source_lang, target_lang, model_key, bool(quality_enhance), prompt_version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """查询缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._conn.execute(
+                    "SELECT translation, created FROM translations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+
+            translation, created = entry
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                self._memory.pop(key, None)
+                self._pending_touches.pop(key, None)
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._conn.commit()
+                self._count = max(0, self._count - 1)
+                self.misses += 1
+                return None
+
+            self._pending_touches[key] = now
+            self.hits += 1
+            return translation
+
+    def put(self, key, translation):
+        """写入缓存并按容量上限淘汰最久未使用的条目"""
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            cursor = self._conn.execute(
+                "UPDATE translations SET translation = ?, created = ?, accessed = ? WHERE key = ?",
+                (translation, now, now, key)
+            )
+            if cursor.rowcount == 0:
+                self._conn.execute(
+                    "INSERT INTO translations (key, translation, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, translation, now, now)
+                )
+                self._count += 1
+            self._remember(key, (translation, now))
+
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._pending_touches.clear()
+            self._conn.execute("DELETE FROM translations")
+            self._conn.commit()
+            self._count = 0
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """写回访问记录并关闭数据库"""
+        with self._lock:
+            try:
+                self._flush_touches()
+                self._conn.commit()
+                self._conn.close()
+            except sqlite3.Error as e:
+                print(f"关闭翻译缓存失败: {e}")
+
+    def __len__(self):
+        return self._count
+
+    def _remember(self, key, entry):
+        """放入内存热区"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touches(self):
+        """批量写回命中条目的访问时间"""
+        if not self._pending_touches:
+            return
+        self._conn.executemany(
+            "UPDATE translations SET accessed = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._pending_touches.items()]
+        )
+        self._pending_touches.clear()
+
+    def _evict(self):
+        """淘汰最久未使用的条目，一次多删一些以减少频繁淘汰"""
+        target = int(self.max_entries * 0.9)
+        overflow = self._count - target
+        if overflow <= 0:
+            return
+        evicted = [row[0] for row in self._conn.execute(
+            "SELECT key FROM translations ORDER BY accessed ASC LIMIT ?", (overflow,)
+        )]
+        self._conn.executemany("DELETE FROM translations WHERE key = ?", [(k,) for k in evicted])
+        for key in evicted:
+            self._memory.pop(key, None)
+        self._count -= len(evicted)
+
+    def _purge_expired(self):
+        """启动时清理过期条目"""
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM translations WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
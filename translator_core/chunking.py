@@ -0,0 +1,152 @@
+"""
+长文本分块翻译
+本地估算token，在段落或句子边界把长文本切成适合模型输出上限的块，各块并发翻译后按原顺序拼接，
+总耗时取决于最长的一块而不是全文长度。每次请求的输出预算按原文长度估算：短文本不多占，长文本不截断
+"""
+import re
+
+from .packing import merge_usage
+from .segments import split_segments
+from .text import estimate_tokens
+
+# 每块原文的token上限（还受模型输出上限约束），超过一块的文本按长文本分块翻译
+CHUNK_TOKEN_BUDGET = 800
+# 一段长文本最多同时发送的请求数
+CHUNK_CONCURRENCY = 8
+# 译文token约为原文的倍数（中日英互译的经验值，偏保守）
+OUTPUT_RATIO = 1.6
+MIN_OUTPUT_TOKENS = 64
+# 推理模型的思考过程同样计入输出token
+REASONING_TOKENS = 2048
+
+# 段落分隔：空行
+_PARAGRAPH_RE = re.compile(r'\n[ \t　]*\n\s*')
+
+
+def output_token_budget(text_tokens, quality_enhance=False, limit=4096, reasoning=False):
+    """按原文token数估算一次请求的输出预算，质量增强模式多留余量，不超过模型的输出上限"""
+    budget = int(text_tokens * OUTPUT_RATIO) + (128 if quality_enhance else 64)
+    if reasoning:
+        budget += REASONING_TOKENS
+    return max(MIN_OUTPUT_TOKENS, min(limit, budget))
+
+
+def chunk_token_budget(max_output_tokens, reasoning=False):
+    """单块原文的token上限，保证整块译文不超过模型的输出上限"""
+    available = max_output_tokens - 128 - (REASONING_TOKENS if reasoning else 0)
+    return max(64, min(CHUNK_TOKEN_BUDGET, int(available / OUTPUT_RATIO)))
+
+
+def split_chunks(text, token_budget=CHUNK_TOKEN_BUDGET):
+    """把文本切成不超过token预算的块，返回 [(块, 块后空白), ...]，按顺序拼接即为原文（去掉首尾空白）
+
+    优先在段落（空行）处切分，段落过长时在句子处切分，单句仍超出预算时按字符切分
+    """
+    units = []
+    for paragraph, separator in _split_paragraphs(text.strip()):
+        if estimate_tokens(paragraph) <= token_budget:
+            units.append((paragraph, separator))
+            continue
+        sentences = split_segments(paragraph)
+        for i, (sentence, sentence_separator) in enumerate(sentences):
+            if i == len(sentences) - 1:
+                sentence_separator += separator
+            if estimate_tokens(sentence) <= token_budget:
+                units.append((sentence, sentence_separator))
+            else:
+                pieces = _split_by_length(sentence, token_budget)
+                units.extend((piece, "") for piece in pieces[:-1])
+                units.append((pieces[-1], sentence_separator))
+
+    # 相邻的段落/句子合并到同一块，直到达到预算
+    chunks = []
+    current = []
+    current_tokens = 0
+    for body, separator in units:
+        tokens = estimate_tokens(body + separator)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(_join_units(current))
+            current = []
+            current_tokens = 0
+        current.append((body, separator))
+        current_tokens += tokens
+    if current:
+        chunks.append(_join_units(current))
+    return chunks
+
+
+def merge_parallel_usage(usages):
+    """合并并发请求的用量，耗时取最长的一块"""
+    usage_info = merge_usage(usages)
+    latencies = [usage['latency'] for usage in usages if usage and 'latency' in usage]
+    if latencies:
+        usage_info['latency'] = max(latencies)
+    return usage_info
+
+
+def _split_paragraphs(text):
+    paragraphs = []
+    position = 0
+    for match in _PARAGRAPH_RE.finditer(text):
+        paragraphs.append((text[position:match.start()], match.group()))
+        position = match.end()
+    paragraphs.append((text[position:], ""))
+    return [(body, separator) for body, separator in paragraphs if body.strip()]
+
+
+def _split_by_length(sentence, token_budget):
+    """没有句子边界的超长文本按估算token切分"""
+    pieces = []
+    start = 0
+    tokens = 0
+    for i, char in enumerate(sentence):
+        char_tokens = estimate_tokens(char)
+        if tokens + char_tokens > token_budget and i > start:
+            pieces.append(sentence[start:i])
+            start = i
+            tokens = 0
+        tokens += char_tokens
+    pieces.append(sentence[start:])
+    return pieces
+
+
+def _join_units(units):
+    body = "".join(unit + separator for unit, separator in units[:-1]) + units[-1][0]
+    return body, units[-1][1]
+
+
+class OrderedStream:
+    """并发翻译各块时按块顺序输出流式译文：当前块实时输出，后续块先缓存，前一块完成后补发
+
+    只在同一个事件循环中使用，不加锁
+    """
+
+    def __init__(self, separators, on_delta):
+        self.separators = separators
+        self.on_delta = on_delta
+        self._buffers = [[] for _ in separators]
+        self._finished = [False] * len(separators)
+        self._current = 0
+
+    def delta_for(self, index):
+        """第index块的on_delta回调"""
+        def on_delta(delta):
+            if index == self._current:
+                self.on_delta(delta)
+            else:
+                self._buffers[index].append(delta)
+        return on_delta
+
+    def finish(self, index):
+        """第index块翻译完成，依次输出已完成块之后的缓存内容"""
+        self._finished[index] = True
+        while self._current < len(self._finished) and self._finished[self._current]:
+            separator = self.separators[self._current]
+            self._current += 1
+            if self._current == len(self._finished):
+                break
+            if separator:
+                self.on_delta(separator)
+            for delta in self._buffers[self._current]:
+                self.on_delta(delta)
+            self._buffers[self._current].clear()
@@ -0,0 +1,249 @@
+"""
+命令行工具
+优先使用已运行的翻译服务（界面程序或 serve 子命令启动），没有时在本进程中创建引擎。
+API Key取自翻译服务的设置或环境变量 OPENAI_API_KEY / DEEPSEEK_API_KEY
+
+用法: python -m translator_core.cli serve
+      echo "本日はよろしくお願いします" | python -m translator_core.cli translate --stream
+      python -m translator_core.cli batch lines.txt --target zh
+      python -m translator_core.cli watch --timeout 30
+      python -m translator_core.cli file meeting.srt --target zh --bilingual
+      python -m translator_core.cli stats
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import threading
+
+from .clipboard import watch_clipboard
+from .daemon import EngineServer, connect_daemon, connect_engine
+from .engine import TranslationEngine
+from .file_translation import FORMATS, WINDOW_SIZE, FileTranslator, default_output_path
+
+
+def read_input(args):
+    if getattr(args, "file", None):
+        with open(args.file, "r", encoding="utf-8") as f:
+            return f.read()
+    if getattr(args, "text", None):
+        return " ".join(args.text)
+    return sys.stdin.read()
+
+
+def request_settings(args):
+    """命令行指定的设置项，未指定的使用翻译服务的当前设置"""
+    settings = {}
+    if args.model:
+        settings['model_key'] = args.model
+    if args.source:
+        settings['source_lang'] = args.source
+    if args.target:
+        settings['target_lang'] = args.target
+    if args.quality:
+        settings['quality_enhance'] = True
+    if args.no_cache:
+        settings['use_cache'] = False
+    return settings
+
+
+def print_note(message, tag):
+    print(message, file=sys.stderr)
+
+
+def cmd_serve(args):
+    if connect_daemon() is not None:
+        print("翻译服务已在运行", file=sys.stderr)
+        return 1
+    engine = TranslationEngine()
+    engine.server = EngineServer(engine, args.host, args.port)
+    print(f"翻译服务已启动: {engine.server.url}（信息见数据目录的daemon.json）", file=sys.stderr)
+    # 收到终止信号时同样清理daemon.json
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        engine.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+    return 0
+
+
+def cmd_translate(args, engine):
+    text = read_input(args).strip()
+    if not text:
+        print("没有要翻译的文本", file=sys.stderr)
+        return 1
+    on_delta = None
+    if args.stream:
+        on_delta = lambda delta: print(delta, end="", flush=True)
+    translation, usage_info = engine.translate(text, on_delta=on_delta, settings=request_settings(args),
+                                               on_note=print_note, incremental=False)
+    print("" if args.stream else translation)
+    if usage_info:
+        print(usage_info.get('cost_info', ""), file=sys.stderr)
+    return 0
+
+
+def cmd_batch(args, engine):
+    lines = [line.strip() for line in read_input(args).splitlines() if line.strip()]
+    results, cost = engine.translate_batch(lines, settings=request_settings(args), concurrency=args.concurrency)
+    failed = 0
+    for line, translation in zip(lines, results):
+        if isinstance(translation, Exception):
+            failed += 1
+            print(f"翻译失败: {line}: {translation}", file=sys.stderr)
+            translation = ""
+        print(line if translation is None else translation)
+    print(f"共{len(lines)}行，失败{failed}行，总成本: ${cost:.4f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_file(args, engine):
+    """流式翻译文件，中断后用相同参数重新运行即从断点继续"""
+    settings = request_settings(args)
+    output_path = args.output or default_output_path(args.input, args.target or "translated")
+
+    def on_progress(stats):
+        percent = stats['bytes_read'] / stats['total_bytes'] if stats['total_bytes'] else 1.0
+        print(f"\r已处理 {stats['records']} 条（{percent:.0%}），成本: ${stats['cost']:.4f}",
+              end="", file=sys.stderr, flush=True)
+
+    translator = FileTranslator(
+        args.input, output_path,
+        lambda lines: engine.translate_batch(lines, settings=settings, concurrency=args.concurrency),
+        fmt=args.format, bilingual=args.bilingual,
+        columns=args.columns.split(",") if args.columns else None, header=not args.no_header,
+        settings_key=json.dumps(settings, sort_keys=True), window=args.window, on_progress=on_progress)
+    checkpoint = translator.pending_checkpoint() if not args.restart else None
+    if checkpoint:
+        print(f"从断点继续: 已完成 {checkpoint['records']} 条", file=sys.stderr)
+    try:
+        stats = translator.run(resume=not args.restart)
+    except KeyboardInterrupt:
+        print("\n已中断，进度已保存，重新运行相同命令即可继续", file=sys.stderr)
+        return 130
+    print(f"\n已完成: {output_path}（翻译{stats['translated']}条，成本: ${stats['cost']:.4f}）", file=sys.stderr)
+    return 0
+
+
+def cmd_watch(args, engine):
+    try:
+        asyncio.run(watch(args, engine))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+async def watch(args, engine):
+    """监听剪贴板并流式输出译文，新内容到达时取消尚未完成的翻译"""
+    settings = request_settings(args)
+    current = None
+    async for text in watch_clipboard():
+        text = text.strip()
+        if not text:
+            continue
+        if current is not None and not current.done():
+            current.cancel()
+            print("\n（已被新内容取代）", file=sys.stderr)
+        current = asyncio.ensure_future(translate_clipboard(engine, text, settings, args.timeout))
+
+
+async def translate_clipboard(engine, text, settings, timeout):
+    print(f"\n>>> {text}", file=sys.stderr)
+    try:
+        translation, usage_info = await asyncio.wait_for(translate_text(engine, text, settings), timeout)
+    except asyncio.TimeoutError:
+        print(f"\n翻译超时（{timeout}秒）", file=sys.stderr)
+        return
+    except Exception as e:
+        print(f"\n翻译失败: {e}", file=sys.stderr)
+        return
+    print()
+    if usage_info:
+        print(usage_info.get('cost_info', ""), file=sys.stderr)
+
+
+async def translate_text(engine, text, settings):
+    """在当前事件循环中等待一次流式翻译，被取消时中断请求"""
+    on_delta = lambda delta: print(delta, end="", flush=True)
+    if isinstance(engine, TranslationEngine):
+        # 本进程的引擎：协程提交到引擎的事件循环，取消等待即取消翻译任务
+        return await asyncio.wrap_future(engine.loop.submit(
+            engine.atranslate(text, on_delta=on_delta, settings=settings, incremental=False)))
+    # 翻译服务客户端是同步接口，在线程中调用，取消时断开连接
+    cancel_event = threading.Event()
+    try:
+        return await asyncio.to_thread(engine.translate, text, on_delta=on_delta, cancel_event=cancel_event,
+                                       settings=settings, incremental=False)
+    finally:
+        cancel_event.set()
+
+
+def cmd_stats(args, engine):
+    if args.metrics:
+        print(engine.metrics.to_openmetrics(), end="")
+    else:
+        print(json.dumps(engine.cost_summary(), ensure_ascii=False, indent=2))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="translator_core.cli", description="Teams翻译助手命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="启动无界面的翻译服务")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=0, help="监听端口，0表示自动选择")
+
+    for name, help_text in (("translate", "翻译一段文本（参数或标准输入）"),
+                            ("batch", "逐行批量翻译（文件或标准输入）"),
+                            ("watch", "监听剪贴板，复制后流式输出译文"),
+                            ("file", "流式翻译TXT/SRT/VTT/CSV文件，支持断点续传")):
+        sub = subparsers.add_parser(name, help=help_text)
+        if name == "translate":
+            sub.add_argument("text", nargs="*")
+            sub.add_argument("--stream", action="store_true", help="流式输出译文")
+        elif name == "batch":
+            sub.add_argument("file", nargs="?")
+            sub.add_argument("--concurrency", type=int, default=4)
+        elif name == "file":
+            sub.add_argument("input")
+            sub.add_argument("-o", "--output", help="输出文件，默认为 原文件名.目标语言.扩展名")
+            sub.add_argument("--format", choices=FORMATS, help="文件格式，默认按扩展名判断")
+            sub.add_argument("--bilingual", action="store_true", help="保留原文，译文写在原文之后")
+            sub.add_argument("--columns", help="CSV要翻译的列（列名或序号，逗号分隔），默认全部列")
+            sub.add_argument("--no-header", action="store_true", help="CSV第一行不是表头")
+            sub.add_argument("--restart", action="store_true", help="忽略已保存的进度，重新开始")
+            sub.add_argument("--concurrency", type=int, default=4)
+            sub.add_argument("--window", type=int, default=WINDOW_SIZE, help="每次提交翻译的行数")
+        else:
+            sub.add_argument("--timeout", type=float, help="单次翻译的超时秒数")
+        sub.add_argument("--model", help="模型，如 deepseek-v3-0324")
+        sub.add_argument("--source", help="源语言: auto/ja/zh/en")
+        sub.add_argument("--target", help="目标语言: zh/ja/en")
+        sub.add_argument("--quality", action="store_true", help="质量增强模式")
+        sub.add_argument("--no-cache", action="store_true", help="不使用翻译缓存")
+
+    stats = subparsers.add_parser("stats", help="显示用量统计")
+    stats.add_argument("--metrics", action="store_true", help="输出各阶段耗时（OpenMetrics）")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        return cmd_serve(args)
+
+    commands = {"translate": cmd_translate, "batch": cmd_batch, "watch": cmd_watch, "file": cmd_file,
+                "stats": cmd_stats}
+    engine = connect_engine(serve=False)
+    try:
+        return commands[args.command](args, engine)
+    except Exception as e:
+        print(f"执行失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
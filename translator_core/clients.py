@@ -0,0 +1,198 @@
+"""
+API客户端连接池
+按 (provider, base_url, api_key) 复用异步OpenAI客户端，保持长连接，避免每次翻译重新握手。
+翻译服务的多个调用方可能使用不同的Key，各Key的客户端同时保留（LRU，数量有上限），
+被淘汰的客户端等正在进行的请求结束后再关闭。客户端只在翻译引擎的事件循环中创建和使用。
+
+openai SDK 导入较慢（约1秒），在首次请求或预热时于线程池中导入，不拖慢程序启动，也不阻塞事件循环
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from .metrics import AsyncRequestTrace, RequestTrace
+
+# 各提供商的API地址
+PROVIDER_BASE_URLS = {
+    "deepseek": "https://api.deepseek.com",
+    # 指定代理域名，避免直接访问官方域名受限
+    "openai": "https://api.openai-proxy.com/v1",
+}
+
+
+def base_url_for(provider):
+    """提供商的API地址
+
+    可用环境变量 TEAMS_TRANSLATOR_<PROVIDER>_BASE_URL（单个提供商）或
+    TEAMS_TRANSLATOR_BASE_URL（全部提供商）覆盖，便于接入本地模拟服务做基准测试
+    """
+    return (os.environ.get(f"TEAMS_TRANSLATOR_{provider.upper()}_BASE_URL")
+            or os.environ.get("TEAMS_TRANSLATOR_BASE_URL")
+            or PROVIDER_BASE_URLS.get(provider, PROVIDER_BASE_URLS["openai"]))
+
+
+# 安装了h2时启用HTTP/2
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_sdk_lock = threading.Lock()
+_sdk = None
+
+
+def load_sdk():
+    """导入并返回 (AsyncOpenAI, httpx)，未安装或 openai<1.0 时返回 (None, None)"""
+    global _sdk
+    with _sdk_lock:
+        if _sdk is None:
+            try:
+                import httpx
+                from openai import AsyncOpenAI
+                _sdk = (AsyncOpenAI, httpx)
+            except ImportError:
+                _sdk = (None, None)
+        return _sdk
+
+
+async def load_sdk_async():
+    """在事件循环中获取SDK，首次导入放到线程池中执行"""
+    if _sdk is None:
+        await asyncio.to_thread(load_sdk)
+    return _sdk
+
+
+class _PoolEntry:
+    """一个客户端及其连接池；users 为正在使用它的请求数"""
+
+    def __init__(self, client, http_client):
+        self.client = client
+        self.http_client = http_client
+        self.users = 0
+        self.retired = False
+
+
+class ClientRegistry:
+    """OpenAI兼容客户端注册表（客户端只能在同一个事件循环中使用）
+
+    提供 observe(阶段, 秒) 时记录新建连接耗时(network_connect)和请求首字节耗时(network_ttfb)
+    """
+
+    def __init__(self, max_connections=20, keepalive_expiry=120.0, timeout=60.0, observe=None, max_clients=8):
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.observe = observe
+        self.max_clients = max_clients
+
+        self._lock = threading.Lock()
+        # (provider, base_url, api_key) -> _PoolEntry，按最近使用排序
+        self._clients = OrderedDict()
+        self._closing = set()
+
+    @asynccontextmanager
+    async def lease(self, provider, api_key, base_url=None):
+        """在with块内使用客户端完成请求；期间客户端即使被淘汰也不会关闭"""
+        entry = await self._get_entry(provider, api_key, base_url)
+        # 取得客户端和登记使用之间没有await，不会被其他协程淘汰后关闭
+        entry.users += 1
+        try:
+            yield entry.client
+        finally:
+            self._release(entry)
+
+    def _release(self, entry):
+        entry.users -= 1
+        if entry.retired and not entry.users:
+            self._close_later(entry)
+
+    async def _get_entry(self, provider, api_key, base_url=None):
+        if (await load_sdk_async())[0] is None:
+            raise Exception("未安装openai库或版本过低，请安装 openai>=1.0")
+
+        base_url = base_url or base_url_for(provider)
+        key = (provider, base_url, api_key)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients.move_to_end(key)
+                return entry
+            entry = _PoolEntry(*self._build(api_key, base_url))
+            self._clients[key] = entry
+            # 超出上限时淘汰最久未用的客户端，仍有请求在用的等请求结束后关闭
+            while len(self._clients) > self.max_clients:
+                _, old = self._clients.popitem(last=False)
+                old.retired = True
+                if not old.users:
+                    self._close_later(old)
+            return entry
+
+    async def warm_up(self, provider, api_key, base_url=None):
+        """导入SDK并预热连接，完成TCP/TLS握手，让首次翻译无需等待"""
+        if not api_key or (await load_sdk_async())[0] is None:
+            return
+        try:
+            async with self.lease(provider, api_key, base_url) as client:
+                # 模型列表接口不计费，请求完成后连接保留在连接池中
+                await client.models.list()
+        except Exception as e:
+            print(f"连接预热失败: {e}")
+
+    async def aclose(self):
+        """关闭全部连接池"""
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for entry in entries:
+            await self._close_entry(entry)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def _close_later(self, entry):
+        """在后台关闭不再使用的连接池"""
+        task = asyncio.get_running_loop().create_task(self._close_entry(entry))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _build(self, api_key, base_url):
+        """创建带长连接池的客户端"""
+        AsyncOpenAI, httpx = load_sdk()
+        event_hooks = None
+        if self.observe is not None:
+            event_hooks = {"request": [self._on_request], "response": [self._on_response]}
+        http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            event_hooks=event_hooks,
+        )
+        # 重试由路由层按提供商策略处理，客户端自身不再重试
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        return client, http_client
+
+    @staticmethod
+    async def _on_request(request):
+        request.extensions["trace"] = AsyncRequestTrace()
+
+    async def _on_response(self, response):
+        """响应头到达时回调（流式响应此时尚未读取正文）"""
+        trace = response.request.extensions.get("trace")
+        if not isinstance(trace, RequestTrace):
+            return
+        if trace.connect_seconds is not None:
+            self.observe("network_connect", trace.connect_seconds)
+        # 只统计翻译请求的首字节耗时（预热请求不计入）
+        if response.request.method == "POST":
+            self.observe("network_ttfb", time.perf_counter() - trace.started)
+
+    @staticmethod
+    async def _close_entry(entry):
+        try:
+            await entry.http_client.aclose()
+        except Exception as e:
+            print(f"关闭连接池失败: {e}")
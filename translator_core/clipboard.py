@@ -0,0 +1,233 @@
+"""
+剪贴板变化监听
+优先使用系统的剪贴板变化通知（Linux XFixes、Windows序列号、macOS changeCount），
+不可用时退回自适应轮询：有变化后加快，空闲时逐步放慢。
+watch_clipboard() 把监听结果作为异步迭代器提供给事件循环中的协程
+"""
+import asyncio
+import select
+import sys
+import threading
+
+
+def _pyperclip():
+    """首次读写剪贴板时导入pyperclip（导入时会探测系统剪贴板工具），未安装时返回None"""
+    try:
+        import pyperclip
+    except ImportError:
+        return None
+    return pyperclip
+
+
+def paste_text():
+    """读取剪贴板文本"""
+    pyperclip = _pyperclip()
+    if pyperclip is None:
+        raise Exception("未安装pyperclip，无法读取剪贴板")
+    return pyperclip.paste()
+
+
+def copy_text(text):
+    """写入剪贴板"""
+    pyperclip = _pyperclip()
+    if pyperclip is None:
+        raise Exception("未安装pyperclip，无法写入剪贴板")
+    pyperclip.copy(text)
+
+
+async def watch_clipboard(**options):
+    """异步剪贴板来源：逐个产出变化后的剪贴板文本，结束迭代时停止监听
+
+    options 传给 ClipboardWatcher；监听线程只负责把内容投递到当前事件循环
+    """
+    loop = asyncio.get_running_loop()
+    changes = asyncio.Queue()
+    watcher = ClipboardWatcher(lambda text: loop.call_soon_threadsafe(changes.put_nowait, text), **options)
+    watcher.start()
+    try:
+        while True:
+            yield await changes.get()
+    finally:
+        watcher.stop()
+
+
+class ClipboardWatcher:
+    """剪贴板监听器，内容变化时在监听线程中回调 on_change(text)"""
+
+    def __init__(self, on_change, read_clipboard=None, min_interval=0.1,
+                 max_interval=1.0, backoff=1.5, counter_interval=0.05):
+        self.on_change = on_change
+        self.read_clipboard = read_clipboard
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.counter_interval = counter_interval
+
+        self.backend = None
+        self._last_text = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """选择可用的监听方式并启动监听线程"""
+        if self.read_clipboard is None:
+            if _pyperclip() is None:
+                raise Exception("未安装pyperclip，无法读取剪贴板")
+            self.read_clipboard = paste_text
+
+        self._stop_event.clear()
+        runner = self._select_backend()
+        self._thread = threading.Thread(target=self._run, args=(runner,), daemon=True)
+        self._thread.start()
+        return self.backend
+
+    def stop(self):
+        """停止监听"""
+        self._stop_event.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def _run(self, runner):
+        try:
+            # 启动时处理一次当前内容，与原先轮询行为一致
+            self._emit()
+            runner()
+        except Exception as e:
+            print(f"剪贴板监听({self.backend})异常，改用轮询: {e}")
+            self.backend = "polling"
+            self._poll_loop()
+
+    def _emit(self):
+        """读取剪贴板并回调"""
+        try:
+            text = self.read_clipboard()
+        except Exception as e:
+            print(f"读取剪贴板失败: {e}")
+            return False
+        self._last_text = text
+        if text:
+            try:
+                self.on_change(text)
+            except Exception as e:
+                print(f"剪贴板监听错误: {e}")
+        return True
+
+    def _select_backend(self):
+        """按平台选择事件驱动方式，失败时使用轮询"""
+        if sys.platform.startswith("linux"):
+            runner = self._make_xfixes_runner()
+            if runner:
+                self.backend = "xfixes"
+                return runner
+        elif sys.platform == "win32":
+            counter = self._make_windows_counter()
+            if counter:
+                self.backend = "win32-sequence"
+                return lambda: self._counter_loop(counter)
+        elif sys.platform == "darwin":
+            counter = self._make_macos_counter()
+            if counter:
+                self.backend = "nspasteboard"
+                return lambda: self._counter_loop(counter)
+
+        self.backend = "polling"
+        return self._poll_loop
+
+    def _make_xfixes_runner(self):
+        """Linux: 订阅CLIPBOARD所有者变化事件（需要python-xlib）"""
+        try:
+            from Xlib import display as xdisplay
+            from Xlib.ext import xfixes
+        except ImportError:
+            return None
+
+        try:
+            disp = xdisplay.Display()
+            if not disp.has_extension("XFIXES"):
+                disp.close()
+                return None
+            disp.xfixes_query_version()
+            clipboard_atom = disp.get_atom("CLIPBOARD")
+            disp.xfixes_select_selection_input(
+                disp.screen().root, clipboard_atom,
+                xfixes.XFixesSetSelectionOwnerNotifyMask
+            )
+            disp.flush()
+        except Exception as e:
+            print(f"XFixes剪贴板通知不可用: {e}")
+            return None
+
+        def run():
+            event_type = disp.extension_event.SetSelectionOwnerNotify
+            try:
+                while not self._stop_event.is_set():
+                    # 带超时等待，便于响应停止
+                    readable, _, _ = select.select([disp.fileno()], [], [], 0.5)
+                    if not readable and not disp.pending_events():
+                        continue
+                    changed = False
+                    while disp.pending_events():
+                        event = disp.next_event()
+                        if (event.type, getattr(event, "sub_code", None)) == event_type:
+                            changed = True
+                    if changed:
+                        self._emit()
+            finally:
+                disp.close()
+
+        return run
+
+    @staticmethod
+    def _make_windows_counter():
+        """Windows: 剪贴板序列号，读取开销极低"""
+        try:
+            import ctypes
+            get_sequence = ctypes.windll.user32.GetClipboardSequenceNumber
+            get_sequence()
+            return get_sequence
+        except Exception:
+            return None
+
+    @staticmethod
+    def _make_macos_counter():
+        """macOS: NSPasteboard.changeCount（需要pyobjc）"""
+        try:
+            from AppKit import NSPasteboard
+            pasteboard = NSPasteboard.generalPasteboard()
+            return pasteboard.changeCount
+        except Exception:
+            return None
+
+    def _counter_loop(self, counter):
+        """检查系统剪贴板计数器，只有计数变化时才读取内容"""
+        last = counter()
+        while not self._stop_event.wait(self.counter_interval):
+            current = counter()
+            if current != last:
+                last = current
+                self._emit()
+
+    def _poll_loop(self):
+        """自适应轮询：内容变化后以最短间隔检查，空闲时逐步放慢"""
+        interval = self.min_interval
+        last = self._last_text
+        while not self._stop_event.wait(interval):
+            try:
+                text = self.read_clipboard()
+            except Exception as e:
+                print(f"剪贴板监听错误: {e}")
+                interval = self.max_interval
+                continue
+
+            if text != last:
+                last = text
+                interval = self.min_interval
+                if text:
+                    try:
+                        self.on_change(text)
+                    except Exception as e:
+                        print(f"剪贴板监听错误: {e}")
+            else:
+                interval = min(self.max_interval, interval * self.backoff)
@@ -0,0 +1,102 @@
+"""
+剪贴板事件合并
+监听器与翻译之间的去抖阶段：连续复制时等待安静期结束后只翻译最新内容，
+被新内容取代的旧内容直接丢弃，正在翻译的旧内容会被取消；可选把相邻片段合并为一次请求
+"""
+import threading
+import time
+
+
+class CoalescedRequest:
+    """合并后的一次翻译请求；submitted_at 为最新一条内容的提交时间(time.monotonic)"""
+
+    def __init__(self, parts, lang, dropped, separator, submitted_at=None):
+        self.parts = parts
+        self.lang = lang
+        self.dropped = dropped
+        self.submitted_at = submitted_at if submitted_at is not None else time.monotonic()
+        self.text = separator.join(parts)
+        self.cancel_event = threading.Event()
+
+
+class ClipboardCoalescer:
+    """去抖合并器，安静期结束后在合并线程中回调 dispatch(request)，dispatch 不应阻塞"""
+
+    def __init__(self, dispatch, debounce=0.3, merge=False, max_merge=5, separator="\n"):
+        self.dispatch = dispatch
+        self.debounce = debounce
+        self.merge = merge
+        self.max_merge = max_merge
+        self.separator = separator
+
+        self._cond = threading.Condition()
+        self._pending = []  # [(文本, 语言), ...]
+        self._last_submit = 0.0
+        self._inflight = set()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="clipboard-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, text, lang):
+        """提交一条剪贴板内容（可在任意线程调用）"""
+        with self._cond:
+            self._pending.append((text, lang))
+            self._last_submit = time.monotonic()
+            # 不合并时，正在翻译的旧内容已被取代
+            if not self.merge:
+                for request in self._inflight:
+                    request.cancel_event.set()
+            self._cond.notify()
+
+    def finish(self, request):
+        """请求处理完毕（无论成功、失败还是取消）"""
+        with self._cond:
+            self._inflight.discard(request)
+
+    def cancel_all(self):
+        """丢弃等待中的内容并取消正在翻译的请求"""
+        with self._cond:
+            self._pending.clear()
+            for request in self._inflight:
+                request.cancel_event.set()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.cancel_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                request = None
+                while request is None and not self._stopped:
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    remaining = self._last_submit + self.debounce - time.monotonic()
+                    if remaining > 0:
+                        self._cond.wait(remaining)
+                        continue
+                    request = self._take_request()
+                if self._stopped:
+                    return
+                self._inflight.add(request)
+
+            try:
+                self.dispatch(request)
+            except Exception as e:
+                print(f"剪贴板任务提交失败: {e}")
+                self.finish(request)
+
+    def _take_request(self):
+        """取出等待中的内容：最新一条，合并模式下连同之前相邻的同语言片段"""
+        pending, self._pending = self._pending, []
+        text, lang = pending[-1]
+        parts = [text]
+        if self.merge:
+            for earlier_text, earlier_lang in reversed(pending[:-1]):
+                if earlier_lang != lang or len(parts) >= self.max_merge:
+                    break
+                parts.insert(0, earlier_text)
+        return CoalescedRequest(parts, lang, len(pending) - len(parts), self.separator, self._last_submit)
@@ -0,0 +1,540 @@
+"""
+翻译服务
+把一个 TranslationEngine 通过本机HTTP接口共享给多个进程（界面程序、命令行工具、批处理脚本），
+缓存、术语、连接池、路由统计和用量账本只保留一份。只监听127.0.0.1，请求需携带令牌；
+服务地址和令牌写入数据目录的 daemon.json（仅当前用户可读）
+
+接口（JSON；POST /translate、/batch 可用NDJSON流式返回 note/delta/progress/result/done/error 事件，
+客户端断开连接即取消）:
+    GET  /health /stats /metrics /metrics.json
+    POST /translate /translate_chunk /batch /warmup /glossary/reload /cache/clear /metrics/reset
+"""
+import hmac
+import json
+import os
+import secrets
+import select
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .engine import TranslationEngine
+from .errors import TranslationCancelled
+from .paths import data_path
+
+INFO_FILE = "daemon.json"
+
+
+class RemoteError(Exception):
+    """翻译服务返回的错误"""
+
+
+def json_usage(usage_info):
+    """只保留可序列化的用量字段"""
+    if not usage_info:
+        return usage_info
+    return {key: value for key, value in usage_info.items()
+            if value is None or isinstance(value, (str, int, float, bool))}
+
+
+def json_translation(translation):
+    """逐行结果：译文、None（跳过）或 {"error": 说明}"""
+    if isinstance(translation, Exception):
+        return {"error": str(translation)}
+    return translation
+
+
+def from_json_translation(translation):
+    if isinstance(translation, dict):
+        return RemoteError(translation.get("error", ""))
+    return translation
+
+
+def _http_client():
+    """客户端的HTTP模块，连接服务时才导入（没有运行中的服务时不需要）"""
+    import http.client
+
+    return http.client
+
+
+def read_info():
+    """读取运行中服务的 {url, token, pid}，没有时返回None"""
+    try:
+        with open(data_path(INFO_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def watch_disconnect(sock, done, cancel_event, interval=0.2):
+    """请求处理期间监视客户端连接，断开时置位cancel_event（在后台线程中运行）"""
+    while not done.is_set():
+        try:
+            readable, _, _ = select.select([sock], [], [], interval)
+            if not readable:
+                continue
+            # 连接可读但读不到数据，说明客户端已关闭连接
+            if not sock.recv(1, socket.MSG_PEEK):
+                cancel_event.set()
+            return
+        except (OSError, ValueError):
+            cancel_event.set()
+            return
+
+
+class EngineServer:
+    """翻译服务，start() 在后台线程中运行"""
+
+    def __init__(self, engine, host="127.0.0.1", port=0, token=None):
+        # 服务端模块只在提供服务时导入，不占用界面程序的启动时间
+        from http.server import ThreadingHTTPServer
+
+        self.engine = engine
+        self.token = token or secrets.token_urlsafe(32)
+        self.started_at = time.time()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="engine-server", daemon=True)
+        self._thread.start()
+        self.write_info()
+        return self
+
+    def serve_forever(self):
+        """在当前线程中运行，直到 stop() 或 KeyboardInterrupt"""
+        self.write_info()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.remove_info()
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+        self.remove_info()
+
+    def write_info(self):
+        """写入服务地址和令牌，只允许当前用户读取"""
+        path = data_path(INFO_FILE)
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "token": self.token, "pid": os.getpid()}, f)
+        os.replace(tmp_path, path)
+
+    def remove_info(self):
+        """删除服务信息（已被其他进程的服务覆盖时保留）"""
+        info = read_info()
+        if info is not None and info.get("token") == self.token:
+            try:
+                os.remove(data_path(INFO_FILE))
+            except OSError:
+                pass
+
+    def stats(self):
+        stats = self.engine.cost_summary()
+        stats.update(cache_size=self.engine.cache_size(), pid=os.getpid(),
+                     uptime=time.time() - self.started_at)
+        return stats
+
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+        engine = self.engine
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if not self.authorized():
+                    return
+                if self.path == "/health":
+                    self.send_json(200, {"status": "ok", "pid": os.getpid()})
+                elif self.path == "/stats":
+                    self.send_json(200, server.stats())
+                elif self.path == "/metrics":
+                    self.send_text(200, engine.metrics.to_openmetrics(),
+                                   "application/openmetrics-text; version=1.0.0; charset=utf-8")
+                elif self.path == "/metrics.json":
+                    self.send_json(200, {"rows": engine.metrics.snapshot()})
+                else:
+                    self.send_error_json(404, "not_found", f"未知接口: {self.path}")
+
+            def do_POST(self):
+                if not self.authorized():
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError as e:
+                    self.send_error_json(400, "bad_request", f"请求格式错误: {e}")
+                    return
+
+                routes = {
+                    "/translate": self.translate,
+                    "/translate_chunk": self.translate_chunk,
+                    "/batch": self.batch,
+                    "/warmup": lambda body: engine.warm_up(body.get("settings")) or {},
+                    "/glossary/reload": lambda body: {"terms": engine.reload_glossary()},
+                    "/cache/clear": lambda body: {"cleared": engine.clear_cache()},
+                    "/metrics/reset": lambda body: engine.metrics.reset() or {},
+                }
+                handler = routes.get(self.path)
+                if handler is None:
+                    self.send_error_json(404, "not_found", f"未知接口: {self.path}")
+                    return
+                try:
+                    result = handler(body)
+                except (KeyError, TypeError) as e:
+                    self.send_error_json(400, "bad_request", f"缺少或无效的参数: {e}")
+                    return
+                except Exception as e:
+                    self.send_error_json(500, "error", str(e))
+                    return
+                if result is not None:
+                    self.send_json(200, result)
+
+            def authorized(self):
+                expected = f"Bearer {server.token}".encode("utf-8")
+                if hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8", "replace"), expected):
+                    return True
+                # 请求体未读取，不再复用此连接
+                self.close_connection = True
+                self.send_error_json(401, "unauthorized", "令牌无效")
+                return False
+
+            def translate(self, body):
+                """单条翻译；stream为真时以NDJSON逐条返回提示、译文片段和结果"""
+                if not body.get("stream"):
+                    notes = []
+                    with self.watching() as cancel_event:
+                        translation, usage_info = engine.translate(
+                            body["text"], body.get("source_lang"), cancel_event=cancel_event,
+                            settings=body.get("settings"), incremental=body.get("incremental"),
+                            on_note=lambda message, tag: notes.append([message, tag]))
+                    return {"translation": translation, "usage": json_usage(usage_info), "notes": notes}
+
+                def run(send_event, cancel_event):
+                    on_delta = None
+                    if body.get("deltas"):
+                        on_delta = lambda delta: send_event({"event": "delta", "text": delta})
+                    translation, usage_info = engine.translate(
+                        body["text"], body.get("source_lang"), on_delta=on_delta, cancel_event=cancel_event,
+                        settings=body.get("settings"), incremental=body.get("incremental"),
+                        on_note=lambda message, tag: send_event({"event": "note", "message": message, "tag": tag}))
+                    return {"translation": translation, "usage": json_usage(usage_info)}
+
+                self.stream_events(run)
+
+            def stream_events(self, run):
+                """以NDJSON逐条返回事件：run(send_event, cancel_event) 的返回值作为done事件"""
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                with self.watching() as cancel_event:
+                    # 译文片段、提示和进度由引擎转交到本线程中写出
+                    def send_event(event):
+                        try:
+                            self.write_chunk(json.dumps(event, ensure_ascii=False) + "\n")
+                        except OSError:
+                            cancel_event.set()
+
+                    try:
+                        send_event(dict(run(send_event, cancel_event), event="done"))
+                    except TranslationCancelled as e:
+                        send_event({"event": "error", "type": "cancelled", "message": "翻译已取消",
+                                    "usage": json_usage(e.usage_info)})
+                    except Exception as e:
+                        send_event({"event": "error", "type": "error", "message": str(e)})
+                try:
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    self.close_connection = True
+
+            def translate_chunk(self, body):
+                notes = []
+                translations, usage_info = engine.translate_chunk(
+                    body["lines"], body["source_lang"], settings=body.get("settings"),
+                    on_note=lambda message, tag: notes.append([message, tag]))
+                return {"translations": [json_translation(t) for t in translations],
+                        "usage": json_usage(usage_info), "notes": notes}
+
+            def batch(self, body):
+                """批量翻译；stream为真时以NDJSON返回提示、进度和逐个请求的结果事件"""
+                def run(send_event, cancel_event):
+                    on_progress = on_result = on_note = None
+                    if body.get("stream"):
+                        on_progress = lambda done, total: send_event(
+                            {"event": "progress", "done": done, "total": total})
+                        on_note = lambda message, tag: send_event({"event": "note", "message": message, "tag": tag})
+                        if body.get("results"):
+                            on_result = lambda results, usage_info: send_event(
+                                {"event": "result", "usage": json_usage(usage_info),
+                                 "results": [[index, json_translation(t)] for index, t in results]})
+                    results, cost = engine.translate_batch(body["lines"], settings=body.get("settings"),
+                                                           concurrency=body.get("concurrency", 4),
+                                                           on_progress=on_progress, cancel_event=cancel_event,
+                                                           on_result=on_result, on_note=on_note,
+                                                           pack=body.get("pack", True))
+                    return {"results": [json_translation(t) for t in results], "cost": cost}
+
+                if body.get("stream"):
+                    self.stream_events(run)
+                    return None
+                with self.watching() as cancel_event:
+                    return run(None, cancel_event)
+
+            def watching(self):
+                return _DisconnectWatch(self.connection)
+
+            def send_json(self, status, payload):
+                self.send_text(status, json.dumps(payload, ensure_ascii=False), "application/json")
+
+            def send_text(self, status, text, content_type):
+                data = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_error_json(self, status, code, message):
+                self.send_json(status, {"error": {"type": code, "message": message}})
+
+            def write_chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+class _DisconnectWatch:
+    """with块内监视客户端连接，返回断开时置位的cancel_event"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+
+    def __enter__(self):
+        threading.Thread(target=watch_disconnect, args=(self.sock, self.done, self.cancel_event),
+                         name="disconnect-watch", daemon=True).start()
+        return self.cancel_event
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+
+
+class RemoteMetrics:
+    """翻译服务的阶段耗时，接口与 StageMetrics 的只读部分一致"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def snapshot(self):
+        return [tuple(row) for row in self.client.request("GET", "/metrics.json")["rows"]]
+
+    def count(self, stage):
+        return next((row[1] for row in self.snapshot() if row[0] == stage), 0)
+
+    def reset(self):
+        self.client.request("POST", "/metrics/reset")
+
+    def to_openmetrics(self):
+        from .openmetrics import openmetrics_text
+        return openmetrics_text(self.snapshot())
+
+    def export(self, path=None):
+        from .openmetrics import export_openmetrics
+        return export_openmetrics(self.snapshot(), path)
+
+
+class EngineClient:
+    """翻译服务客户端，方法与 TranslationEngine 的对外接口一致（线程安全，每次调用独立连接）"""
+
+    def __init__(self, url, token, timeout=300):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port
+        self.token = token
+        self.timeout = timeout
+        self.metrics = RemoteMetrics(self)
+
+    def _connect(self):
+        return _http_client().HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+
+    def request(self, method, path, payload=None):
+        """发送一次请求并返回解析后的JSON，服务返回错误时抛出RemoteError"""
+        conn = self._connect()
+        try:
+            body = json.dumps(payload or {}, ensure_ascii=False).encode("utf-8") if method == "POST" else None
+            conn.request(method, path, body, self._headers())
+            response = conn.getresponse()
+            result = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status != 200:
+            error = result.get("error", {})
+            raise RemoteError(error.get("message") or f"翻译服务错误: HTTP {response.status}")
+        return result
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def translate(self, text, source_lang=None, on_delta=None, cancel_event=None, settings=None,
+                  on_note=None, incremental=None):
+        """翻译一段文本并由服务计费，返回(译文, 用量)；cancel_event置位时断开连接，服务端随即取消"""
+        payload = {"text": text, "source_lang": source_lang, "settings": settings,
+                   "incremental": incremental, "stream": True, "deltas": on_delta is not None}
+        for event in self._stream_events("/translate", payload, cancel_event):
+            if event["event"] == "delta":
+                on_delta(event["text"])
+            elif event["event"] == "note":
+                if on_note is not None:
+                    on_note(event["message"], event["tag"])
+            else:
+                return event["translation"], event["usage"]
+
+    def _stream_events(self, path, payload, cancel_event=None):
+        """发送流式请求，逐条产出事件直到done；error事件转为异常，cancel_event置位时断开连接"""
+        conn = self._connect()
+        done = threading.Event()
+        if cancel_event is not None:
+            threading.Thread(target=self._cancel_on, args=(conn, cancel_event, done),
+                             name="engine-cancel", daemon=True).start()
+        try:
+            conn.request("POST", path, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                         self._headers())
+            response = conn.getresponse()
+            if response.status != 200:
+                error = json.loads(response.read() or b"{}").get("error", {})
+                raise RemoteError(error.get("message") or f"翻译服务错误: HTTP {response.status}")
+            for line in response:
+                event = json.loads(line)
+                if event["event"] == "error":
+                    if event.get("type") == "cancelled":
+                        raise TranslationCancelled(event.get("usage"))
+                    raise RemoteError(event["message"])
+                yield event
+                if event["event"] == "done":
+                    return
+        except (OSError, _http_client().HTTPException, ValueError):
+            if cancel_event is not None and cancel_event.is_set():
+                raise TranslationCancelled()
+            raise
+        finally:
+            done.set()
+            conn.close()
+        if cancel_event is not None and cancel_event.is_set():
+            raise TranslationCancelled()
+        raise RemoteError("翻译服务连接中断")
+
+    @staticmethod
+    def _cancel_on(conn, cancel_event, done):
+        """取消时关闭连接，服务端检测到断开后停止生成"""
+        while not done.is_set():
+            if cancel_event.wait(0.1):
+                if not done.is_set() and conn.sock is not None:
+                    try:
+                        conn.sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                return
+
+    def translate_chunk(self, lines, source_lang, settings=None, on_note=None):
+        result = self.request("POST", "/translate_chunk",
+                              {"lines": lines, "source_lang": source_lang, "settings": settings})
+        if on_note is not None:
+            for message, tag in result["notes"]:
+                on_note(message, tag)
+        return [from_json_translation(t) for t in result["translations"]], result["usage"]
+
+    def translate_batch(self, lines, settings=None, concurrency=4, on_progress=None, cancel_event=None,
+                        on_result=None, on_note=None, pack=True):
+        """批量翻译，回调与 TranslationEngine.translate_batch 相同，按服务端事件执行；
+        cancel_event置位时断开连接，服务端随即取消"""
+        payload = {"lines": lines, "settings": settings, "concurrency": concurrency, "stream": True,
+                   "results": on_result is not None, "pack": pack}
+        for event in self._stream_events("/batch", payload, cancel_event):
+            if event["event"] == "progress":
+                if on_progress is not None:
+                    on_progress(event["done"], event["total"])
+            elif event["event"] == "result":
+                on_result([(index, from_json_translation(t)) for index, t in event["results"]], event["usage"])
+            elif event["event"] == "note":
+                if on_note is not None:
+                    on_note(event["message"], event["tag"])
+            elif event["event"] == "done":
+                return [from_json_translation(t) for t in event["results"]], event["cost"]
+
+    def cost_summary(self):
+        return self.request("GET", "/stats")
+
+    def cache_size(self):
+        return self.cost_summary()["cache_size"]
+
+    def clear_cache(self):
+        return self.request("POST", "/cache/clear")["cleared"]
+
+    def reload_glossary(self):
+        return self.request("POST", "/glossary/reload")["terms"]
+
+    def warm_up(self, settings=None):
+        self.request("POST", "/warmup", {"settings": settings})
+
+    def close(self):
+        """客户端不持有服务，关闭时不做任何事"""
+
+
+def connect_daemon():
+    """连接已运行的翻译服务，没有可用服务时返回None"""
+    info = read_info()
+    if not info:
+        return None
+    client = EngineClient(info["url"], info["token"])
+    try:
+        client.health()
+    except (OSError, _http_client().HTTPException, RemoteError, ValueError):
+        return None
+    return client
+
+
+def connect_engine(serve=True, **engine_options):
+    """优先连接已运行的翻译服务；没有时在本进程创建引擎，serve为真时同时对外提供服务"""
+    client = connect_daemon()
+    if client is not None:
+        return client
+
+    engine = TranslationEngine(**engine_options)
+    if serve:
+        serve_engine(engine)
+    return engine
+
+
+def serve_engine(engine):
+    """让本进程的引擎对外提供服务，启动失败时引擎仍可在本进程使用"""
+    try:
+        engine.server = EngineServer(engine).start()
+    except OSError as e:
+        print(f"启动翻译服务失败: {e}")
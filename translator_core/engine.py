@@ -0,0 +1,857 @@
+"""
+翻译引擎
+与界面无关的翻译核心：语言检测、术语预处理、提示构建、缓存、增量翻译、打包翻译、
+请求路由、模型选择和用量计费。界面程序、守护进程和命令行工具共用同一套实现；
+每次调用可带上自己的设置（模型、语言、API Key等），互不影响。
+翻译流程是协程，全部在引擎的事件循环线程中并发执行；translate() 等同步接口供线程调用
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .aio import CallbackRelay, EventLoopThread
+from .batch import BatchTranslator, get_rate_limiter
+from .cache import TranslationCache
+from .chunking import (CHUNK_CONCURRENCY, OrderedStream, chunk_token_budget, merge_parallel_usage,
+                       output_token_budget, split_chunks)
+from .clients import ClientRegistry
+from .errors import TranslationCancelled
+from .glossary import GlossaryStore
+from .langdetect import detect
+from .ledger import UsageLedger, cached_prompt_tokens
+from .metrics import StageMetrics
+from .models import DEFAULT_MODELS, load_models
+from .packing import pack_lines, parse_packed_response, estimate_packed_output_tokens, split_pack
+from .prompts import (build_messages, build_translation_prompt, build_packed_prompt,
+                      build_glossary_hint, cache_hit_ratio, prompt_version)
+from .routing import RequestRouter
+from .segments import split_segments, fingerprint, SegmentStore
+from .selector import ModelSelector
+from .terms import TermMatcher
+from .text import estimate_tokens
+
+# 备用模型选项
+BACKUP_MODEL_AUTO = "自动"
+BACKUP_MODEL_NONE = "无"
+
+# 语言显示名称
+LANG_NAMES = {
+    'ja': '日语',
+    'zh': '中文',
+    'en': '英语',
+    # 无法判断语言（如全是通用汉字）时由模型自行识别
+    'unknown': '自动识别'
+}
+
+# 首次运行时写入默认词典的术语（日语原文: 正确翻译）
+DEFAULT_TERMS = {
+    "アーバンも": "Avamo",
+    "アバモ": "Avamo",
+    "エアテレント": "AI Talent",
+    "ホリプロ": "Horipro",
+    "クリエイティブチェック": "创意审核",
+    "アバター": "avatar",
+    "タレント": "艺人",
+    "ネイティブチェック": "母语审核"
+}
+
+
+def default_settings():
+    """引擎的默认设置，API Key可由环境变量提供（守护进程和命令行使用）"""
+    return {
+        'model_key': "deepseek-v3-0324",
+        'source_lang': "ja",
+        'target_lang': "zh",
+        'translation_mode': "auto",
+        'quality_enhance': False,
+        'use_cache': True,
+        'incremental': True,
+        'backup_model': BACKUP_MODEL_AUTO,
+        'hedge_requests': False,
+        'adaptive_model': True,
+        'latency_budget': "",
+        'cost_ceiling': "",
+        'openai_key': os.environ.get("OPENAI_API_KEY", ""),
+        'deepseek_key': os.environ.get("DEEPSEEK_API_KEY", ""),
+    }
+
+
+def detect_language(text, source_lang="auto"):
+    """检测文本语言，指定了源语言时直接返回"""
+    if source_lang != "auto":
+        return source_lang
+    # 单次扫描检测，可区分全汉字的日文和中文
+    return detect(text).language
+
+
+def should_translate(detected_lang, mode):
+    """根据翻译模式判断是否应该翻译"""
+    if mode == "japanese_only":
+        return detected_lang == "ja"
+    elif mode == "chinese_only":
+        return detected_lang == "zh"
+    else:  # auto mode
+        return True
+
+
+def load_model_catalog():
+    """加载模型目录（内置价格 + models.json覆盖项），配置有误时使用内置价格"""
+    try:
+        return load_models()
+    except ValueError as e:
+        print(f"模型配置无效，使用内置配置: {e}")
+        return {spec.key: spec for spec in DEFAULT_MODELS}
+
+
+class TranslationEngine:
+    """无界面的翻译引擎（线程安全）
+
+    设置和提示回调按调用传入，只对本次调用（及其派生的协程任务）生效；on_note(消息, 标签)
+    接收术语预处理、增量复用、自动选择模型等提示信息
+    """
+
+    def __init__(self, settings=None, models=None, default_terms=DEFAULT_TERMS, on_note=None):
+        self.base_settings = dict(default_settings(), **(settings or {}))
+        self.on_note = on_note
+        # 本次调用的设置和提示回调，随协程任务传递
+        self._call_settings = contextvars.ContextVar("call_settings", default=None)
+        self._call_note = contextvars.ContextVar("call_note", default=None)
+
+        # 事件循环线程：网络请求、重试、对冲和批量并发都以协程在其中执行
+        self.loop = EventLoopThread()
+
+        # AI模型目录（价格可在数据目录的models.json中覆盖）
+        self.ai_models = models or load_model_catalog()
+
+        # 术语词典和匹配自动机
+        self.glossary = GlossaryStore(default_terms=default_terms)
+        self.term_matcher = TermMatcher(self.glossary.all_terms())
+        # 提示中的术语列表，词典不变时保持不变，便于命中提示缓存
+        self.glossary_hint = build_glossary_hint(self.term_matcher.terms.values())
+        # 提示版本写入缓存键和句子指纹，术语提示变化后旧译文自然失效
+        self.prompt_version = prompt_version(self.glossary_hint)
+
+        # 翻译缓存（持久化，重启后有效）和会话内的句子译文
+        self.translation_cache = TranslationCache()
+        self.segment_store = SegmentStore()
+
+        # 各阶段耗时统计
+        self.metrics = StageMetrics()
+
+        # API客户端连接池（复用长连接），同时记录连接和首字节耗时；SDK在首次使用时导入
+        self.client_registry = ClientRegistry(observe=self.metrics.observe)
+
+        # 请求路由：超时、重试、熔断、备用模型和对冲请求
+        self.request_router = RequestRouter(lambda model_key: self.ai_models[model_key].provider)
+
+        # 自适应模型选择：按文本长度、语言、质量模式和近期延迟/成本选择模型
+        self.model_selector = ModelSelector()
+
+        # 成本统计（引擎运行期间）和用量账本（持久化，按天/模型汇总）
+        self.total_input_tokens = 0
+        self.total_output_tokens = 0
+        self.estimated_cost = 0.0
+        self.stats_lock = threading.Lock()
+        self.usage_ledger = UsageLedger()
+
+        # 对外提供服务时的EngineServer，关闭引擎时一并停止
+        self.server = None
+
+    @property
+    def settings(self):
+        """本次调用生效的设置"""
+        return self._call_settings.get() or self.base_settings
+
+    @contextmanager
+    def using(self, settings=None, on_note=None):
+        """在当前线程或协程任务中使用调用方的设置和提示回调（未提供的设置项取默认值）"""
+        tokens = []
+        if settings is not None:
+            tokens.append((self._call_settings, self._call_settings.set(dict(self.base_settings, **settings))))
+        if on_note is not None:
+            tokens.append((self._call_note, self._call_note.set(on_note)))
+        try:
+            yield
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+    def note(self, message, tag="timestamp"):
+        """向调用方发送提示信息"""
+        on_note = self._call_note.get() or self.on_note
+        if on_note is not None:
+            on_note(message, tag)
+
+    # ---- 对外接口 ----
+
+    def detect_language(self, text, source_lang=None):
+        source_lang = source_lang or self.settings['source_lang']
+        if source_lang != "auto":
+            return source_lang
+        with self.metrics.span("language_detect"):
+            return detect_language(text)
+
+    def should_translate(self, detected_lang, mode=None):
+        return should_translate(detected_lang, mode or self.settings['translation_mode'])
+
+    def translate(self, text, source_lang=None, on_delta=None, cancel_event=None, settings=None,
+                  on_note=None, incremental=None, timeout=None):
+        """翻译一段文本并计费，返回(译文, 用量)，用量中的 cost/cost_info 为本次成本
+
+        atranslate 的同步版本：on_delta、on_note 在调用方线程中回调；cancel_event置位时中断请求并
+        抛出TranslationCancelled，超过timeout秒抛出TimeoutError
+        """
+        relay = CallbackRelay()
+        translation, usage_info = self.loop.run(
+            self.atranslate(text, source_lang, relay.wrap(on_delta), settings, relay.wrap(on_note), incremental),
+            cancel_event, timeout, relay)
+        # 请求完成时内容已被取代（用量已计入）
+        if cancel_event is not None and cancel_event.is_set():
+            raise TranslationCancelled(usage_info)
+        return translation, usage_info
+
+    async def atranslate(self, text, source_lang=None, on_delta=None, settings=None, on_note=None,
+                         incremental=None):
+        """翻译一段文本并计费，返回(译文, 用量)；取消任务即中断请求"""
+        with self.using(settings, on_note):
+            source_lang = source_lang or self.detect_language(text)
+            if incremental is None:
+                incremental = self.settings['incremental']
+            # 增量模式下只翻译新增或修改的句子
+            if incremental:
+                translation, usage_info = await self.perform_incremental_translation(
+                    text, source_lang, on_delta=on_delta)
+            else:
+                translation, usage_info = await self.perform_translation(text, source_lang, on_delta=on_delta)
+            self.record_usage(usage_info)
+            return translation, usage_info
+
+    async def astream(self, text, source_lang=None, settings=None, on_note=None, incremental=False):
+        """流式翻译，逐段产出译文片段；提前结束迭代时取消请求"""
+        deltas = asyncio.Queue()
+        finished = object()
+        task = asyncio.ensure_future(
+            self.atranslate(text, source_lang, deltas.put_nowait, settings, on_note, incremental))
+        task.add_done_callback(lambda _: deltas.put_nowait(finished))
+        try:
+            while True:
+                delta = await deltas.get()
+                if delta is finished:
+                    break
+                yield delta
+            task.result()
+        finally:
+            task.cancel()
+
+    def translate_chunk(self, lines, source_lang, settings=None, on_note=None):
+        """atranslate_chunk 的同步版本"""
+        relay = CallbackRelay()
+        return self.loop.run(self.atranslate_chunk(lines, source_lang, settings, relay.wrap(on_note)),
+                             relay=relay)
+
+    async def atranslate_chunk(self, lines, source_lang, settings=None, on_note=None):
+        """一次请求翻译同一语言的多行并计费，返回(译文列表, 用量)
+
+        当前模式不翻译该语言时返回([None, ...], None)。请求失败时抛出异常（已产生的用量已计费，
+        附在异常的 usage_info 上），由批量翻译层按 split_pack 拆成单行，经同样的限流和重试逐行翻译
+        """
+        with self.using(settings, on_note):
+            if not self.should_translate(source_lang):
+                return [None] * len(lines), None
+
+            if len(lines) == 1:
+                translation, usage_info = await self.perform_translation(lines[0], source_lang)
+                self.record_usage(usage_info)
+                return [translation], usage_info
+
+            try:
+                translations, usage_info = await self.perform_packed_translation(lines, source_lang)
+            except Exception as e:
+                if getattr(e, 'usage_info', None):
+                    self.record_usage(e.usage_info)
+                self.note(f"⚠️ 打包翻译失败，改为逐行翻译: {e}")
+                raise
+            self.record_usage(usage_info)
+            return translations, usage_info
+
+    def translate_batch(self, lines, settings=None, concurrency=4, on_progress=None, cancel_event=None,
+                        on_result=None, on_note=None, pack=True):
+        """atranslate_batch 的同步版本，回调在调用方线程中执行；cancel_event置位时中断所有进行中的请求
+        并抛出TranslationCancelled"""
+        relay = CallbackRelay()
+        return self.loop.run(
+            self.atranslate_batch(lines, settings, concurrency, relay.wrap(on_progress), relay.wrap(on_result),
+                                  relay.wrap(on_note), pack),
+            cancel_event, relay=relay)
+
+    async def atranslate_batch(self, lines, settings=None, concurrency=4, on_progress=None, on_result=None,
+                               on_note=None, pack=True):
+        """批量翻译多行：按语言和token预算打包（pack为假时逐行请求），以协程并发请求并按提供商限流
+
+        返回(逐行结果, 总成本)，结果为译文、None（跳过）或异常。on_result([(行号, 结果), ...], 用量)
+        按输入顺序在每个请求完成时回调，on_progress(完成数, 请求数)按完成的请求数回调
+        """
+        with self.using(settings):
+            settings = self.settings
+            items = [(line, self.detect_language(line)) for line in lines]
+            units = pack_lines(items) if pack else pack_lines(items, max_lines=1)
+            provider = self.ai_models[settings['model_key']].provider
+
+        translator = BatchTranslator(
+            lambda chunk: self.atranslate_chunk([line for _, line, _ in chunk], chunk[0][2], settings, on_note),
+            concurrency=concurrency, rate_limiter=get_rate_limiter(provider), split_func=split_pack)
+        results = [None] * len(lines)
+        total_cost = [0.0]
+
+        def finish(item):
+            if item['usage_info']:
+                total_cost[0] += item['usage_info'].get('cost', 0.0)
+            translations = item['translation'] or [item['error']] * len(item['line'])
+            for (index, _, _), translation in zip(item['line'], translations):
+                results[index] = translation
+            if on_result is not None:
+                on_result([(index, translation) for (index, _, _), translation in zip(item['line'], translations)],
+                          item['usage_info'])
+
+        await translator.arun(units, finish, on_progress)
+        return results, total_cost[0]
+
+    def cost_summary(self):
+        """引擎运行期间和本月的用量"""
+        with self.stats_lock:
+            summary = {
+                'input_tokens': self.total_input_tokens,
+                'output_tokens': self.total_output_tokens,
+                'cost': self.estimated_cost,
+            }
+        summary['month_cost'] = self.usage_ledger.month_to_date()['cost']
+        summary['today_cost'] = self.usage_ledger.today()['cost']
+        return summary
+
+    def cache_size(self):
+        return len(self.translation_cache)
+
+    def clear_cache(self):
+        """清空翻译缓存和句子译文，返回清空的缓存条数"""
+        count = len(self.translation_cache)
+        self.translation_cache.clear()
+        self.segment_store.clear()
+        return count
+
+    def reload_glossary(self):
+        """重新读取术语词典并重建匹配自动机（词典在其他进程中修改后调用），返回术语数"""
+        self.glossary.reload_settings()
+        terms = self.glossary.all_terms()
+        self.term_matcher = TermMatcher(terms)
+        self.glossary_hint = build_glossary_hint(terms.values())
+        self.prompt_version = prompt_version(self.glossary_hint)
+        # 术语变化后，已保存的句子译文可能不再适用
+        self.segment_store.clear()
+        return len(terms)
+
+    def warm_up(self, settings=None):
+        """在事件循环中预热当前模型对应的API连接（同时导入SDK），不等待完成"""
+        with self.using(settings):
+            provider = self.ai_models[self.settings['model_key']].provider
+            api_key = self.api_key_for(provider)
+        if api_key:
+            self.loop.submit(self.client_registry.warm_up(provider, api_key))
+
+    def close(self):
+        if self.server is not None:
+            self.server.stop()
+        # 关闭连接池后停止事件循环
+        self.loop.stop(self.client_registry.aclose())
+        self.translation_cache.close()
+        self.glossary.close()
+        self.usage_ledger.close()
+
+    # ---- 翻译流程 ----
+
+    def preprocess_text_with_terms(self, text):
+        """使用术语词典预处理文本（单次扫描，最左最长匹配）"""
+        with self.metrics.span("term_preprocess"):
+            return self.term_matcher.replace(text)
+
+    async def perform_translation(self, text, source_lang, on_delta=None):
+        """执行翻译，提供on_delta时以流式方式逐段回调译文"""
+        # 超过一块预算的长文本分块并发翻译
+        budget = self.chunk_budget()
+        if estimate_tokens(text) > budget:
+            chunks = split_chunks(text, budget)
+            if len(chunks) > 1:
+                return await self.perform_chunked_translation(chunks, source_lang, on_delta=on_delta)
+
+        # 使用术语词典预处理文本
+        processed_text, replacements = self.preprocess_text_with_terms(text)
+
+        # 如果有术语替换，显示预处理信息
+        if replacements:
+            self.note(f"📚 术语预处理: {', '.join(replacements)}")
+
+        # 构建翻译提示
+        with self.metrics.span("prompt_build"):
+            source_name = LANG_NAMES.get(source_lang, source_lang)
+            target_name = LANG_NAMES.get(self.settings['target_lang'], self.settings['target_lang'])
+
+            # 固定前缀在前、原文在后，便于命中提供商的提示缓存
+            prompt = build_translation_prompt(source_name, target_name, processed_text,
+                                              self.settings['quality_enhance'], self.glossary_hint)
+
+        model_key = self.select_model(prompt, processed_text, source_lang)
+
+        # 查询翻译缓存（按本次选用的模型）
+        use_cache = self.settings['use_cache'] and self.translation_cache is not None
+        if use_cache:
+            cached_translation = self.translation_cache.get(self.cache_key(processed_text, source_lang, model_key))
+            if cached_translation is not None:
+                if on_delta is not None:
+                    on_delta(cached_translation)
+                return cached_translation, {'prompt_tokens': 0, 'completion_tokens': 0, 'cache_hit': True,
+                                            'model_key': model_key}
+
+        temperature, max_tokens = self.get_generation_params(estimate_tokens(processed_text), model_key)
+        translation, usage_info = await self.request_completion(prompt, max_tokens, temperature,
+                                                                on_delta=on_delta, model_key=model_key)
+
+        # 写入翻译缓存（即使调用方已不需要结果，费用已经产生，留待下次使用）；
+        # 由备用模型应答时记在备用模型名下
+        if use_cache and translation:
+            answered_by = usage_info.get('model_key', model_key)
+            await self.store_cached([(self.cache_key(processed_text, source_lang, answered_by), translation)])
+        return translation, usage_info
+
+    async def perform_chunked_translation(self, chunks, source_lang, on_delta=None):
+        """长文本分块翻译：各块并发请求（输出预算按块估算），译文按原顺序拼接
+
+        chunks 为 split_chunks() 的结果；流式输出时按块顺序回调，后面的块先缓存
+        """
+        self.note(f"✂️ 长文本分{len(chunks)}块并发翻译")
+        # 中日文原文句间没有空格，译成英文时补上
+        joiner = " " if self.settings['target_lang'] == "en" else ""
+        separators = [separator or joiner for _, separator in chunks]
+        stream = OrderedStream(separators, on_delta) if on_delta is not None else None
+
+        async def translate_part(index, chunk):
+            result = await self.perform_translation(
+                chunk, source_lang, on_delta=stream.delta_for(index) if stream is not None else None)
+            if stream is not None:
+                stream.finish(index)
+            return result
+
+        outputs = await self.gather_chunks(translate_part(i, chunk) for i, (chunk, _) in enumerate(chunks))
+        translation = "".join(part + separator for (part, _), separator in zip(outputs, separators)).strip()
+        return translation, merge_parallel_usage([usage_info for _, usage_info in outputs])
+
+    async def gather_chunks(self, coros):
+        """并发执行各块的请求（最多CHUNK_CONCURRENCY个同时进行），按顺序返回结果
+
+        任一块失败时取消其余块并抛出异常，已完成块的用量照常计入
+        """
+        semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+        async def limited(coro):
+            try:
+                async with semaphore:
+                    return await coro
+            finally:
+                # 尚未开始就被取消时关闭协程
+                coro.close()
+
+        tasks = [asyncio.ensure_future(limited(coro)) for coro in coros]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            completed = merge_parallel_usage([
+                task.result()[1] for task in tasks
+                if task.done() and not task.cancelled() and task.exception() is None
+            ])
+            if completed:
+                self.record_usage(completed)
+            raise
+
+    async def perform_incremental_translation(self, text, source_lang, on_delta=None):
+        """句子级增量翻译：复用本次会话已翻译的句子，只发送新增或修改的句子
+
+        没有可复用的句子时整体流式翻译（保留句间上下文）；否则相邻的新句子合为一段并发流式翻译，
+        复用的句子直接输出，各段按原顺序拼接
+        """
+        segments = split_segments(text)
+        # 单句文本直接整体翻译，译文同样保存，之后追加句子时可以复用
+        if len(segments) < 2:
+            translation, usage_info = await self.perform_translation(text, source_lang, on_delta=on_delta)
+            self.remember_segments(segments, translation, source_lang, usage_info)
+            return translation, usage_info
+
+        # 按所选模型查找（保存时同时记在所选模型和实际应答的模型名下）
+        translations = [self.segment_store.get(self.segment_key(sentence, source_lang))
+                        for sentence, _ in segments]
+        reused = sum(translation is not None for translation in translations)
+        if not reused:
+            translation, usage_info = await self.perform_translation(text, source_lang, on_delta=on_delta)
+            self.remember_segments(segments, translation, source_lang, usage_info)
+            return translation, usage_info
+
+        self.note(f"♻️ 增量翻译: 复用{reused}句，新翻译{len(segments) - reused}句")
+
+        # 相邻的复用句/新句分别合为一段: [起始句, 结束句, 是否复用]
+        parts = []
+        for i, translation in enumerate(translations):
+            if parts and parts[-1][2] == (translation is not None):
+                parts[-1][1] = i + 1
+            else:
+                parts.append([i, i + 1, translation is not None])
+
+        # 中日文原文句间没有空格，译成英文时补上
+        joiner = " " if self.settings['target_lang'] == "en" else ""
+        separators = [segments[end - 1][1] or joiner for _, end, _ in parts]
+        stream = OrderedStream(separators, on_delta) if on_delta is not None else None
+        outputs = [None] * len(parts)
+
+        def join(pieces):
+            return "".join(piece + (separator or joiner) for piece, separator in pieces[:-1]) + pieces[-1][0]
+
+        async def translate_part(index, start, end):
+            run = segments[start:end]
+            result = await self.perform_translation(
+                join(run), source_lang, on_delta=stream.delta_for(index) if stream is not None else None)
+            if stream is not None:
+                stream.finish(index)
+            self.remember_segments(run, result[0], source_lang, result[1])
+            outputs[index] = result[0]
+            return result
+
+        pending = []
+        for index, (start, end, is_reused) in enumerate(parts):
+            if is_reused:
+                outputs[index] = join([(translations[i], segments[i][1]) for i in range(start, end)])
+                if stream is not None:
+                    stream.delta_for(index)(outputs[index])
+                    stream.finish(index)
+            else:
+                pending.append(translate_part(index, start, end))
+
+        results = await self.gather_chunks(pending)
+        usage_info = merge_parallel_usage([usage_info for _, usage_info in results])
+        translation = "".join(output + separator for output, separator in zip(outputs, separators)).strip()
+        return translation, usage_info
+
+    def remember_segments(self, segments, translation, source_lang, usage_info):
+        """保存各句译文供之后的增量翻译复用；多句的译文能按句对齐（句数相同）时才逐句保存
+
+        译文记在所选模型名下（自动选择模型或切换到备用模型后，下次按同一设置查找仍能命中），
+        由其他模型应答时也记在应答模型名下
+        """
+        if not segments or not translation:
+            return
+        if len(segments) == 1:
+            pieces = [translation]
+        else:
+            pieces = [piece for piece, _ in split_segments(translation)]
+            if len(pieces) != len(segments):
+                return
+        model_keys = {self.settings['model_key'], (usage_info or {}).get('model_key') or self.settings['model_key']}
+        for (sentence, _), piece in zip(segments, pieces):
+            for model_key in model_keys:
+                self.segment_store.put(self.segment_key(sentence, source_lang, model_key), piece)
+
+    async def perform_packed_translation(self, lines, source_lang):
+        """一次请求翻译多行文本，返回(译文列表, 用量)；回复条数不符时抛出异常"""
+        processed_lines = []
+        replacements = []
+        for line in lines:
+            processed_line, line_replacements = self.preprocess_text_with_terms(line)
+            processed_lines.append(processed_line)
+            replacements.extend(r for r in line_replacements if r not in replacements)
+
+        if replacements:
+            self.note(f"📚 术语预处理: {', '.join(replacements)}")
+
+        with self.metrics.span("prompt_build"):
+            source_name = LANG_NAMES.get(source_lang, source_lang)
+            target_name = LANG_NAMES.get(self.settings['target_lang'], self.settings['target_lang'])
+            prompt = build_packed_prompt(source_name, target_name, processed_lines,
+                                         self.settings['quality_enhance'], self.glossary_hint)
+        # 按整组选择模型，缓存查询和请求使用同一模型
+        model_key = self.select_model(prompt, "\n".join(processed_lines), source_lang)
+
+        # 已缓存的行不再发送
+        translations = [None] * len(lines)
+        pending = list(range(len(lines)))
+        use_cache = self.settings['use_cache'] and self.translation_cache is not None
+        if use_cache:
+            pending = []
+            for i, processed_line in enumerate(processed_lines):
+                translations[i] = self.translation_cache.get(self.cache_key(processed_line, source_lang, model_key))
+                if translations[i] is None:
+                    pending.append(i)
+
+        if not pending:
+            return translations, {'prompt_tokens': 0, 'completion_tokens': 0, 'cache_hit': True,
+                                  'model_key': model_key}
+
+        pending_texts = [processed_lines[i] for i in pending]
+        if len(pending) < len(lines):
+            with self.metrics.span("prompt_build"):
+                prompt = build_packed_prompt(source_name, target_name, pending_texts,
+                                             self.settings['quality_enhance'], self.glossary_hint)
+
+        temperature, max_tokens = self.get_generation_params(
+            sum(estimate_tokens(text) for text in pending_texts), model_key)
+        max_tokens = min(self.ai_models[model_key].max_output_tokens,
+                         max(max_tokens, estimate_packed_output_tokens(pending_texts)))
+        content, usage_info = await self.request_completion(prompt, max_tokens, temperature, model_key=model_key)
+
+        try:
+            results = parse_packed_response(content, len(pending))
+        except ValueError as e:
+            # 附带已产生的用量，回退时仍计入成本
+            e.usage_info = usage_info
+            raise
+
+        for i, translation in zip(pending, results):
+            translations[i] = translation
+        if use_cache:
+            answered_by = usage_info.get('model_key', model_key)
+            await self.store_cached([(self.cache_key(processed_lines[i], source_lang, answered_by), translations[i])
+                                     for i in pending])
+        return translations, usage_info
+
+    def cache_key(self, processed_text, source_lang, model_key):
+        """翻译缓存键：区分给出译文的模型和提示版本"""
+        return TranslationCache.make_key(processed_text, source_lang, self.settings['target_lang'], model_key,
+                                         self.settings['quality_enhance'], self.prompt_version)
+
+    def segment_key(self, sentence, source_lang, model_key=None):
+        """句子指纹，默认按所选模型"""
+        return fingerprint(sentence, source_lang, self.settings['target_lang'],
+                           model_key or self.settings['model_key'], self.settings['quality_enhance'],
+                           self.prompt_version)
+
+    async def store_cached(self, entries):
+        """写入翻译缓存 [(缓存键, 译文), ...]；SQLite提交放到线程池中，不阻塞事件循环"""
+        if not entries:
+            return
+
+        def put_all():
+            for key, translation in entries:
+                self.translation_cache.put(key, translation)
+
+        await asyncio.to_thread(put_all)
+
+    def get_generation_params(self, text_tokens, model_key=None):
+        """返回(温度, 最大输出token)，输出预算按原文token数估算，不超过模型的输出上限"""
+        spec = self.ai_models[model_key or self.settings['model_key']]
+        quality_enhance = self.settings['quality_enhance']
+        max_tokens = output_token_budget(text_tokens, quality_enhance, spec.max_output_tokens, spec.reasoning)
+        # 质量增强模式使用更低的温度
+        return (0.1 if quality_enhance else 0.3), max_tokens
+
+    def chunk_budget(self):
+        """长文本每块原文的token上限（按所选模型的输出上限）"""
+        spec = self.ai_models[self.settings['model_key']]
+        return chunk_token_budget(spec.max_output_tokens, spec.reasoning)
+
+    def select_model(self, prompt, text, source_lang):
+        """为本次请求选择模型，未启用自动选择时使用所选模型"""
+        preferred = self.settings['model_key']
+        if not self.settings['adaptive_model']:
+            return preferred
+
+        models = {key: spec for key, spec in self.ai_models.items() if self.api_key_for(spec.provider)}
+        if preferred not in models:
+            return preferred
+
+        selection = self.model_selector.select(
+            models, preferred, estimate_tokens(prompt), estimate_tokens(text), source_lang,
+            self.settings['quality_enhance'],
+            latency_budget=self.parse_limit(self.settings['latency_budget']),
+            cost_ceiling=self.parse_limit(self.settings['cost_ceiling'])
+        )
+        if selection.model_key != preferred:
+            self.note(f"🧭 自动选择模型: {self.ai_models[selection.model_key].name}（{selection.reason}）")
+        return selection.model_key
+
+    @staticmethod
+    def parse_limit(value):
+        """解析延迟预算/成本上限输入，留空或无效时返回None（不限）"""
+        try:
+            limit = float(value)
+        except (TypeError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    async def request_completion(self, prompt, max_tokens, temperature, on_delta=None, model_key=None):
+        """调用模型的聊天接口（默认为所选模型），返回(回复文本, 用量)；提供on_delta时使用流式输出"""
+        # 系统提示固定不变，作为提示缓存前缀的一部分
+        messages = build_messages(prompt)
+        settings = self.settings
+
+        # 经路由层调用：超时、重试、熔断，失败时切换到备用模型，可选对冲请求
+        # （对冲请求的协程任务继承本次调用的设置）
+        async def attempt(model_key, attempt_delta, timeout):
+            return await self.call_model(model_key, messages, max_tokens, temperature, attempt_delta, timeout)
+
+        primary = model_key or settings['model_key']
+        return await self.request_router.execute(
+            attempt, primary, self.resolve_backup_model(primary), on_delta=on_delta,
+            hedge=settings['hedge_requests'], on_discarded=self.record_discarded_usage
+        )
+
+    async def call_model(self, model_key, messages, max_tokens, temperature, on_delta=None, timeout=None):
+        """向指定模型发送一次请求，返回(回复文本, 用量)"""
+        started = time.perf_counter()
+        model_info = self.ai_models[model_key]
+        provider = model_info.provider
+
+        api_key = self.api_key_for(provider)
+        if not api_key:
+            if provider == "deepseek":
+                raise Exception("请先配置DeepSeek API Key")
+            raise Exception("请先配置有效的OpenAI API Key")
+
+        # 从连接池获取客户端（DeepSeek与OpenAI代理地址见PROVIDER_BASE_URLS），请求期间不会被关闭
+        async with self.client_registry.lease(provider, api_key) as client:
+            if on_delta is not None:
+                content, usage_info = await self.stream_completion(client, model_info.api_name, messages,
+                                                                   max_tokens, temperature, on_delta, timeout)
+            else:
+                response = await client.chat.completions.create(
+                    model=model_info.api_name,  # 使用实际的API模型名称
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout
+                )
+                content = response.choices[0].message.content.strip()
+                usage_info = response.usage.__dict__ if response.usage else {}
+
+        return content, self.normalize_usage(usage_info, model_key, started)
+
+    def normalize_usage(self, usage_info, model_key, started):
+        """统一记录应答模型、提示缓存命中的tokens和请求耗时，供计费和账本使用"""
+        usage_info = dict(usage_info)
+        usage_info['model_key'] = model_key
+        usage_info['cached_tokens'] = cached_prompt_tokens(usage_info)
+        usage_info['latency'] = time.perf_counter() - started
+        self.metrics.observe("network_total", usage_info['latency'])
+        return usage_info
+
+    def api_key_for(self, provider):
+        """返回提供商已配置的API Key，未配置时返回空字符串"""
+        if provider == "deepseek":
+            return self.settings['deepseek_key'].strip()
+        api_key = self.settings['openai_key'].strip()
+        return "" if api_key.startswith("sk-your-default") else api_key
+
+    def resolve_backup_model(self, primary):
+        """确定备用模型：自动时选另一提供商中已配置Key、价格最低的推荐模型"""
+        choice = self.settings['backup_model']
+        if choice == BACKUP_MODEL_NONE:
+            return None
+        primary_provider = self.ai_models[primary].provider
+        if choice != BACKUP_MODEL_AUTO:
+            if choice == primary or choice not in self.ai_models:
+                return None
+            return choice if self.api_key_for(self.ai_models[choice].provider) else None
+
+        candidates = [
+            spec for spec in self.ai_models.values()
+            if spec.recommended and spec.provider != primary_provider and self.api_key_for(spec.provider)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda spec: spec.output_price).key
+
+    def record_discarded_usage(self, usage_info):
+        """对冲请求中落选的一方如已完成，其用量同样计费"""
+        self.record_usage(usage_info)
+
+    async def stream_completion(self, client, api_model_name, messages, max_tokens, temperature, on_delta,
+                                timeout=None):
+        """流式调用聊天接口，逐段回调译文，结束后返回(完整文本, 用量)；任务被取消时中断连接"""
+        stream = await client.chat.completions.create(
+            model=api_model_name,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},  # 最后一个数据块携带用量统计
+            timeout=timeout
+        )
+
+        parts = []
+        usage_info = {}
+        try:
+            async for chunk in stream:
+                if chunk.choices:
+                    # 推理模型先输出reasoning_content，这里只显示最终译文
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        # 去掉开头的空白，与非流式的strip()保持一致
+                        if not parts:
+                            delta = delta.lstrip()
+                            if not delta:
+                                continue
+                        parts.append(delta)
+                        on_delta(delta)
+                if getattr(chunk, 'usage', None):
+                    usage_info = chunk.usage.__dict__
+        finally:
+            # 取消或出错时关闭连接，服务端停止生成
+            await stream.close()
+
+        return "".join(parts).strip(), usage_info
+
+    # ---- 计费 ----
+
+    def calculate_cost(self, input_tokens, output_tokens, model_key, cached_tokens=0):
+        """计算翻译成本（命中提示缓存的输入按缓存价格计费）"""
+        return self.ai_models[model_key].cost(input_tokens, output_tokens, cached_tokens)
+
+    def record_usage(self, usage_info):
+        """累计一次翻译的用量并写入账本，把本次成本写回 usage_info，返回(本次成本, 成本说明)"""
+        # 按实际应答的模型计费（可能是备用模型）
+        model_key = usage_info.get('model_key') or self.settings['model_key']
+        if usage_info.get('cache_hit'):
+            self.usage_ledger.record(model_key, cache_hit=True)
+            cost, cost_info = 0.0, "本次成本: $0.0000 (缓存命中，未调用API)"
+            usage_info.update(cost=cost, cost_info=cost_info)
+            return cost, cost_info
+
+        input_tokens = usage_info.get('prompt_tokens', 0)
+        output_tokens = usage_info.get('completion_tokens', 0)
+        parts = usage_info.get('by_model')
+        if parts:
+            # 合并了多个模型应答的用量：按各模型的价格分别计费和记账
+            cost = sum(self.record_usage(dict(part))[0] for part in parts.values())
+            cost_info = (f"本次成本: ${cost:.4f} (输入:{input_tokens} 输出:{output_tokens} tokens，"
+                         f"{len(parts)}个模型应答)")
+            usage_info.update(cost=cost, cost_info=cost_info)
+            return cost, cost_info
+
+        cached_tokens = usage_info.get('cached_tokens', 0)
+        cost = self.calculate_cost(input_tokens, output_tokens, model_key, cached_tokens)
+
+        # 多个调用方的翻译可能同时完成
+        with self.stats_lock:
+            self.total_input_tokens += input_tokens
+            self.total_output_tokens += output_tokens
+            self.estimated_cost += cost
+
+        self.usage_ledger.record(model_key, input_tokens, output_tokens, cached_tokens,
+                                 usage_info.get('latency', 0.0), cost)
+        if 'latency' in usage_info:
+            self.model_selector.record(model_key, input_tokens, usage_info['latency'], cost)
+
+        cached_text = f" 缓存命中:{cached_tokens}({cache_hit_ratio(usage_info):.0%})" if cached_tokens else ""
+        cost_info = f"本次成本: ${cost:.4f} (输入:{input_tokens}{cached_text} 输出:{output_tokens} tokens)"
+        if model_key != self.settings['model_key']:
+            cost_info += f" [由{self.ai_models[model_key].name}应答]"
+        usage_info.update(cost=cost, cost_info=cost_info)
+        return cost, cost_info
@@ -0,0 +1,11 @@
+"""
+翻译引擎的公共异常
+"""
+
+
+class TranslationCancelled(Exception):
+    """翻译已被取消；usage_info 为取消前已产生的用量（可能为None）"""
+
+    def __init__(self, usage_info=None):
+        super().__init__("翻译已取消")
+        self.usage_info = usage_info
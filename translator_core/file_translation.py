@@ -0,0 +1,328 @@
+"""
+大文件流式翻译
+TXT/SRT/VTT 逐行、CSV 逐条记录读取，经生成器流水线：读取 → 按窗口分组 → 翻译 → 写出。
+语言检测、术语预处理、打包和并发请求由引擎的批量接口完成；译文按原顺序追加写入输出文件，
+每个窗口写完后保存进度，中断后用相同参数重新运行即从断点继续。内存占用只与窗口大小有关，与文件大小无关
+"""
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+FORMATS = ("txt", "srt", "vtt", "csv")
+
+# 每个窗口最多包含的待翻译文本条数
+WINDOW_SIZE = 200
+
+# 进度文件: 输出文件名 + 后缀
+CHECKPOINT_SUFFIX = ".progress.json"
+
+
+class FileTranslationError(Exception):
+    """文件翻译失败（已完成部分的进度已保存，可稍后继续）"""
+
+
+def detect_format(path):
+    """按扩展名判断文件格式，未知扩展名按纯文本处理"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return extension if extension in FORMATS else "txt"
+
+
+def default_output_path(path, target_lang):
+    """默认输出文件：原文件名加目标语言，如 meeting.zh.srt"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{target_lang}{extension}"
+
+
+class FileTranslator:
+    """流式翻译一个文件，支持断点续传
+
+    translate_batch(lines) 返回 (逐行结果, 成本)，结果为译文、None（无需翻译，保留原文）或异常，
+    与 TranslationEngine.translate_batch / EngineClient.translate_batch 一致。
+    columns 为CSV要翻译的列（列名或从1开始的序号），None表示全部列；
+    settings_key 为影响译文的设置（如目标语言、模型），与进度一起保存，变化后不再续传
+    """
+
+    def __init__(self, input_path, output_path, translate_batch, fmt=None, bilingual=False,
+                 columns=None, header=True, settings_key=None, window=WINDOW_SIZE,
+                 max_retries=3, retry_delay=10.0, on_progress=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.translate_batch = translate_batch
+        self.format = fmt or detect_format(input_path)
+        self.bilingual = bilingual
+        self.columns = columns
+        self.header = header
+        self.settings_key = settings_key
+        self.window = max(1, int(window))
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_progress = on_progress
+
+        self.checkpoint_path = output_path + CHECKPOINT_SUFFIX
+        self.stats = {"records": 0, "translated": 0, "bytes_read": 0, "total_bytes": 0,
+                      "cost": 0.0, "resumed": False, "stopped": False}
+        self._stop_event = threading.Event()
+        # CSV需要翻译的列序号，读取表头（或第一行）后确定
+        self._csv_columns = None
+
+    def stop(self):
+        """当前窗口写完后停止，进度保留"""
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    # ---- 进度 ----
+
+    def _identity(self):
+        """输入文件和翻译选项，进度只在两者都不变时有效"""
+        info = os.stat(self.input_path)
+        return {
+            "input": os.path.abspath(self.input_path),
+            "size": info.st_size,
+            "mtime": info.st_mtime,
+            "format": self.format,
+            "bilingual": self.bilingual,
+            "columns": self.columns,
+            "header": self.header,
+            "settings": self.settings_key,
+        }
+
+    def pending_checkpoint(self):
+        """返回可以继续的进度，没有或已失效时返回None"""
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("identity") != self._identity():
+            return None
+        # 输出文件被删除或截短时无法续传
+        try:
+            if os.path.getsize(self.output_path) < checkpoint["output_offset"]:
+                return None
+        except OSError:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, records, output_offset):
+        """原子写入进度文件"""
+        checkpoint = {
+            "identity": self._identity(),
+            "records": records,
+            "output_offset": output_offset,
+            "updated": time.time(),
+        }
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    # ---- 流水线 ----
+
+    def run(self, resume=True):
+        """执行翻译（阻塞），返回统计信息；resume为真且有有效进度时从断点继续"""
+        checkpoint = self.pending_checkpoint() if resume else None
+        done = checkpoint["records"] if checkpoint else 0
+        offset = checkpoint["output_offset"] if checkpoint else 0
+        self.stats.update(records=done, resumed=checkpoint is not None,
+                          total_bytes=os.path.getsize(self.input_path))
+
+        if offset:
+            # 丢弃上次最后一个窗口写了一半的内容
+            with open(self.output_path, "r+b") as output:
+                output.truncate(offset)
+
+        with open(self.input_path, "r", encoding="utf-8-sig", newline="") as source, \
+                open(self.output_path, "ab" if offset else "wb") as output:
+            records = self._read_records(self._count_bytes(source))
+            # 已完成的记录照常读取（恢复CSV表头等状态），但不再翻译
+            for _ in range(done):
+                if next(records, None) is None:
+                    break
+
+            for window, translations, cost in self._translate_windows(self._windows(records)):
+                output.write(self._render_window(window, translations).encode("utf-8"))
+                output.flush()
+                os.fsync(output.fileno())
+                done += len(window)
+                self.stats["records"] = done
+                self.stats["translated"] += sum(len(texts) for _, texts in window)
+                self.stats["cost"] += cost
+                self._save_checkpoint(done, output.tell())
+                if self.on_progress is not None:
+                    self.on_progress(dict(self.stats))
+                if self.stopped:
+                    self.stats["stopped"] = True
+                    return self.stats
+
+        # 全部完成，删除进度文件
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self.stats
+
+    def _count_bytes(self, source):
+        """逐行读取并累计已读字节数（用于进度显示）"""
+        for line in source:
+            self.stats["bytes_read"] += len(line.encode("utf-8"))
+            yield line
+
+    def _read_records(self, lines):
+        """按格式把输入行转换为记录，产出 (记录, [待翻译文本, ...])"""
+        if self.format == "csv":
+            return self._csv_records(lines)
+        if self.format in ("srt", "vtt"):
+            return self._subtitle_records(lines)
+        return self._text_records(lines)
+
+    def _windows(self, records):
+        """把记录按待翻译文本数分组；没有文本的记录过多时也结束当前窗口"""
+        window = []
+        count = 0
+        for record, texts in records:
+            window.append((record, texts))
+            count += len(texts)
+            if count >= self.window or len(window) >= self.window * 4:
+                yield window
+                window = []
+                count = 0
+        if window:
+            yield window
+
+    def _translate_windows(self, windows):
+        """逐个窗口翻译，产出 (窗口, 逐条译文, 成本)"""
+        for window in windows:
+            texts = [text for _, record_texts in window for text in record_texts]
+            translations, cost = self._translate_texts(texts) if texts else ([], 0.0)
+            yield window, translations, cost
+
+    def _translate_texts(self, texts):
+        """翻译一个窗口的文本，失败的行按退避时间重试，仍失败时抛出FileTranslationError"""
+        results = [None] * len(texts)
+        pending = list(range(len(texts)))
+        total_cost = 0.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                outputs, cost = self.translate_batch([texts[i] for i in pending])
+                total_cost += cost
+            except Exception as e:
+                outputs = [e] * len(pending)
+
+            failed = []
+            for i, output in zip(pending, outputs):
+                if isinstance(output, Exception):
+                    failed.append((i, output))
+                else:
+                    results[i] = output
+            if not failed:
+                return results, total_cost
+
+            if attempt == self.max_retries or self.stopped:
+                raise FileTranslationError(f"{len(failed)}行翻译失败（进度已保存）: {failed[0][1]}")
+            pending = [i for i, _ in failed]
+            delay = self.retry_delay * 2 ** attempt
+            print(f"文件翻译: {len(pending)}行失败，{delay:.0f}秒后重试: {failed[0][1]}")
+            if self._stop_event.wait(delay):
+                raise FileTranslationError("文件翻译已停止（进度已保存）")
+
+    def _render_window(self, window, translations):
+        parts = []
+        position = 0
+        for record, texts in window:
+            record_translations = translations[position:position + len(texts)]
+            position += len(texts)
+            if self.format == "csv":
+                parts.append(self._render_csv(record, record_translations))
+            else:
+                parts.append(self._render_line(record, record_translations))
+        return "".join(parts)
+
+    # ---- 各格式的读取和写出 ----
+
+    @staticmethod
+    def _text_records(lines):
+        """纯文本：每个非空行为一条"""
+        for line in lines:
+            line = line.rstrip("\r\n")
+            yield line, [line.strip()] if line.strip() else []
+
+    @staticmethod
+    def _subtitle_records(lines):
+        """SRT/VTT：只翻译时间轴之后、空行之前的字幕文本，序号、时间轴、WEBVTT头和NOTE块原样保留"""
+        in_cue = False
+        for line in lines:
+            line = line.rstrip("\r\n")
+            stripped = line.strip()
+            if not stripped:
+                in_cue = False
+                yield line, []
+            elif "-->" in line:
+                in_cue = True
+                yield line, []
+            else:
+                yield line, [stripped] if in_cue else []
+
+    def _render_line(self, line, translations):
+        translation = translations[0] if translations else None
+        if translation is None:
+            return line + "\n"
+        indent = line[:len(line) - len(line.lstrip())]
+        # 保持一行对一行（字幕中的空行会结束当前字幕）
+        translation = indent + " ".join(translation.split("\n"))
+        if self.bilingual:
+            return f"{line}\n{translation}\n"
+        return translation + "\n"
+
+    def _csv_records(self, lines):
+        """CSV：每条记录为一行（带引号的单元格可跨行），翻译指定列的非空单元格"""
+        for row in csv.reader(lines):
+            if self._csv_columns is None:
+                self._csv_columns = self._resolve_columns(row if self.header else None, len(row))
+                if self.header:
+                    yield ("header", row), []
+                    continue
+            columns = [i for i in self._csv_columns if i < len(row) and row[i].strip()]
+            yield ("row", row, columns), [row[i] for i in columns]
+
+    def _resolve_columns(self, header_row, width):
+        if not self.columns:
+            return list(range(width))
+        indexes = []
+        for column in self.columns:
+            column = str(column).strip()
+            if header_row is not None and column in header_row:
+                indexes.append(header_row.index(column))
+            elif column.isdigit() and 1 <= int(column) <= width:
+                indexes.append(int(column) - 1)
+            else:
+                raise FileTranslationError(f"CSV中没有列: {column}")
+        return sorted(set(indexes))
+
+    def _render_csv(self, record, translations):
+        row = record[1]
+        if record[0] == "header":
+            cells = []
+            for i, cell in enumerate(row):
+                cells.append(cell)
+                if self.bilingual and i in self._csv_columns:
+                    cells.append(f"{cell}_译文")
+        else:
+            translated = dict(zip(record[2], translations))
+            cells = []
+            for i, cell in enumerate(row):
+                translation = translated.get(i)
+                if translation is None:
+                    translation = cell
+                if self.bilingual:
+                    cells.append(cell)
+                    if i in self._csv_columns:
+                        cells.append(translation)
+                else:
+                    cells.append(translation)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(cells)
+        return buffer.getvalue()
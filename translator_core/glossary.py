@@ -0,0 +1,192 @@
+"""
+术语词典存储
+每个词典（按项目/客户划分）是一个独立的SQLite文件，按需打开并启用内存映射读取，
+增删改只写单条记录，不再整体重写
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from .paths import data_path
+
+DEFAULT_GLOSSARY = "default"
+_NAME_RE = re.compile(r'[\w\-]+')
+
+
+class GlossaryStore:
+    """多词典术语存储"""
+
+    def __init__(self, directory=None, default_terms=None, mmap_size=256 * 1024 * 1024):
+        self.directory = directory or os.path.dirname(data_path("glossaries", "index.json"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.mmap_size = mmap_size
+        self.settings_file = os.path.join(self.directory, "index.json")
+
+        self._lock = threading.RLock()
+        self._connections = {}
+        self._disabled = set()
+        self._load_settings()
+
+        # 首次使用时写入默认术语
+        if DEFAULT_GLOSSARY not in self.list_glossaries():
+            self.create_glossary(DEFAULT_GLOSSARY)
+            if default_terms:
+                self.import_terms(DEFAULT_GLOSSARY, default_terms)
+
+    def list_glossaries(self):
+        """列出全部词典名称，默认词典排在最前"""
+        names = sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db"))
+        if DEFAULT_GLOSSARY in names:
+            names.remove(DEFAULT_GLOSSARY)
+            names.insert(0, DEFAULT_GLOSSARY)
+        return names
+
+    def create_glossary(self, name):
+        """新建词典"""
+        if not _NAME_RE.fullmatch(name or ""):
+            raise ValueError("词典名称只能包含文字、数字、下划线和连字符")
+        self._connect(name)
+
+    def is_enabled(self, name):
+        return name not in self._disabled
+
+    def set_enabled(self, name, enabled):
+        """设置词典是否参与翻译"""
+        with self._lock:
+            if enabled:
+                self._disabled.discard(name)
+            else:
+                self._disabled.add(name)
+            self._save_settings()
+
+    def count(self, name, search=None):
+        """词典中的术语数量"""
+        where, params = self._search_clause(search)
+        with self._lock:
+            return self._connect(name).execute(
+                f"SELECT COUNT(*) FROM terms {where}", params
+            ).fetchone()[0]
+
+    def page(self, name, offset, limit, search=None):
+        """按原文排序读取一页术语 [(原文, 译文), ...]"""
+        where, params = self._search_clause(search)
+        with self._lock:
+            return self._connect(name).execute(
+                f"SELECT source, target FROM terms {where} ORDER BY source LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+    def get(self, name, source):
+        with self._lock:
+            row = self._connect(name).execute(
+                "SELECT target FROM terms WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def upsert(self, name, source, target):
+        """新增或修改单条术语"""
+        with self._lock:
+            conn = self._connect(name)
+            conn.execute(
+                "INSERT INTO terms (source, target) VALUES (?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET target = excluded.target",
+                (source, target)
+            )
+            conn.commit()
+
+    def delete(self, name, source):
+        """删除单条术语"""
+        with self._lock:
+            conn = self._connect(name)
+            conn.execute("DELETE FROM terms WHERE source = ?", (source,))
+            conn.commit()
+
+    def rename(self, name, old_source, new_source, target):
+        """修改术语原文和译文（同一事务内完成）"""
+        with self._lock:
+            conn = self._connect(name)
+            with conn:
+                if old_source != new_source:
+                    conn.execute("DELETE FROM terms WHERE source = ?", (old_source,))
+                conn.execute(
+                    "INSERT INTO terms (source, target) VALUES (?, ?) "
+                    "ON CONFLICT(source) DO UPDATE SET target = excluded.target",
+                    (new_source, target)
+                )
+
+    def import_terms(self, name, terms, overwrite=True):
+        """批量导入术语，返回新增数量"""
+        with self._lock:
+            conn = self._connect(name)
+            before = conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+            verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+            with conn:
+                conn.executemany(f"{verb} INTO terms (source, target) VALUES (?, ?)",
+                                 ((s, t) for s, t in terms.items() if s and t))
+            return conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0] - before
+
+    def iter_terms(self, names=None):
+        """逐条读取已启用词典中的术语，后面的词典覆盖前面的同名术语"""
+        names = names or [n for n in self.list_glossaries() if self.is_enabled(n)]
+        for name in names:
+            with self._lock:
+                rows = self._connect(name).execute("SELECT source, target FROM terms").fetchall()
+            yield from rows
+
+    def all_terms(self):
+        """合并已启用词典的全部术语"""
+        return dict(self.iter_terms())
+
+    def reload_settings(self):
+        """重新读取词典启用设置（其他进程修改后调用）"""
+        with self._lock:
+            self._disabled = set()
+            self._load_settings()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def _connect(self, name):
+        """按需打开词典文件"""
+        conn = self._connections.get(name)
+        if conn is None:
+            if not _NAME_RE.fullmatch(name or ""):
+                raise ValueError(f"无效的词典名称: {name}")
+            conn = sqlite3.connect(os.path.join(self.directory, f"{name}.db"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS terms ("
+                "source TEXT PRIMARY KEY, target TEXT NOT NULL) WITHOUT ROWID"
+            )
+            conn.commit()
+            self._connections[name] = conn
+        return conn
+
+    @staticmethod
+    def _search_clause(search):
+        if not search:
+            return "", []
+        pattern = f"%{search}%"
+        return "WHERE source LIKE ? OR target LIKE ?", [pattern, pattern]
+
+    def _load_settings(self):
+        try:
+            with open(self.settings_file, "r", encoding="utf-8") as f:
+                self._disabled = set(json.load(f).get("disabled", []))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"读取词典设置失败: {e}")
+
+    def _save_settings(self):
+        try:
+            with open(self.settings_file, "w", encoding="utf-8") as f:
+                json.dump({"disabled": sorted(self._disabled)}, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存词典设置失败: {e}")
@@ -0,0 +1,133 @@
+"""
+语言检测
+用预编译的码位分类表把文本一次性映射为类别字符（str.translate，C层循环），
+再用 str.count 统计各文字比例；按窗口扫描，能判断时立即返回
+"""
+from collections import namedtuple
+
+# 检测结果：语言、置信度(0~1)、各文字占已扫描字符的比例、已扫描字符数
+DetectionResult = namedtuple("DetectionResult", ["language", "confidence", "ratios", "scanned"])
+
+# 类别字符
+_KANA, _HAN, _HAN_JA, _HAN_ZH, _LATIN, _HANGUL = "K", "H", "J", "S", "L", "G"
+
+# 日文使用而简体中文不使用的字：新字体、国字，以及日文沿用的旧字形（简体已简化）
+_JAPANESE_KANJI = (
+    "込働畑峠辻枠栃匂凪榊躾糀雫籾笹麿駅図広変様歩険済経続読売帰気楽薬転伝価関験対発実"
+    "円県拡営労効単戦弾鉄沢桜徳黒払亜悪圧囲隠栄駆検権剣軽応縄覧鉱曽滝祢嬢醸譲摂択"
+    "埼扱壱弐畳蛍穂粋駄髄黙陥鋳逓犠姫倹拠悩渋渓岡斉舎乗両仏処剤収団庁従戸抜挙捜揺"
+    "歯歴殻涙焼煙猟獣砕稲緑臓荘衆謎霊毎窓為週誌辺麺闘蔵"
+    "議資語東説話員題問間開聞時長門車電書貸買質確認識業務報連絡級紙線終結組織細総統"
+    "給約緒練縮績編緊網義論調談課講訳記計設許証評試詳誤誰請謝護進過運達遅選遠違還適"
+    "場際陽陰隊階陸頭顔類願額頼順預領頁風飛飯飲館馬駐魚鳥齢歳殺満漢準測積穏竜筆節範"
+    "築簡紅納純紹絵継維綿縦縁罰習聴職脳腸舗複補製見規視覚親観訓託訪詞誕誠諸豊貝負財"
+    "貨販責貯貴費貿賀賃賛賞賠購贈軍軒軸較載輪輸郵郷釈針釣鈍鉛銀銅銭鋭録鋼錯鍵鎖鏡閉"
+    "閣閲陣隣雑難雲響頑頻顧飼飾養騒驚髪鳴億優児偽傷劇勧厳圏園塩増壊専尋層島帯師帳幹"
+    "廃強慣態憶撃擬損敵構標機歓漁現産聖繊興軟閥頂騎"
+)
+
+# 简体中文特有的字（日文不使用）
+_SIMPLIFIED_HAN = (
+    "们这说么个为时对过还发经进开关问题现见应长动样让给吗呢吧啊东车话该谁认识觉头办"
+    "两边语请谢钱门间师书买卖产业务员网页从种虽论传递闻听总结设计"
+)
+
+WINDOW_SIZE = 256
+
+
+def _build_table():
+    """构建码位到类别字符的映射表（模块加载时构建一次）"""
+    table = {}
+
+    def add_range(start, end, category):
+        for code in range(start, end + 1):
+            table[code] = category
+
+    add_range(0x3040, 0x309F, _KANA)   # 平假名
+    add_range(0x30A0, 0x30FF, _KANA)   # 片假名
+    add_range(0x31F0, 0x31FF, _KANA)   # 片假名扩展
+    add_range(0xFF66, 0xFF9F, _KANA)   # 半角片假名
+    add_range(0x3400, 0x4DBF, _HAN)    # 扩展A
+    add_range(0x4E00, 0x9FFF, _HAN)    # 基本汉字
+    add_range(0xF900, 0xFAFF, _HAN)    # 兼容汉字
+    add_range(0xAC00, 0xD7AF, _HANGUL)
+    add_range(0x1100, 0x11FF, _HANGUL)
+    add_range(ord("a"), ord("z"), _LATIN)
+    add_range(ord("A"), ord("Z"), _LATIN)
+    add_range(0xFF21, 0xFF3A, _LATIN)  # 全角拉丁字母
+    add_range(0xFF41, 0xFF5A, _LATIN)
+
+    for char in _JAPANESE_KANJI:
+        table[ord(char)] = _HAN_JA
+    for char in _SIMPLIFIED_HAN:
+        table[ord(char)] = _HAN_ZH
+    return table
+
+
+_TABLE = _build_table()
+
+
+def _classify(kana, han, han_ja, han_zh, latin, hangul):
+    """根据各类字符数量判断语言，返回(语言, 置信度)"""
+    cjk = kana + han + han_ja + han_zh
+    # 英文按约4个字母一个词折算，与中日文字符数比较
+    latin_weight = latin / 4
+
+    if cjk == 0 and hangul == 0:
+        if latin:
+            return "en", 0.99 if latin >= 8 else 0.8
+        return "unknown", 0.0
+
+    if hangul > cjk and hangul >= latin_weight:
+        return "ko", min(0.99, 0.6 + hangul / (hangul + cjk + latin_weight) * 0.4)
+
+    if latin_weight > cjk * 2:
+        return "en", min(0.95, 0.5 + latin_weight / (latin_weight + cjk) * 0.45)
+
+    # 假名是日文最可靠的特征
+    if kana:
+        kana_share = kana / cjk
+        if kana >= 3 or kana_share >= 0.05:
+            return "ja", min(0.99, 0.85 + kana_share)
+        return "ja", 0.7
+
+    # 全是汉字：看日文特有字和简体特有字
+    if han_ja > han_zh:
+        return "ja", min(0.95, 0.6 + (han_ja - han_zh) * 0.1)
+    if han_zh > han_ja:
+        return "zh", min(0.99, 0.6 + (han_zh - han_ja) * 0.1)
+    # 没有可区分的字时无法判断（不当作中文，以免目标语言为中文时跳过翻译）
+    return "unknown", 0.3
+
+
+def detect(text, window_size=WINDOW_SIZE, min_confidence=0.9):
+    """检测文本语言，按窗口扫描，置信度达到min_confidence即提前返回"""
+    counts = [0, 0, 0, 0, 0, 0]
+    scanned = 0
+    language, confidence = "unknown", 0.0
+    length = len(text)
+
+    while scanned < length:
+        window = text[scanned:scanned + window_size].translate(_TABLE)
+        scanned += len(window)
+        counts[0] += window.count(_KANA)
+        counts[1] += window.count(_HAN)
+        counts[2] += window.count(_HAN_JA)
+        counts[3] += window.count(_HAN_ZH)
+        counts[4] += window.count(_LATIN)
+        counts[5] += window.count(_HANGUL)
+
+        language, confidence = _classify(*counts)
+        if confidence >= min_confidence:
+            break
+
+    kana, han, han_ja, han_zh, latin, hangul = counts
+    total = scanned or 1
+    ratios = {
+        "kana": kana / total,
+        "han": (han + han_ja + han_zh) / total,
+        "latin": latin / total,
+        "hangul": hangul / total,
+        "other": (scanned - sum(counts)) / total,
+    }
+    return DetectionResult(language, round(confidence, 3), ratios, scanned)
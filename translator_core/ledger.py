@@ -0,0 +1,253 @@
+"""
+用量账本
+每次翻译追加一条JSON记录（模型、tokens、缓存命中tokens、耗时、成本），
+后台线程批量写入并fsync；同时维护按天、按模型的汇总，查询本月用量无需扫描全部记录
+"""
+import json
+import os
+import threading
+import time
+
+from .paths import data_path
+
+_ROLLUP_FIELDS = ("requests", "cache_hits", "input_tokens", "output_tokens",
+                  "cached_tokens", "latency", "cost")
+
+
+def cached_prompt_tokens(usage):
+    """从接口返回的用量中取出命中提示缓存的输入tokens"""
+    if not usage:
+        return 0
+    # DeepSeek: prompt_cache_hit_tokens
+    hit = usage.get('prompt_cache_hit_tokens')
+    if hit is not None:
+        return hit or 0
+    # OpenAI: prompt_tokens_details.cached_tokens（新版库中是对象）
+    details = usage.get('prompt_tokens_details')
+    if details is None:
+        return usage.get('cached_tokens', 0) or 0
+    if isinstance(details, dict):
+        return details.get('cached_tokens', 0) or 0
+    return getattr(details, 'cached_tokens', 0) or 0
+
+
+def _empty_totals():
+    return dict.fromkeys(_ROLLUP_FIELDS, 0)
+
+
+class UsageLedger:
+    """追加写入的用量账本，record() 只在内存排队，由后台线程落盘"""
+
+    def __init__(self, path=None, rollup_path=None, flush_interval=1.0, flush_records=50):
+        self.path = path or data_path("usage_ledger.jsonl")
+        self.rollup_path = rollup_path or data_path("usage_rollups.json")
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # 汇总: 日期 -> 模型 -> 各项合计（只包含已落盘的记录）
+        self._days = {}
+        # 尚未落盘和正在落盘的记录，查询时一并计入
+        self._pending = []
+        self._writing = []
+
+        self._recover()
+        self._file = open(self.path, "ab")
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+        self._thread.start()
+
+    def record(self, model_key, input_tokens=0, output_tokens=0, cached_tokens=0,
+               latency=0.0, cost=0.0, cache_hit=False):
+        """记录一次翻译"""
+        entry = {
+            "ts": round(time.time(), 3),
+            "model": model_key,
+            "input": input_tokens,
+            "output": output_tokens,
+            "cached": cached_tokens,
+            "latency": round(latency, 3),
+            "cost": cost,
+        }
+        if cache_hit:
+            entry["cache_hit"] = True
+        with self._lock:
+            self._pending.append(entry)
+            if len(self._pending) >= self.flush_records:
+                self._wake.set()
+
+    def totals(self, start=None, end=None, model=None):
+        """汇总日期范围内（YYYY-MM-DD，含两端）的用量"""
+        result = _empty_totals()
+        for models in self._select_days(start, end).values():
+            for name, totals in models.items():
+                if model is None or name == model:
+                    _add(result, totals)
+        return result
+
+    def by_model(self, start=None, end=None):
+        """按模型汇总日期范围内的用量"""
+        result = {}
+        for models in self._select_days(start, end).values():
+            for name, totals in models.items():
+                _add(result.setdefault(name, _empty_totals()), totals)
+        return result
+
+    def daily(self, start=None, end=None):
+        """按天汇总日期范围内的用量"""
+        result = {}
+        for day, models in sorted(self._select_days(start, end).items()):
+            day_totals = result[day] = _empty_totals()
+            for totals in models.values():
+                _add(day_totals, totals)
+        return result
+
+    def today(self, model=None):
+        day = time.strftime("%Y-%m-%d")
+        return self.totals(day, day, model)
+
+    def month_to_date(self, model=None):
+        return self.totals(time.strftime("%Y-%m-01"), None, model)
+
+    def flush(self):
+        """把排队中的记录写入账本并fsync，然后保存汇总"""
+        with self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+                self._writing = records
+            if not records:
+                return
+
+            data = "".join(
+                json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+                for entry in records
+            ).encode("utf-8")
+            try:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                print(f"写入用量账本失败: {e}")
+                with self._lock:
+                    self._pending[:0] = records
+                    self._writing = []
+                return
+
+            with self._lock:
+                for entry in records:
+                    self._apply(entry)
+                self._writing = []
+                snapshot = {"offset": self._file.tell(), "days": self._days}
+                rollups = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":"))
+            self._save_rollups(rollups)
+
+    def close(self):
+        """停止后台线程并写入剩余记录"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self._file.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _select_days(self, start, end):
+        """取出日期范围内的汇总（含未落盘记录）"""
+        with self._lock:
+            days = {
+                day: {name: dict(totals) for name, totals in models.items()}
+                for day, models in self._days.items()
+                if (start is None or day >= start) and (end is None or day <= end)
+            }
+            unsaved = self._writing + self._pending
+        for entry in unsaved:
+            day = _day_of(entry)
+            if (start is None or day >= start) and (end is None or day <= end):
+                _apply_entry(days, entry)
+        return days
+
+    def _apply(self, entry):
+        _apply_entry(self._days, entry)
+
+    def _recover(self):
+        """读取汇总；账本中汇总之后追加的记录（上次异常退出时）重新计入"""
+        offset = 0
+        try:
+            with open(self.rollup_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self._days = saved.get("days", {})
+            offset = saved.get("offset", 0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"读取用量汇总失败，将从账本重建: {e}")
+
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if offset > size:
+            # 账本被替换或截断，汇总作废
+            self._days, offset = {}, 0
+        if offset == size:
+            return
+
+        replayed = 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        for line in tail.splitlines():
+            try:
+                self._apply(json.loads(line))
+                replayed += 1
+            except ValueError:
+                # 写入中断留下的半条记录
+                continue
+
+        if not tail.endswith(b"\n"):
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+            size += 1
+        if replayed:
+            print(f"用量账本已恢复 {replayed} 条未汇总记录")
+        self._save_rollups(json.dumps({"offset": size, "days": self._days},
+                                      ensure_ascii=False, separators=(",", ":")))
+
+    def _save_rollups(self, content):
+        """原子替换汇总文件"""
+        tmp_path = self.rollup_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, self.rollup_path)
+        except OSError as e:
+            print(f"保存用量汇总失败: {e}")
+
+
+def _day_of(entry):
+    return time.strftime("%Y-%m-%d", time.localtime(entry["ts"]))
+
+
+def _apply_entry(days, entry):
+    totals = days.setdefault(_day_of(entry), {}).setdefault(entry["model"], _empty_totals())
+    totals["requests"] += 1
+    totals["cache_hits"] += 1 if entry.get("cache_hit") else 0
+    totals["input_tokens"] += entry.get("input", 0)
+    totals["output_tokens"] += entry.get("output", 0)
+    totals["cached_tokens"] += entry.get("cached", 0)
+    totals["latency"] += entry.get("latency", 0)
+    totals["cost"] += entry.get("cost", 0)
+
+
+def _add(target, totals):
+    for field in _ROLLUP_FIELDS:
+        target[field] += totals.get(field, 0)
@@ -0,0 +1,151 @@
+"""
+延迟指标
+按阶段记录翻译链路各环节的耗时（剪贴板检测 → 语言检测 → 术语预处理 → 提示构建 →
+网络连接/首字节/总耗时 → 界面渲染），保存在滚动直方图中，
+可查询p50/p95/p99，也可导出为OpenMetrics文本格式（见openmetrics模块，导出时才加载）
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 阶段: 显示名称（按链路顺序）
+STAGES = {
+    "clipboard_detect": "剪贴板检测(含去抖)",
+    "language_detect": "语言检测",
+    "term_preprocess": "术语预处理",
+    "prompt_build": "提示构建",
+    "network_connect": "网络连接(新建)",
+    "network_ttfb": "网络首字节",
+    "network_total": "网络总耗时",
+    "ui_render": "界面渲染",
+    "end_to_end": "端到端",
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """最近若干个样本的分布，另外累计全部样本的次数和总和"""
+
+    def __init__(self, window=1024):
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self._recent.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, qs=QUANTILES):
+        """返回各分位数（最近窗口内，最近秩法），没有样本时为None"""
+        ordered = sorted(self._recent)
+        if not ordered:
+            return [None] * len(qs)
+        return [ordered[max(0, math.ceil(q * len(ordered)) - 1)] for q in qs]
+
+
+class StageMetrics:
+    """各阶段耗时的滚动直方图（线程安全）"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, stage, seconds):
+        """记录一次阶段耗时（秒）"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+    def observe_since(self, stage, started):
+        """记录从 started（time.perf_counter()）到现在的耗时"""
+        self.observe(stage, time.perf_counter() - started)
+
+    @contextmanager
+    def span(self, stage):
+        """计时代码块，异常退出时同样记录"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_since(stage, started)
+
+    def count(self, stage):
+        """阶段累计记录次数"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            return histogram.count if histogram is not None else 0
+
+    def snapshot(self):
+        """返回 [(阶段, 次数, 平均, p50, p95, p99), ...]，按链路顺序"""
+        with self._lock:
+            items = [(stage, h.count, h.total, h.quantiles()) for stage, h in self._histograms.items()]
+        return sort_rows([(stage, count, total / count, *quantiles) for stage, count, total, quantiles in items])
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_openmetrics(self):
+        from .openmetrics import openmetrics_text
+        return openmetrics_text(self.snapshot())
+
+    def export(self, path=None):
+        from .openmetrics import export_openmetrics
+        return export_openmetrics(self.snapshot(), path)
+
+
+def sort_rows(rows):
+    """按链路顺序排列快照行"""
+    order = list(STAGES)
+    return sorted(rows, key=lambda row: order.index(row[0]) if row[0] in STAGES else len(order))
+
+
+def merge_rows(rows):
+    """合并多个来源（如界面进程和翻译服务）的快照行，同一阶段只保留一行，按链路顺序排列
+
+    次数和平均值精确合并；各来源只有分位数没有样本，分位数按次数加权近似
+    """
+    merged = {}
+    for stage, count, average, *quantiles in rows:
+        if stage not in merged:
+            merged[stage] = [count, average * count, [value * count for value in quantiles]]
+            continue
+        entry = merged[stage]
+        entry[0] += count
+        entry[1] += average * count
+        entry[2] = [total + value * count for total, value in zip(entry[2], quantiles)]
+    return sort_rows([(stage, count, total / count, *(value / count for value in quantiles))
+                      for stage, (count, total, quantiles) in merged.items() if count])
+
+
+class RequestTrace:
+    """httpx请求的trace扩展，记录请求开始时间和新建连接（TCP+TLS）的耗时
+
+    复用长连接时不会触发连接事件，connect_seconds 保持为None
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect_seconds = None
+        self._connect_started = None
+
+    def __call__(self, event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect_seconds = time.perf_counter() - self._connect_started
+
+
+class AsyncRequestTrace(RequestTrace):
+    """异步客户端使用的trace扩展（httpcore在异步模式下要求回调为协程）"""
+
+    async def __call__(self, event_name, info):
+        RequestTrace.__call__(self, event_name, info)
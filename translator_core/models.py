@@ -0,0 +1,145 @@
+"""
+模型目录
+模型的显示信息和数值价格（美元/百万tokens，区分提示缓存命中与未命中的输入价格），
+启动时加载一次：内置默认值 + 数据目录下 models.json 的覆盖项，并做校验
+"""
+import json
+from dataclasses import dataclass, fields, replace
+
+from .clients import PROVIDER_BASE_URLS
+from .paths import data_path
+
+_PER_MILLION = 1_000_000
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """单个模型的配置与价格"""
+    key: str
+    name: str
+    provider: str
+    input_price: float          # 输入（未命中提示缓存），美元/百万tokens
+    output_price: float         # 输出，美元/百万tokens
+    cached_input_price: float   # 输入（命中提示缓存），美元/百万tokens
+    description: str = ""
+    api_model: str = None       # 实际API调用时使用的模型名，默认与key相同
+    recommended: bool = False
+    quality: int = 3            # 翻译质量评级 1~5，自动选择模型时使用
+    reasoning: bool = False     # 推理模型：先思考再回答，延迟高、输出tokens多
+    max_output_tokens: int = 4096  # 单次请求的最大输出tokens，长文本按此分块
+
+    @property
+    def api_name(self):
+        return self.api_model or self.key
+
+    def cost(self, input_tokens, output_tokens, cached_tokens=0):
+        """按实际计费方式计算成本（美元）"""
+        cached = min(cached_tokens, input_tokens)
+        return ((input_tokens - cached) * self.input_price
+                + cached * self.cached_input_price
+                + output_tokens * self.output_price) / _PER_MILLION
+
+
+def format_price(price):
+    """价格显示文本"""
+    return f"${price:.2f}/1M tokens"
+
+
+DEFAULT_MODELS = (
+    # OpenAI模型
+    ModelSpec("gpt-4o", "GPT-4o (最新)", "openai", 5.00, 15.00, 2.50,
+              "OpenAI最新最强模型，翻译质量最佳", recommended=True, quality=5, max_output_tokens=16384),
+    ModelSpec("gpt-4o-mini", "GPT-4o Mini", "openai", 0.15, 0.60, 0.075,
+              "OpenAI性价比最高，适合大量翻译", recommended=True, quality=3, max_output_tokens=16384),
+    ModelSpec("gpt-4-turbo", "GPT-4 Turbo", "openai", 10.00, 30.00, 10.00,
+              "OpenAI高质量翻译，速度较快", quality=4),
+    ModelSpec("gpt-4", "GPT-4", "openai", 30.00, 60.00, 30.00,
+              "OpenAI经典GPT-4，质量稳定但较贵", quality=4, max_output_tokens=8192),
+    ModelSpec("gpt-3.5-turbo", "GPT-3.5 Turbo", "openai", 0.50, 1.50, 0.50,
+              "OpenAI最便宜选项，基础翻译够用", quality=2),
+    # DeepSeek模型 (界面显示友好名称，API使用官方名称)
+    ModelSpec("deepseek-v3-0324", "DeepSeek V3-0324 🔥", "deepseek", 0.27, 1.10, 0.07,
+              "DeepSeek V3-0324最新版本，翻译质量卓越",
+              api_model="deepseek-chat", recommended=True, quality=4, max_output_tokens=8192),
+    ModelSpec("deepseek-r1-0528", "DeepSeek R1-0528 🚀", "deepseek", 0.55, 2.19, 0.14,
+              "DeepSeek R1-0528推理模型，逻辑思维能力强",
+              api_model="deepseek-reasoner", recommended=True, quality=5, reasoning=True,
+              max_output_tokens=32768),
+)
+
+_FIELD_TYPES = {
+    "name": str, "provider": str, "description": str, "api_model": str,
+    "input_price": (int, float), "output_price": (int, float),
+    "cached_input_price": (int, float), "recommended": bool,
+    "quality": int, "reasoning": bool, "max_output_tokens": int,
+}
+
+
+def load_models(path=None):
+    """加载模型目录 {key: ModelSpec}，覆盖文件不存在时使用内置默认值
+
+    覆盖文件格式: {"模型key": {"input_price": 0.27, ...}, ...}，
+    已有模型只需写要修改的字段，新模型需提供 name、provider 和价格
+    """
+    models = {spec.key: spec for spec in DEFAULT_MODELS}
+    path = path or data_path("models.json")
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        return models
+    except (OSError, ValueError) as e:
+        raise ValueError(f"无法读取 {path}: {e}")
+
+    if not isinstance(overrides, dict):
+        raise ValueError(f"{path} 应为 {{模型key: 配置}} 格式")
+
+    for key, values in overrides.items():
+        models[key] = _build_spec(key, values, models.get(key))
+    return models
+
+
+def _build_spec(key, values, base):
+    """根据覆盖项生成并校验ModelSpec"""
+    if not isinstance(values, dict):
+        raise ValueError(f"模型 {key} 的配置应为对象")
+
+    known = {f.name for f in fields(ModelSpec)} - {"key"}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"模型 {key} 含未知字段: {', '.join(sorted(unknown))}")
+
+    for name, value in values.items():
+        expected = _FIELD_TYPES[name]
+        if value is None and name == "api_model":
+            continue
+        # bool是int的子类，价格字段不接受true/false
+        if not isinstance(value, expected) or (expected != bool and isinstance(value, bool)):
+            raise ValueError(f"模型 {key} 的 {name} 类型错误: {value!r}")
+
+    if base is not None:
+        spec = replace(base, **values)
+        # 只改了输入价格时，不能沿用旧的缓存价格
+        if "input_price" in values and "cached_input_price" not in values:
+            spec = replace(spec, cached_input_price=min(spec.cached_input_price, spec.input_price))
+    else:
+        missing = {"name", "provider", "input_price", "output_price"} - set(values)
+        if missing:
+            raise ValueError(f"新模型 {key} 缺少字段: {', '.join(sorted(missing))}")
+        values = dict(values)
+        # 未提供缓存价格时按无缓存折扣处理
+        values.setdefault("cached_input_price", values["input_price"])
+        spec = ModelSpec(key=key, **values)
+
+    if spec.provider not in PROVIDER_BASE_URLS:
+        raise ValueError(f"模型 {key} 的提供商无效: {spec.provider}")
+    if min(spec.input_price, spec.output_price, spec.cached_input_price) < 0:
+        raise ValueError(f"模型 {key} 的价格不能为负数")
+    if spec.cached_input_price > spec.input_price:
+        raise ValueError(f"模型 {key} 的缓存命中价格不能高于输入价格")
+    if not 1 <= spec.quality <= 5:
+        raise ValueError(f"模型 {key} 的质量评级应在1~5之间")
+    if spec.max_output_tokens < 256:
+        raise ValueError(f"模型 {key} 的最大输出tokens不能小于256")
+    return spec
@@ -0,0 +1,36 @@
+"""
+OpenMetrics导出
+把延迟指标快照行导出为OpenMetrics文本，供翻译服务的 /metrics 接口和界面导出使用
+"""
+import os
+
+from .metrics import QUANTILES
+from .paths import data_path
+
+METRIC_NAME = "teams_translator_stage_seconds"
+
+
+def openmetrics_text(rows):
+    """把快照行导出为OpenMetrics文本（summary类型，分位数取自滚动窗口）"""
+    lines = [
+        f"# TYPE {METRIC_NAME} summary",
+        f"# UNIT {METRIC_NAME} seconds",
+        f"# HELP {METRIC_NAME} Latency of each translation pipeline stage.",
+    ]
+    for stage, count, average, *quantiles in rows:
+        for q, value in zip(QUANTILES, quantiles):
+            lines.append(f'{METRIC_NAME}{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {average * count:.6f}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def export_openmetrics(rows, path=None):
+    """原子写入OpenMetrics文件，返回文件路径"""
+    path = path or data_path("metrics.prom")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(openmetrics_text(rows))
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,106 @@
+"""
+多行打包翻译
+把多行文本按token预算打包成一次JSON结构化请求，再拆回逐行译文（提示见prompts模块）
+"""
+import json
+import re
+
+from .text import estimate_tokens
+
+# 每组输入token预算和最大行数
+PACK_TOKEN_BUDGET = 1500
+PACK_MAX_LINES = 40
+
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def pack_lines(items, token_budget=PACK_TOKEN_BUDGET, max_lines=PACK_MAX_LINES):
+    """把 (行, 语言) 列表按顺序分组，同组语言相同且不超过token预算
+
+    返回分组列表，每组为 [(原始序号, 行, 语言), ...]
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for index, (line, lang) in enumerate(items):
+        tokens = estimate_tokens(line)
+        if current and (
+            lang != current[0][2]
+            or len(current) >= max_lines
+            or current_tokens + tokens > token_budget
+        ):
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append((index, line, lang))
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_pack(chunk):
+    """把打包失败的一组拆成单行组（供 BatchTranslator 的 split_func 使用）"""
+    return [[item] for item in chunk]
+
+
+def estimate_packed_output_tokens(texts):
+    """估算打包请求需要的输出token（含JSON结构开销）"""
+    return sum(estimate_tokens(text) * 2 + 8 for text in texts) + 16
+
+
+def parse_packed_response(content, expected_count):
+    """解析打包翻译的回复，条数不符时抛出ValueError"""
+    cleaned = _FENCE_RE.sub('', content.strip())
+    # 去掉JSON前后可能出现的说明文字
+    start, end = cleaned.find('{'), cleaned.rfind('}')
+    if start == -1 or end <= start:
+        raise ValueError("打包翻译回复不是JSON对象")
+
+    data = json.loads(cleaned[start:end + 1])
+    if not isinstance(data, dict) or len(data) != expected_count:
+        raise ValueError(f"打包翻译条数不符: 期望{expected_count}条")
+
+    translations = []
+    for i in range(1, expected_count + 1):
+        value = data.get(str(i))
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"打包翻译缺少第{i}条")
+        translations.append(value.strip())
+    return translations
+
+
+def merge_usage(usages):
+    """合并多次请求的用量统计
+
+    各请求可能由不同模型应答（自动选择或备用模型），涉及多个模型时在 by_model 中
+    保留各模型的用量，计费时按各自的价格分别计算
+    """
+    merged = {}
+    by_model = {}
+    cache_hit = False
+    for usage in usages:
+        if not usage:
+            continue
+        if usage.get('cache_hit'):
+            cache_hit = True
+            continue
+        # 记录实际应答的模型（可能是备用模型），用于计费
+        if 'model_key' in usage:
+            merged.setdefault('model_key', usage['model_key'])
+        _add_counts(merged, usage)
+        for part in (usage['by_model'].values() if 'by_model' in usage else [usage]):
+            model_key = part.get('model_key')
+            _add_counts(by_model.setdefault(model_key, {'model_key': model_key}), part)
+    if not merged and cache_hit:
+        return {'prompt_tokens': 0, 'completion_tokens': 0, 'cache_hit': True}
+    if len(by_model) > 1:
+        merged['by_model'] = by_model
+    return merged
+
+
+def _add_counts(total, usage):
+    """累加用量中的数值字段"""
+    for key, value in usage.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
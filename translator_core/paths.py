@@ -0,0 +1,17 @@
+"""
+本地数据目录管理
+"""
+import os
+
+# 可通过环境变量覆盖数据目录（便于多用户或测试环境）
+DATA_DIR = os.environ.get(
+    "TEAMS_TRANSLATOR_HOME",
+    os.path.join(os.path.expanduser("~"), ".teams_translator")
+)
+
+
+def data_path(*parts):
+    """返回数据目录下的文件路径，并确保父目录存在"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,93 @@
+"""
+翻译提示构建
+提供商按请求前缀做提示缓存（如DeepSeek的prompt_cache_hit_tokens），
+因此系统提示固定不变，用户消息按变化频率排列：模式要求 → 术语提示 → 语言对 → 原文，
+同样设置下的前缀逐字节一致，只有最后的原文不同
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+# 所有模式共用的系统提示（不随质量模式变化）
+SYSTEM_PROMPT = (
+    "你是专业的翻译助手，擅长商务场景下的多语言互译，对日本企业文化和专业术语有深入理解，"
+    "提供准确、自然的翻译。只输出译文，不添加任何解释。"
+)
+
+_BASIC_REQUIREMENTS = """翻译要求：
+1. 保持原意准确
+2. 语言自然流畅
+3. 已预处理的专有名词请保持不变
+4. 只返回翻译结果，不要添加任何解释
+"""
+
+_QUALITY_REQUIREMENTS = """翻译要求：
+1. 保持原意准确，特别注意专有名词和公司名称
+2. 语言自然流畅，符合目标语言表达习惯
+3. 保持原文的语气和敬语程度
+4. 对于专业术语要准确翻译
+5. 语气词要自然转换，避免直译
+6. 只返回翻译结果，不要添加任何解释
+
+注意：
+- 已预处理的专有名词请保持不变
+- 技术术语要准确理解语境
+- 商务敬语要自然转换
+"""
+
+_PACKED_TASK = """请逐条独立翻译下面编号的原文，返回JSON对象，键与原文编号完全一致，值为对应译文。
+不要合并、拆分或遗漏任何条目，只返回JSON，不要添加任何解释。
+"""
+
+# 术语提示最多列出的术语数，避免前缀过长
+GLOSSARY_HINT_MAX_TERMS = 40
+
+
+def build_glossary_hint(targets, max_terms=GLOSSARY_HINT_MAX_TERMS):
+    """由术语译文生成稳定的提示文本（去重、排序、限量），词典不变时结果不变"""
+    names = sorted({target.strip() for target in targets if target and target.strip()})
+    return "、".join(names[:max_terms])
+
+
+def prompt_version(glossary_hint=""):
+    """提示模板和术语提示的指纹，写入缓存键：提示变化后不再复用按旧提示得到的译文"""
+    raw = "\n".join([SYSTEM_PROMPT, _BASIC_REQUIREMENTS, _QUALITY_REQUIREMENTS, glossary_hint])
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@lru_cache(maxsize=64)
+def prompt_prefix(source_name, target_name, quality_enhance=False, glossary_hint=""):
+    """用户消息中原文之前的固定部分"""
+    parts = [_QUALITY_REQUIREMENTS if quality_enhance else _BASIC_REQUIREMENTS]
+    if glossary_hint:
+        parts.append(f"\n专有名词（已是译文，请原样保留）：{glossary_hint}\n")
+    parts.append(f"\n语言：{source_name} → {target_name}\n")
+    return "".join(parts)
+
+
+def build_messages(prompt):
+    """组装聊天消息"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_translation_prompt(source_name, target_name, text, quality_enhance=False, glossary_hint=""):
+    """单条翻译提示，原文放在最后"""
+    return f"{prompt_prefix(source_name, target_name, quality_enhance, glossary_hint)}\n原文：\n{text}"
+
+
+def build_packed_prompt(source_name, target_name, texts, quality_enhance=False, glossary_hint=""):
+    """多行打包翻译提示，与单条翻译共用前缀，原文以编号JSON对象给出"""
+    payload = json.dumps({str(i): text for i, text in enumerate(texts, 1)}, ensure_ascii=False, indent=0)
+    prefix = prompt_prefix(source_name, target_name, quality_enhance, glossary_hint)
+    return f"{prefix}\n{_PACKED_TASK}\n原文（JSON，共{len(texts)}条）：\n{payload}"
+
+
+def cache_hit_ratio(usage_info):
+    """本次请求输入tokens中命中提示缓存的比例"""
+    input_tokens = usage_info.get('prompt_tokens', 0)
+    if not input_tokens:
+        return 0.0
+    return min(1.0, usage_info.get('cached_tokens', 0) / input_tokens)
@@ -0,0 +1,93 @@
+"""
+翻译结果日志
+结果区只保留最近的若干行，超出上限时按块裁掉最旧的记录并归档到磁盘，
+使每次追加的开销与会话时长无关
+"""
+from collections import deque
+from datetime import datetime
+
+from .paths import data_path
+
+
+class ResultLog:
+    """结果区的环形缓冲模型，与Text控件内容一一对应"""
+
+    def __init__(self, max_lines=2000, trim_chunk=500, archive=True):
+        self.max_lines = max_lines
+        self.trim_chunk = trim_chunk
+        self.archive = archive
+
+        # 每条记录: [文本, 标签, 行数]
+        self._entries = deque()
+        self._streams = {}
+        self.line_count = 0
+
+    def append(self, text, tag=None):
+        """追加一条记录，返回需要从控件开头删除的行数"""
+        self._push([text, tag, text.count("\n") + 1])
+        return self._trim()
+
+    def begin_stream(self, key, prefix, tag=None):
+        """开始一条流式记录，返回需要从控件开头删除的行数"""
+        entry = [prefix, tag, prefix.count("\n") + 1]
+        self._streams[key] = entry
+        self._push(entry)
+        return self._trim()
+
+    def extend_stream(self, key, delta):
+        """向流式记录追加内容"""
+        entry = self._streams.get(key)
+        if entry is None:
+            return
+        entry[0] += delta
+        added = delta.count("\n")
+        entry[2] += added
+        self.line_count += added
+
+    def end_stream(self, key):
+        """结束流式记录"""
+        self._streams.pop(key, None)
+
+    def text(self):
+        """当前保留的全部文本"""
+        return "\n".join(entry[0] for entry in self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._streams.clear()
+        self.line_count = 0
+
+    def _push(self, entry):
+        self._entries.append(entry)
+        self.line_count += entry[2]
+
+    def _trim(self):
+        """超过上限一个块时，裁掉最旧的记录（至少一个块），正在流式输出的记录不裁"""
+        if self.line_count <= self.max_lines + self.trim_chunk:
+            return 0
+
+        streaming = set(map(id, self._streams.values()))
+        removed = []
+        removed_lines = 0
+        target = self.line_count - self.max_lines
+        while self._entries and removed_lines < target:
+            if id(self._entries[0]) in streaming:
+                break
+            entry = self._entries.popleft()
+            removed.append(entry)
+            removed_lines += entry[2]
+
+        self.line_count -= removed_lines
+        if removed and self.archive:
+            self._archive(removed)
+        return removed_lines
+
+    def _archive(self, entries):
+        """把裁掉的记录追加到当天的归档文件"""
+        path = data_path("archive", f"results-{datetime.now():%Y%m%d}.log")
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(entry[0] for entry in entries))
+                f.write("\n")
+        except OSError as e:
+            print(f"归档翻译结果失败: {e}")
@@ -0,0 +1,299 @@
+"""
+请求路由
+按提供商设置超时、带抖动的指数退避重试和熔断器；主模型重试耗尽或熔断时切换到备用模型。
+可选对冲请求：主模型超过历史延迟分位数仍未响应时，同时向备用模型发送请求，取先返回者。
+请求以协程执行，对冲和取消都在同一事件循环中完成，不额外占用线程
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from .errors import TranslationCancelled
+
+
+@dataclass(frozen=True)
+class ProviderPolicy:
+    """单个提供商的调用策略"""
+    timeout: float = 30.0          # 单次请求超时（流式为两次数据之间的最长等待）
+    max_retries: int = 2
+    base_delay: float = 0.5        # 退避基数，第n次重试最多等待 base_delay * 2**n
+    max_delay: float = 8.0
+    failure_threshold: int = 5     # 连续失败多少次后熔断
+    reset_timeout: float = 30.0    # 熔断多久后放行一个探测请求
+
+
+PROVIDER_POLICIES = {
+    "deepseek": ProviderPolicy(timeout=30.0, max_retries=2),
+    # 代理线路偶尔抖动，超时稍短、多重试一次
+    "openai": ProviderPolicy(timeout=25.0, max_retries=3),
+}
+
+# 可重试的错误（不导入openai，按类型名和状态码判断）
+_RETRYABLE_ERRORS = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "ConnectTimeout", "ReadTimeout", "ConnectError", "RemoteProtocolError",
+}
+
+
+def is_retryable(error):
+    """超时、连接失败、限流和服务端错误可以重试，其余错误（如Key无效）直接抛出"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return type(error).__name__ in _RETRYABLE_ERRORS
+
+
+class CircuitOpenError(Exception):
+    """提供商处于熔断状态"""
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后拒绝请求，冷却后放行一个探测请求"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyStats:
+    """最近若干次请求的延迟统计"""
+
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+
+    def add(self, latency):
+        with self._lock:
+            self._recent.append(latency)
+
+    def __len__(self):
+        return len(self._recent)
+
+    def percentile(self, q):
+        """q取0~1，样本为空时返回None"""
+        with self._lock:
+            ordered = sorted(self._recent)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RequestRouter:
+    """按提供商策略执行请求，支持重试、熔断、故障切换和对冲
+
+    attempt(model_key, on_delta, timeout) 为协程函数，执行一次实际请求，返回(回复文本, 用量)。
+    各请求在调用方的事件循环中并发执行，取消外层任务时一并取消所有尝试
+    """
+
+    def __init__(self, provider_of, policies=None, hedge_percentile=0.95,
+                 default_hedge_delay=2.0, min_hedge_delay=0.5, min_samples=10):
+        self.provider_of = provider_of
+        self.policies = dict(PROVIDER_POLICIES, **(policies or {}))
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._latency = {}
+
+    def policy(self, provider):
+        return self.policies.get(provider) or ProviderPolicy()
+
+    def breaker(self, provider):
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                policy = self.policy(provider)
+                breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+                self._breakers[provider] = breaker
+            return breaker
+
+    def latency(self, model_key):
+        with self._lock:
+            stats = self._latency.get(model_key)
+            if stats is None:
+                stats = self._latency[model_key] = LatencyStats()
+            return stats
+
+    def hedge_delay(self, model_key):
+        """主模型等待多久后发出对冲请求"""
+        stats = self.latency(model_key)
+        if len(stats) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, stats.percentile(self.hedge_percentile))
+
+    async def execute(self, attempt, primary, backup=None, on_delta=None, hedge=False, on_discarded=None):
+        """执行请求，返回(回复文本, 用量)；on_discarded(用量) 接收落选请求产生的用量"""
+        if hedge and backup:
+            return await self._execute_hedged(attempt, primary, backup, on_delta, on_discarded)
+
+        delta_seen = [False]
+
+        def tracked_delta(delta):
+            delta_seen[0] = True
+            on_delta(delta)
+
+        last_error = None
+        for model_key in (primary, backup):
+            if model_key is None:
+                continue
+            try:
+                return await self._with_retries(attempt, model_key, tracked_delta if on_delta else None)
+            except TranslationCancelled:
+                raise
+            except Exception as e:
+                # 已输出部分译文，或错误与提供商状态无关（如Key无效），不再切换
+                if delta_seen[0] or not (is_retryable(e) or isinstance(e, CircuitOpenError)):
+                    raise
+                last_error = e
+        raise last_error
+
+    async def _with_retries(self, attempt, model_key, on_delta):
+        """对单个模型执行请求，可重试错误按带抖动的指数退避重试"""
+        provider = self.provider_of(model_key)
+        policy = self.policy(provider)
+        breaker = self.breaker(provider)
+        delta_seen = [False]
+
+        def tracked_delta(delta):
+            delta_seen[0] = True
+            on_delta(delta)
+
+        for retry in range(policy.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{provider} 连续失败，暂停调用")
+
+            started = time.monotonic()
+            try:
+                result = await attempt(model_key, tracked_delta if on_delta else None, policy.timeout)
+            except TranslationCancelled:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # 请求已到达服务端，说明提供商本身可用
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if retry == policy.max_retries or delta_seen[0]:
+                    raise
+                delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** retry))
+                print(f"{model_key} 请求失败，{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            self.latency(model_key).add(time.monotonic() - started)
+            return result
+
+    async def _execute_hedged(self, attempt, primary, backup, on_delta, on_discarded):
+        """主模型超过延迟阈值未完成（或已失败）时并行请求备用模型，取先完成者"""
+        loop = asyncio.get_running_loop()
+        winner = [None]
+        tasks = {}
+
+        def claim(model_key):
+            """确定胜出者并取消其他请求，返回是否由model_key胜出"""
+            if winner[0] is None:
+                winner[0] = model_key
+                for task, other in tasks.items():
+                    if other != model_key:
+                        task.cancel()
+            return winner[0] == model_key
+
+        def launch(model_key):
+            if on_delta is not None:
+                # 流式输出时，先输出译文的请求胜出
+                def gated_delta(delta):
+                    if claim(model_key):
+                        on_delta(delta)
+            else:
+                gated_delta = None
+            task = loop.create_task(self._with_retries(attempt, model_key, gated_delta))
+            tasks[task] = model_key
+            return task
+
+        pending = {launch(primary)}
+        hedge_at = loop.time() + self.hedge_delay(primary)
+        hedged = False
+        errors = []
+
+        try:
+            while pending or not hedged:
+                done = set()
+                if pending:
+                    timeout = None if hedged else max(0.0, hedge_at - loop.time())
+                    done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    error = task.exception()
+                    if error is not None:
+                        # 主模型的错误与提供商状态无关（如Key无效）时不再对冲，与不对冲时一样直接抛出
+                        if not hedged and not (is_retryable(error) or isinstance(error, CircuitOpenError)):
+                            raise error
+                        errors.append(error)
+                        continue
+                    if claim(tasks[task]):
+                        return task.result()
+                    # 落选的一方已完成，其用量同样计费
+                    if on_discarded is not None:
+                        on_discarded(task.result()[1])
+
+                if not hedged and winner[0] is None and (not pending or loop.time() >= hedge_at):
+                    hedged = True
+                    if self.breaker(self.provider_of(backup)).state != "open":
+                        pending.add(launch(backup))
+                elif not hedged and winner[0] is not None:
+                    # 主模型已开始流式输出，无需对冲
+                    hedged = True
+        finally:
+            # 已有胜出者、出错或外层被取消时，结束仍在进行的请求
+            for task in tasks:
+                task.cancel()
+
+        if errors:
+            raise errors[-1]
+        raise TranslationCancelled()
@@ -0,0 +1,79 @@
+"""
+句子级增量翻译
+把文本切分为句子并计算指纹，会话内已翻译过的句子直接复用，
+只有新增或修改的句子需要发送给模型，最后按原顺序拼接
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+
+# 句末：中日文句号/问号/感叹号（可带右引号括号）、后跟空白的英文句点、换行
+_SENTENCE_END_RE = re.compile(r'(?:[。！？!?]+[」』）)”’"\']*|\.(?=\s|$))[ \t　]*|\n\s*')
+
+
+def split_segments(text):
+    """切分句子，返回 [(句子, 句后空白), ...]，按顺序拼接即为原文（去掉开头空白）"""
+    segments = []
+    position = 0
+    text = text.lstrip()
+    for match in _SENTENCE_END_RE.finditer(text):
+        end = match.end()
+        if end == position:
+            continue
+        chunk = text[position:end]
+        body = chunk.rstrip()
+        if body:
+            segments.append((body, chunk[len(body):]))
+        elif segments:
+            body, separator = segments[-1]
+            segments[-1] = (body, separator + chunk)
+        position = end
+
+    rest = text[position:]
+    if rest.strip():
+        body = rest.rstrip()
+        segments.append((body, rest[len(body):]))
+    elif rest and segments:
+        body, separator = segments[-1]
+        segments[-1] = (body, separator + rest)
+    return segments
+
+
+def fingerprint(segment, source_lang, target_lang, model_key, quality_enhance, prompt_version=""):
+    """句子指纹：内部空白归一后的文本加翻译设置"""
+    normalized = " ".join(segment.split())
+    raw = json.dumps([normalized, source_lang, target_lang, model_key, bool(quality_enhance), prompt_version],
+                     ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SegmentStore:
+    """会话内的句子译文存储（内存LRU，线程安全）"""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            translation = self._entries.get(key)
+            if translation is not None:
+                self._entries.move_to_end(key)
+            return translation
+
+    def put(self, key, translation):
+        with self._lock:
+            self._entries[key] = translation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,114 @@
+"""
+自适应模型选择
+按请求的长度、源语言和质量模式，结合各模型近期的延迟(p50/p95)与成本统计选择模型，
+并遵守用户设置的单次延迟预算和成本上限；首选模型满足条件时优先使用首选模型
+"""
+import threading
+from collections import deque, namedtuple
+
+from .routing import LatencyStats
+
+# 选择结果：模型、原因
+Selection = namedtuple("Selection", ["model_key", "reason"])
+
+# 按输入tokens分档统计（提示前缀约两三百tokens）
+SIZE_BUCKETS = (400, 1200)
+
+# 少于此tokens数的原文视为短消息，不使用推理模型
+SHORT_TEXT_TOKENS = 40
+
+# 各源语言要求的最低质量评级（日语敬语较难）
+LANGUAGE_MIN_QUALITY = {"ja": 3}
+
+# 无统计数据时的延迟估计: (固定开销秒, 每秒输出tokens)
+_LATENCY_PRIOR = {False: (0.8, 60.0), True: (8.0, 30.0)}
+# 推理模型的思考过程也按输出计费，估算时放大输出tokens
+_REASONING_OUTPUT_FACTOR = 4
+
+MIN_SAMPLES = 5
+
+
+def size_bucket(input_tokens):
+    for index, limit in enumerate(SIZE_BUCKETS):
+        if input_tokens < limit:
+            return index
+    return len(SIZE_BUCKETS)
+
+
+class _BucketStats:
+    """某模型在某长度档的延迟和成本"""
+
+    def __init__(self, window):
+        self.latency = LatencyStats(window)
+        self.costs = deque(maxlen=window)
+
+
+class ModelSelector:
+    """根据请求特征和近期统计为每次请求选择模型"""
+
+    def __init__(self, window=100):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, model_key, input_tokens, latency, cost):
+        """记录一次实际调用"""
+        key = (model_key, size_bucket(input_tokens))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _BucketStats(self.window)
+            stats.costs.append(cost)
+        stats.latency.add(latency)
+
+    def predict(self, spec, input_tokens, output_tokens):
+        """预测(p50延迟, p95延迟, 成本)，有足够统计时使用实测值"""
+        with self._lock:
+            stats = self._stats.get((spec.key, size_bucket(input_tokens)))
+        if stats is not None and len(stats.latency) >= MIN_SAMPLES:
+            costs = list(stats.costs)
+            return (stats.latency.percentile(0.5), stats.latency.percentile(0.95),
+                    sum(costs) / len(costs))
+
+        if spec.reasoning:
+            output_tokens *= _REASONING_OUTPUT_FACTOR
+        overhead, tokens_per_second = _LATENCY_PRIOR[spec.reasoning]
+        p50 = overhead + output_tokens / tokens_per_second
+        return p50, p50 * 1.8, spec.cost(input_tokens, output_tokens)
+
+    def select(self, models, preferred, input_tokens, text_tokens, source_lang=None,
+               quality_enhance=False, latency_budget=None, cost_ceiling=None):
+        """从可用模型 {key: ModelSpec} 中选择本次请求使用的模型
+
+        latency_budget 为p95延迟上限（秒），cost_ceiling 为单次成本上限（美元），None表示不限
+        """
+        # 译文长度与原文相近
+        output_tokens = max(16, int(text_tokens * 1.2))
+        min_quality = 4 if quality_enhance else LANGUAGE_MIN_QUALITY.get(source_lang, 2)
+        short = text_tokens < SHORT_TEXT_TOKENS and not quality_enhance
+
+        candidates = []
+        for key, spec in models.items():
+            if spec.quality < min_quality or (short and spec.reasoning):
+                continue
+            p50, p95, cost = self.predict(spec, input_tokens, output_tokens)
+            if latency_budget and p95 > latency_budget:
+                continue
+            if cost_ceiling and cost > cost_ceiling:
+                continue
+            candidates.append((spec, p50, cost))
+
+        if not candidates:
+            return Selection(preferred, "没有满足延迟预算和成本上限的模型，使用首选模型")
+        if any(spec.key == preferred for spec, _, _ in candidates):
+            return Selection(preferred, "首选模型满足要求")
+
+        # 条件相同时优先与首选模型同一提供商
+        provider = models[preferred].provider if preferred in models else None
+        if quality_enhance:
+            spec, p50, cost = min(candidates, key=lambda c: (-c[0].quality, c[1], c[0].provider != provider, c[2]))
+            reason = "质量优先"
+        else:
+            spec, p50, cost = min(candidates, key=lambda c: (c[1], c[0].provider != provider, c[2]))
+            reason = "短消息，避免推理模型延迟" if short else "延迟最低"
+        return Selection(spec.key, f"{reason}，预计{p50:.1f}秒、${cost:.4f}")
@@ -0,0 +1,111 @@
+"""
+术语替换引擎
+基于Aho-Corasick自动机，词典更新时构建一次，预处理时单次扫描文本，
+采用最左最长匹配，替换结果不会被其他术语再次匹配
+"""
+from collections import deque
+
+
+class TermMatcher:
+    """术语词典匹配器（构建后只读，可在多个线程中共享）"""
+
+    def __init__(self, terms):
+        self.terms = dict(terms)
+        # 节点数据：转移表、失败链接、输出链接、在该节点结束的术语
+        self._goto = [{}]
+        self._fail = [0]
+        self._output_link = [0]
+        self._term_at = [None]
+        self._build()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _build(self):
+        """构建自动机"""
+        goto, term_at = self._goto, self._term_at
+
+        for term in self.terms:
+            if not term:
+                continue
+            node = 0
+            for char in term:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    term_at.append(None)
+                node = next_node
+            term_at[node] = term
+
+        fail = self._fail = [0] * len(goto)
+        output_link = self._output_link = [0] * len(goto)
+
+        # 广度优先计算失败链接和输出链接
+        pending = deque(goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                # 输出链接指向失败链上最近的术语结束节点
+                output_link[child] = fail[child] if term_at[fail[child]] else output_link[fail[child]]
+                pending.append(child)
+
+    def find_matches(self, text):
+        """返回最左最长、互不重叠的匹配列表 [(起始位置, 术语), ...]"""
+        goto, fail, output_link, term_at = self._goto, self._fail, self._output_link, self._term_at
+
+        # 每个起始位置上最长的术语
+        longest = {}
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            node = state if term_at[state] else output_link[state]
+            while node:
+                term = term_at[node]
+                start = index - len(term) + 1
+                current = longest.get(start)
+                if current is None or len(term) > len(current):
+                    longest[start] = term
+                node = output_link[node]
+
+        matches = []
+        position = 0
+        for start in sorted(longest):
+            if start >= position:
+                term = longest[start]
+                matches.append((start, term))
+                position = start + len(term)
+        return matches
+
+    def replace(self, text):
+        """替换文本中的术语，返回(处理后文本, 替换说明列表)"""
+        if not self.terms or not text:
+            return text, []
+
+        matches = self.find_matches(text)
+        if not matches:
+            return text, []
+
+        parts = []
+        replacements = []
+        position = 0
+        for start, term in matches:
+            parts.append(text[position:start])
+            parts.append(self.terms[term])
+            position = start + len(term)
+
+            report = f"{term} → {self.terms[term]}"
+            if report not in replacements:
+                replacements.append(report)
+        parts.append(text[position:])
+
+        return "".join(parts), replacements
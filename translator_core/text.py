@@ -0,0 +1,16 @@
+"""
+文本工具：本地token估算等
+"""
+import math
+import re
+
+# 中日韩字符（含假名、全角符号），大致每个字符1个token
+_CJK_RE = re.compile(r'[　-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中日韩字符按1个，其他字符按4个字符1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)